@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+import argparse
+import tempfile
+
+from console.Benchmark import Benchmark
+from console.Synthetic import DURATIONS
+
+RESULTS_FILENAME = "benchmark_results.jsonl"
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="FDF Console benchmark",
+                                     description="Benchmark parsing, HR loading and export on synthetic sessions")
+
+    parser.add_argument("--session", "-s", choices=list(DURATIONS), required=False, action="append",
+                        help="Session length to benchmark, repeat for several, defaults to all")
+    parser.add_argument("--repeat", "-r", metavar="N", type=int, required=False, default=3,
+                        help="Number of timed runs per stage, the fastest one counts, defaults to 3")
+    parser.add_argument("--results", metavar="FILE", required=False, default=RESULTS_FILENAME,
+                        help=f"File the results are appended to and compared with, defaults to {RESULTS_FILENAME}")
+    parser.add_argument("--no-save", dest="save", action="store_false",
+                        help="Only compare with earlier results, do not append to them")
+
+    args = parser.parse_args()
+    previous = Benchmark.load(args.results)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        benchmark = Benchmark(directory, repeat=args.repeat)
+        for name in args.session or list(DURATIONS):
+            results += benchmark.run(name, DURATIONS[name])
+    print(Benchmark.report(results, previous))
+    if args.save:
+        Benchmark.save(results, args.results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+import argparse
+import datetime
+import json
+import time
+
+from console.Catalog import Catalog, ORDERS
+
+CATALOG_FILENAME = "catalog.sqlite"
+
+
+def date(value: str) -> datetime.datetime:
+    """A day or a time in ISO format, UTC unless given otherwise."""
+    result = datetime.datetime.fromisoformat(value)
+    return result if result.tzinfo else result.replace(tzinfo=datetime.timezone.utc)
+
+
+def format_time(seconds) -> str:
+    return datetime.datetime.fromtimestamp(seconds, tz=datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def format_duration(seconds) -> str:
+    return str(datetime.timedelta(seconds=round(seconds)))
+
+
+def print_sessions(sessions: list[dict]):
+    print(f"{'id':<15}{'start (UTC)':<21}{'duration':>10}{'meters':>8}{'avg W':>7}{'max W':>7}"
+          f"{'avg SPM':>9}{'max SPM':>9}{'kcal':>6}  heart rate")
+    for session in sessions:
+        print(f"{session['id']:<15}{format_time(session['start_time']):<21}{format_duration(session['duration']):>10}"
+              f"{session['distance']:>8}{session['average_watts']:>7.0f}{session['maximum_watts']:>7}"
+              f"{session['average_spm']:>9.1f}{session['maximum_spm']:>9}{session['calories']:>6.0f}  "
+              f"{session['heart_rate_filename'] or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="FDF Console session catalog",
+                                     description="Index recordings and query their summaries")
+    parser.add_argument("--catalog", metavar="FILE", required=False, default=CATALOG_FILENAME,
+                        help=f"SQLite file of the catalog, defaults to {CATALOG_FILENAME}")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    update = commands.add_parser("update", help="index new and changed recordings of directories")
+    update.add_argument("directories", metavar="DIRECTORY", nargs="+", help="directory with recordings")
+
+    query = commands.add_parser("query", help="list sessions and their totals")
+    query.add_argument("--since", metavar="DATE", type=date, required=False,
+                       help="only sessions that started at or after this ISO date or time, in UTC by default")
+    query.add_argument("--until", metavar="DATE", type=date, required=False,
+                       help="only sessions that started before this ISO date or time")
+    query.add_argument("--min-distance", metavar="METERS", type=int, required=False,
+                       help="only sessions of at least this distance")
+    query.add_argument("--min-duration", metavar="MINUTES", type=float, required=False,
+                       help="only sessions of at least this duration")
+    query.add_argument("--order", choices=ORDERS, required=False, default="start_time",
+                       help="sort sessions by this column, defaults to start_time")
+    query.add_argument("--descending", action="store_true", help="sort in descending order")
+    query.add_argument("--limit", metavar="N", type=int, required=False, help="list at most N sessions")
+    query.add_argument("--totals", action="store_true", help="only print the totals")
+    query.add_argument("--json", action="store_true", help="print sessions and totals as JSON")
+    args = parser.parse_args()
+
+    catalog = Catalog(args.catalog)
+    try:
+        if args.command == "update":
+            for directory in args.directories:
+                started = time.perf_counter()
+                counts = catalog.update(directory)
+                print(f"Updated {directory} in {time.perf_counter() - started:.3f}s: "
+                      + ", ".join(f"{count} {name}" for name, count in counts.items()))
+            return
+
+        filters = {"since": args.since, "until": args.until, "min_distance": args.min_distance,
+                   "min_duration": args.min_duration * 60 if args.min_duration is not None else None}
+        sessions = [] if args.totals else catalog.sessions(order=args.order, descending=args.descending,
+                                                           limit=args.limit, **filters)
+        totals = catalog.totals(**filters)
+    finally:
+        catalog.close()
+
+    if args.json:
+        print(json.dumps({"sessions": sessions, "totals": totals}, indent=2))
+        return
+    if sessions:
+        print_sessions(sessions)
+    print(f"{totals['sessions']} sessions, {format_duration(totals['duration'])}, {totals['distance']} m, "
+          f"{totals['calories']:.0f} kcal")
+
+
+if __name__ == "__main__":
+    main()
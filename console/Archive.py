@@ -0,0 +1,114 @@
+import datetime
+import glob
+import importlib.util
+import os
+
+import numpy as np
+
+from console.ArrowIpc import ArrowIpc, INT64, FLOAT64, TIMESTAMP
+
+PARQUET = "parquet"
+ARROW = "arrow"
+ARCHIVE_FORMATS = [PARQUET, ARROW]
+SUFFIXES = {PARQUET: ".parquet", ARROW: ".arrow"}
+COMPRESSION = "zstd"
+
+
+class Archive(object):
+    """Columnar archive of the resampled per-second frames of exported sessions.
+
+    Sessions are appended as one file each to a dataset partitioned by the day they started, e.g.
+    ``archive/date=2022-12-09/1670609153225.parquet``, so that queries over many sessions read only the
+    days and columns they need. Every file has the columns ``session``, ``time`` (UTC seconds) and the
+    frame columns as doubles, seconds without a value are null. Exporting a session again replaces its file.
+
+    Parquet files, compressed with zstd, require pyarrow. Arrow IPC files are written with pyarrow if it
+    is installed, compressed as well, and otherwise uncompressed by :class:`console.ArrowIpc.ArrowIpc`.
+    """
+
+    def __init__(self, directory: str, archive_format: str = None) -> None:
+        self.__directory = directory
+        self.__format = archive_format or Archive.default_format()
+        if self.__format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format: {self.__format}")
+        if self.__format == PARQUET and not Archive.has_pyarrow():
+            raise ValueError("Parquet archives require pyarrow, use the arrow format instead")
+
+    @property
+    def directory(self) -> str:
+        return self.__directory
+
+    @property
+    def archive_format(self) -> str:
+        return self.__format
+
+    @staticmethod
+    def has_pyarrow() -> bool:
+        return importlib.util.find_spec("pyarrow") is not None
+
+    @staticmethod
+    def default_format() -> str:
+        return PARQUET if Archive.has_pyarrow() else ARROW
+
+    def find(self, session_id: int):
+        """The file of a session, or None if it is not archived."""
+        filenames = glob.glob(os.path.join(glob.escape(self.__directory), "date=*",
+                                           f"{session_id}{SUFFIXES[self.__format]}"))
+        return filenames[0] if filenames else None
+
+    def write(self, session_id: int, seconds: np.ndarray, columns: dict[str, np.ndarray]):
+        """Store the frame of a session, given as UTC epoch seconds and float columns, and return its file.
+
+        An empty frame is not stored and gives None.
+        """
+        if not len(seconds):
+            return None
+        day = datetime.datetime.fromtimestamp(int(seconds[0]), tz=datetime.timezone.utc).date()
+        directory = os.path.join(self.__directory, f"date={day.isoformat()}")
+        os.makedirs(directory, exist_ok=True)
+        filename = os.path.join(directory, f"{session_id}{SUFFIXES[self.__format]}")
+
+        table = [("session", INT64, np.full(len(seconds), session_id, dtype=np.int64), None),
+                 ("time", TIMESTAMP, seconds, None)]
+        for name, values in columns.items():
+            valid = ~np.isnan(values)
+            table.append((name, FLOAT64, np.where(valid, values, 0.0), None if valid.all() else valid))
+
+        # Only complete files are moved into place, the dataset skips hidden files like the one being written
+        temporary_filename = os.path.join(directory, f".{session_id}{SUFFIXES[self.__format]}.tmp")
+        try:
+            if Archive.has_pyarrow():
+                self.__write_with_pyarrow(temporary_filename, table)
+            else:
+                with open(temporary_filename, "wb") as f:
+                    ArrowIpc.write(f, table)
+            os.replace(temporary_filename, filename)
+        finally:
+            if os.path.exists(temporary_filename):
+                os.remove(temporary_filename)
+        return filename
+
+    def dataset(self):
+        """The archive as a ``pyarrow.dataset.Dataset``, e.g. for ``to_table(columns=[...], filter=...)``."""
+        import pyarrow.dataset
+        # only the files of the archive, other files may live next to it
+        filenames = sorted(glob.glob(os.path.join(glob.escape(self.__directory), "date=*",
+                                                  f"*{SUFFIXES[self.__format]}")))
+        return pyarrow.dataset.dataset(filenames, format=PARQUET if self.__format == PARQUET else "ipc",
+                                       partitioning=pyarrow.dataset.partitioning(flavor="hive"),
+                                       partition_base_dir=self.__directory)
+
+    def __write_with_pyarrow(self, filename: str, table):
+        import pyarrow
+        types = {INT64: pyarrow.int64(), FLOAT64: pyarrow.float64(), TIMESTAMP: pyarrow.timestamp("s", tz="UTC")}
+        arrays = [pyarrow.array(values, type=types[kind], mask=None if valid is None else ~valid)
+                  for _, kind, values, valid in table]
+        arrow_table = pyarrow.Table.from_arrays(arrays, names=[name for name, _, _, _ in table])
+        if self.__format == PARQUET:
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(arrow_table, filename, compression=COMPRESSION)
+        else:
+            import pyarrow.ipc
+            with pyarrow.ipc.new_file(filename, arrow_table.schema,
+                                      options=pyarrow.ipc.IpcWriteOptions(compression=COMPRESSION)) as writer:
+                writer.write_table(arrow_table)
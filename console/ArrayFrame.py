@@ -0,0 +1,193 @@
+import datetime
+
+import numpy as np
+
+CHUNK_SIZE = 4096
+# Seconds without samples after which a session counts as paused, longer gaps get no rows
+IDLE_GAP = 60
+
+
+class ArrayFrame(object):
+    """NumPy-only counterpart of :class:`console.DataFrame.DataFrame` for exporting, without importing pandas.
+
+    Rows are kept as sorted UTC epoch seconds with one float array per column. Loading, merging,
+    interpolation, summaries and chunks give the same values as the pandas frame, so that both
+    produce identical exports.
+
+    Rows are only created for the active segments of a session, a pause longer than ``IDLE_GAP``
+    leaves a gap in the index instead of a row for every idle second. Interpolation is by row position,
+    so it steps across such a pause from the last value before it to the first one after it.
+    """
+
+    __seconds: np.ndarray
+    __columns: dict[str, np.ndarray]
+
+    def __init__(self) -> None:
+        self.__seconds = np.empty(0, dtype=np.int64)
+        self.__columns = {}
+
+    def __len__(self):
+        return len(self.__seconds)
+
+    def init(self, start: datetime.datetime, end: datetime.datetime, seconds: np.ndarray = None):
+        """Start over with an empty row for every second from start to end.
+
+        With the UTC epoch ``seconds`` of the samples only the seconds of their active segments get rows.
+        """
+        if seconds is None:
+            self.__seconds = np.arange(ArrayFrame.__to_seconds(start), ArrayFrame.__to_seconds(end) + 1,
+                                       dtype=np.int64)
+        else:
+            self.__seconds = ArrayFrame.sparse_index(seconds, ArrayFrame.__to_seconds(start),
+                                                     ArrayFrame.__to_seconds(end))
+        self.__columns = {}
+
+    @staticmethod
+    def sparse_index(seconds: np.ndarray, start: int = None, end: int = None, idle_gap=IDLE_GAP) -> np.ndarray:
+        """Every second of the segments of ``seconds`` that are separated by more than ``idle_gap`` seconds.
+
+        The first segment is extended back to ``start`` and the last one up to ``end``.
+        """
+        seconds = np.unique(np.asarray(seconds, dtype=np.int64))
+        if not len(seconds):
+            return seconds
+        breaks = np.flatnonzero(np.diff(seconds) > idle_gap)
+        firsts = np.concatenate(([seconds[0]], seconds[breaks + 1]))
+        lasts = np.append(seconds[breaks], seconds[-1])
+        if start is not None:
+            firsts[0] = min(firsts[0], start)
+        if end is not None:
+            lasts[-1] = max(lasts[-1], end)
+        lengths = lasts - firsts + 1
+        # a running count within each segment added to the first second of its segment
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return np.repeat(firsts, lengths) + offsets
+
+    def load_from_arrays(self, seconds: np.ndarray, values: np.ndarray, column_name):
+        """Load a column from parallel arrays of UTC epoch seconds and values.
+
+        Like a dict, repeated timestamps keep the value that was added last. Seconds outside the
+        existing rows are added as rows, an empty frame gets rows for the active segments.
+        """
+        seconds = np.asarray(seconds, dtype=np.int64)
+        # np.unique returns the first occurrence, which in reverse is the last one added
+        unique_seconds, last = np.unique(seconds[::-1], return_index=True)
+        unique_values = np.asarray(values, dtype=float)[::-1][last]
+        if not len(self.__seconds):
+            self.__seconds = ArrayFrame.sparse_index(unique_seconds)
+        self.__extend(unique_seconds)
+        column = np.full(len(self.__seconds), np.nan)
+        column[np.searchsorted(self.__seconds, unique_seconds)] = unique_values
+        self.__columns[column_name] = column
+
+    def merge_asof(self, seconds: np.ndarray, values: np.ndarray, column_name, interpolated_column_name):
+        """Join sorted samples at UTC epoch seconds onto the existing rows without adding rows.
+
+        ``column_name`` receives the samples that fall on a row, ``interpolated_column_name`` the linear
+        interpolation in time between the previous and the next sample. Rows before the first or after the
+        last sample get no value.
+        """
+        sample_seconds = np.round(seconds).astype(np.int64)
+        sample_values = np.asarray(values, dtype=float)
+        keep = np.append(sample_seconds[1:] != sample_seconds[:-1], True)
+        sample_seconds, sample_values = sample_seconds[keep], sample_values[keep]
+
+        previous = np.searchsorted(sample_seconds, self.__seconds, side="right") - 1
+        following = np.searchsorted(sample_seconds, self.__seconds, side="left")
+        has_previous = previous >= 0
+        valid = has_previous & (following < len(sample_seconds))
+        previous, following = np.maximum(previous, 0), np.minimum(following, len(sample_seconds) - 1)
+
+        elapsed = (self.__seconds - sample_seconds[previous]).astype(float)
+        duration = (sample_seconds[following] - sample_seconds[previous]).astype(float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = np.where(duration > 0, elapsed / duration, 0.0)
+        interpolated = sample_values[previous] + ratio * (sample_values[following] - sample_values[previous])
+
+        exact = has_previous & (sample_seconds[previous] == self.__seconds)
+        self.__columns[column_name] = np.where(exact, sample_values[previous], np.nan)
+        self.__columns[interpolated_column_name] = np.where(valid, interpolated, np.nan)
+
+    def interpolate(self, existing_column, new_column, method="linear"):
+        """Fill gaps between values linearly by row position, values after the last one repeat it."""
+        if method != "linear":
+            raise ValueError(f"Unsupported interpolation method: {method}")
+        values = self.__columns[existing_column]
+        valid = ~np.isnan(values)
+        result = np.full(len(values), np.nan)
+        if valid.any():
+            positions = np.arange(len(values))
+            result = np.interp(positions, positions[valid], values[valid])
+            result[:np.argmax(valid)] = np.nan
+        self.__columns[new_column] = result
+
+    def summary(self, start, end, aggregations: dict[str, list[str]]) -> dict[str, dict[str, float]]:
+        """Compute aggregates, e.g. ``{'Watt': ['mean', 'max']}``, over the rows from start to end.
+
+        Missing values are skipped, columns missing from the frame are left out of the result.
+        """
+        window = self.__window(start, end)
+        summary: dict[str, dict[str, float]] = {}
+        for column, aggs in aggregations.items():
+            if column not in self.__columns:
+                continue
+            values = self.__columns[column][window]
+            missing = np.isnan(values)
+            for agg in aggs:
+                summary.setdefault(column, {})[agg] = ArrayFrame.__aggregate(agg, values, missing)
+        return summary
+
+    def chunks(self, start, end, columns, dropnan_columns=None, chunk_size=CHUNK_SIZE):
+        """Yield blocks of rows as UTC epoch seconds and a dict of float arrays per column.
+
+        Columns missing from the frame are left out of the dict.
+        """
+        window = self.__window(start, end)
+        rows = np.arange(len(self.__seconds))[window]
+        for column in dropnan_columns or []:
+            rows = rows[~np.isnan(self.__columns[column][rows])]
+        arrays = {column: self.__columns[column][rows] for column in columns if column in self.__columns}
+        seconds = self.__seconds[rows]
+        for offset in range(0, len(rows), chunk_size):
+            block = slice(offset, offset + chunk_size)
+            yield seconds[block], {column: values[block] for column, values in arrays.items()}
+
+    def pprint(self, start, end):
+        window = self.__window(start, end)
+        names = list(self.__columns)
+        print("\t".join(["Time"] + names))
+        for row in np.arange(len(self.__seconds))[window]:
+            time = datetime.datetime.fromtimestamp(int(self.__seconds[row]), tz=datetime.timezone.utc)
+            print("\t".join([str(time)] + [f"{self.__columns[name][row]:g}" for name in names]))
+        print(f"[{np.count_nonzero(window)} rows x {len(names)} columns]")
+
+    def __extend(self, seconds: np.ndarray):
+        """Add rows for ``seconds`` that are not rows yet, existing columns get no value there."""
+        index = np.union1d(self.__seconds, seconds)
+        if len(index) == len(self.__seconds):
+            return
+        positions = np.searchsorted(index, self.__seconds)
+        for name, values in self.__columns.items():
+            column = np.full(len(index), np.nan)
+            column[positions] = values
+            self.__columns[name] = column
+        self.__seconds = index
+
+    def __window(self, start, end) -> slice:
+        first = np.searchsorted(self.__seconds, ArrayFrame.__to_seconds(start), side="left")
+        last = np.searchsorted(self.__seconds, ArrayFrame.__to_seconds(end), side="right")
+        return slice(first, last)
+
+    @staticmethod
+    def __aggregate(agg, values, missing):
+        if agg == "max":
+            return values[~missing].max() if not missing.all() else np.nan
+        if agg == "mean":
+            # Same summation as pandas: missing values count as 0 in the sum and not at all in the count
+            count = len(values) - np.count_nonzero(missing)
+            return np.where(missing, 0.0, values).sum() / count if count else np.nan
+        raise ValueError(f"Unsupported aggregation: {agg}")
+
+    @staticmethod
+    def __to_seconds(time: datetime.datetime) -> int:
+        return round(time.timestamp())
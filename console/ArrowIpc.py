@@ -0,0 +1,154 @@
+import struct
+
+import numpy as np
+
+MAGIC = b"ARROW1"
+CONTINUATION = b"\xff\xff\xff\xff"
+METADATA_VERSION = 4  # V5
+
+# Message header and field type union members of the Arrow format (Message.fbs and Schema.fbs)
+SCHEMA_HEADER = 1
+RECORD_BATCH_HEADER = 3
+INT_TYPE = 2
+FLOATING_POINT_TYPE = 3
+TIMESTAMP_TYPE = 10
+DOUBLE_PRECISION = 2
+SECOND_UNIT = 0
+
+# Column types that can be written, with their NumPy dtype
+INT64 = "int64"
+FLOAT64 = "float64"
+TIMESTAMP = "timestamp[s, UTC]"
+DTYPES = {INT64: "<i8", FLOAT64: "<f8", TIMESTAMP: "<i8"}
+
+# Flatbuffer structs: FieldNode and Buffer are two longs, Block a long, an int and a long
+TWO_LONGS = struct.Struct("<qq")
+BLOCK = struct.Struct("<qi4xq")
+
+
+class ArrowIpc(object):
+    """Writer for the Arrow IPC file format without pyarrow, for archives on machines that do not have it.
+
+    Only what the archive needs is supported: a single record batch of 64 bit integer, double and UTC
+    timestamp columns, uncompressed, where ``None`` in the validity marks a column without nulls. The
+    flatbuffers of the format are laid out front to back, every offset points to a later object.
+    """
+
+    @staticmethod
+    def write(f, columns: list[tuple[str, str, np.ndarray, np.ndarray]]):
+        """Write ``(name, type, values, valid)`` columns of equal length as one record batch."""
+        length = len(columns[0][2]) if columns else 0
+        fields = ("tables", [ArrowIpc.__field(name, kind) for name, kind, _, _ in columns])
+        schema = ("table", [(1, "ref", fields)])
+
+        nodes, buffers, body = [], [], bytearray()
+        for _, kind, values, valid in columns:
+            nodes.append((length, 0 if valid is None else length - int(np.count_nonzero(valid))))
+            bitmap = b"" if valid is None else np.packbits(valid, bitorder="little").tobytes()
+            for data in (bitmap, np.ascontiguousarray(values, dtype=DTYPES[kind]).tobytes()):
+                buffers.append((len(body), len(data)))
+                body += data + bytes(-len(data) % 8)
+        record_batch = ("table", [(0, "q", length), (1, "ref", ("structs", TWO_LONGS, nodes)),
+                                  (2, "ref", ("structs", TWO_LONGS, buffers))])
+
+        f.write(MAGIC + bytes(2))
+        position = len(MAGIC) + 2
+        position += ArrowIpc.__write_message(f, SCHEMA_HEADER, schema, b"")
+        block = (position, ArrowIpc.__write_message(f, RECORD_BATCH_HEADER, record_batch, bytes(body)), len(body))
+        f.write(CONTINUATION + bytes(4))
+
+        footer = ArrowIpc.__flatbuffer(("table", [(0, "h", METADATA_VERSION), (1, "ref", schema),
+                                                  (3, "ref", ("structs", BLOCK, [block]))]))
+        f.write(footer + struct.pack("<i", len(footer)) + MAGIC)
+
+    @staticmethod
+    def __field(name: str, kind: str):
+        if kind == INT64:
+            type_type, field_type = INT_TYPE, ("table", [(0, "i", 64), (1, "B", 1)])
+        elif kind == FLOAT64:
+            type_type, field_type = FLOATING_POINT_TYPE, ("table", [(0, "h", DOUBLE_PRECISION)])
+        elif kind == TIMESTAMP:
+            type_type, field_type = TIMESTAMP_TYPE, ("table", [(0, "h", SECOND_UNIT), (1, "ref", ("string", "UTC"))])
+        else:
+            raise ValueError(f"Unsupported column type: {kind}")
+        return ("table", [(0, "ref", ("string", name)), (1, "B", 1), (2, "B", type_type), (3, "ref", field_type),
+                          (5, "ref", ("tables", []))])
+
+    @staticmethod
+    def __write_message(f, header_type: int, header, body: bytes) -> int:
+        """Write an encapsulated message with its body and return the length of its metadata."""
+        metadata = ArrowIpc.__flatbuffer(("table", [(0, "h", METADATA_VERSION), (1, "B", header_type),
+                                                    (2, "ref", header), (3, "q", len(body))]))
+        f.write(CONTINUATION + struct.pack("<i", len(metadata)) + metadata + body)
+        return len(CONTINUATION) + 4 + len(metadata)
+
+    @staticmethod
+    def __flatbuffer(root) -> bytes:
+        buffer = bytearray(4)
+        struct.pack_into("<I", buffer, 0, ArrowIpc.__serialize(buffer, root))
+        return bytes(buffer + bytes(-len(buffer) % 8))
+
+    @staticmethod
+    def __serialize(buffer: bytearray, node) -> int:
+        """Append a table, string or vector and return its position."""
+        kind, value = node[0], node[1]
+        if kind == "table":
+            return ArrowIpc.__serialize_table(buffer, value)
+        if kind == "string":
+            ArrowIpc.__pad(buffer, 4)
+            position = len(buffer)
+            data = value.encode("utf-8")
+            buffer += struct.pack("<I", len(data)) + data + b"\x00"
+            return position
+        if kind == "tables":
+            ArrowIpc.__pad(buffer, 4)
+            position = len(buffer)
+            buffer += struct.pack("<I", len(value)) + bytes(4 * len(value))
+            for index, child in enumerate(value):
+                ArrowIpc.__patch(buffer, position + 4 + 4 * index, ArrowIpc.__serialize(buffer, child))
+            return position
+        # vector of structs, elements are 8 byte aligned after the length
+        ArrowIpc.__pad(buffer, 8, 4)
+        position = len(buffer)
+        buffer += struct.pack("<I", len(node[2])) + b"".join(value.pack(*element) for element in node[2])
+        return position
+
+    @staticmethod
+    def __serialize_table(buffer: bytearray, fields) -> int:
+        # inline fields from large to small after the offset to the vtable keep every field aligned
+        layout, size = {}, 4
+        for slot, fmt, _ in sorted(fields, key=lambda field: -ArrowIpc.__size(field[1])):
+            width = ArrowIpc.__size(fmt)
+            size += -size % width
+            layout[slot] = size
+            size += width
+        slots = max(slot for slot, _, _ in fields) + 1
+        vtable = struct.pack(f"<HH{slots}H", 4 + 2 * slots, size, *(layout.get(slot, 0) for slot in range(slots)))
+
+        ArrowIpc.__pad(buffer, 2)
+        vtable_position = len(buffer)
+        buffer += vtable
+        ArrowIpc.__pad(buffer, 8)
+        position = len(buffer)
+        buffer += bytes(size)
+        struct.pack_into("<i", buffer, position, position - vtable_position)
+        for slot, fmt, value in fields:
+            if fmt != "ref":
+                struct.pack_into(f"<{fmt}", buffer, position + layout[slot], value)
+        for slot, fmt, value in fields:
+            if fmt == "ref":
+                ArrowIpc.__patch(buffer, position + layout[slot], ArrowIpc.__serialize(buffer, value))
+        return position
+
+    @staticmethod
+    def __size(fmt: str) -> int:
+        return 4 if fmt == "ref" else struct.calcsize(f"<{fmt}")
+
+    @staticmethod
+    def __patch(buffer: bytearray, position: int, target: int):
+        """Store the offset from ``position`` forward to ``target``."""
+        struct.pack_into("<I", buffer, position, target - position)
+
+    @staticmethod
+    def __pad(buffer: bytearray, alignment: int, remainder=0):
+        buffer += bytes((remainder - len(buffer)) % alignment)
@@ -0,0 +1,151 @@
+import datetime
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from console.Archive import Archive
+from console.Export import Export, NUMPY
+from console.Profiler import Profiler
+from console.Reader import Reader, RECORDING_PATTERN
+
+
+def export_recording(record_filename, output_filename, fit_input=None, tcx_input=None,
+                     clock_offset=datetime.timedelta(0), use_cache=True, profiler: Profiler = None,
+                     debug=False, engine=NUMPY, archive: Archive = None) -> int:
+    """Convert a single recording to TCX and return the number of samples it contained.
+
+    With an ``archive`` the resampled data is added to it as well, as the session named like the recording.
+    """
+    profiler = profiler or Profiler(enabled=False)
+    export = Export(use_cache=use_cache, profiler=profiler, debug=debug, engine=engine)
+
+    if fit_input:
+        export.load_heart_rate_from_fit(fit_input, clock_offset=clock_offset)
+    elif tcx_input:
+        export.load_heart_rate_from_tcx(tcx_input, clock_offset=clock_offset)
+
+    with profiler.stage("read recording") as stage:
+        reader = Reader.from_file(record_filename)
+        stage.rows = len(reader)
+    export.add_track_points(reader)
+
+    # Only complete files are moved into place, so a failed export never looks up to date
+    temporary_filename = output_filename + ".tmp"
+    try:
+        with open(temporary_filename, 'wb') as f:
+            export.write(f)
+        os.replace(temporary_filename, output_filename)
+    finally:
+        if os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+    if archive:
+        match = RECORDING_PATTERN.match(os.path.basename(record_filename))
+        export.write_archive(archive, session_id=int(match.group(1)) if match else None)
+    return len(reader)
+
+
+class Job(object):
+    record_filename: str
+    output_filename: str
+    fit_input: str = None
+    tcx_input: str = None
+    archive: Archive = None
+    session_id: int = None
+
+    def __init__(self, record_filename, output_filename, fit_input=None, tcx_input=None, archive: Archive = None,
+                 session_id: int = None):
+        self.record_filename = record_filename
+        self.output_filename = output_filename
+        self.fit_input = fit_input
+        self.tcx_input = tcx_input
+        self.archive = archive
+        self.session_id = session_id
+
+    def inputs(self):
+        return [filename for filename in (self.record_filename, self.fit_input, self.tcx_input) if filename]
+
+    def outputs(self):
+        """The TCX file and with an archive the archived session, None where the session is not archived."""
+        if self.archive is None:
+            return [self.output_filename]
+        return [self.output_filename, self.archive.find(self.session_id)]
+
+    def is_up_to_date(self):
+        outputs = self.outputs()
+        if None in outputs:
+            return False
+        try:
+            output_mtime = min(os.stat(filename).st_mtime_ns for filename in outputs)
+        except FileNotFoundError:
+            return False
+        return all(os.stat(filename).st_mtime_ns <= output_mtime for filename in self.inputs())
+
+
+class Batch(object):
+    """Export every recording of a directory, spread over a pool of worker processes.
+
+    Recordings are ``<id>.txt``, ``<id>.txt.gz`` or ``<id>.bin`` files, heart rate data is picked up from
+    ``<id>_watch.fit`` or ``<id>_watch.tcx`` next to them.
+    """
+
+    def __init__(self, input_directory, output_directory, workers=None, use_cache=True, engine=NUMPY,
+                 archive: Archive = None):
+        self.__input_directory = input_directory
+        self.__output_directory = output_directory
+        self.__workers = workers
+        self.__use_cache = use_cache
+        self.__engine = engine
+        self.__archive = archive
+
+    def find_jobs(self) -> list[Job]:
+        jobs = []
+        recording_ids = set()
+        for filename in sorted(os.listdir(self.__input_directory)):
+            match = RECORDING_PATTERN.match(filename)
+            if not match or match.group(1) in recording_ids:
+                continue
+            recording_id = match.group(1)
+            recording_ids.add(recording_id)
+            fit_input = self.__find_input(recording_id + "_watch.fit")
+            tcx_input = None if fit_input else self.__find_input(recording_id + "_watch.tcx")
+            jobs.append(Job(os.path.join(self.__input_directory, filename),
+                            os.path.join(self.__output_directory, recording_id + ".tcx"),
+                            fit_input=fit_input, tcx_input=tcx_input, archive=self.__archive,
+                            session_id=int(recording_id)))
+        return jobs
+
+    def run(self) -> int:
+        """Export all recordings that are not up to date and return the number of failures."""
+        os.makedirs(self.__output_directory, exist_ok=True)
+        jobs = self.find_jobs()
+        pending = [job for job in jobs if not job.is_up_to_date()]
+        print(f"Found {len(jobs)} recordings, {len(jobs) - len(pending)} up to date.")
+
+        started = time.perf_counter()
+        exported, samples, failures = 0, 0, 0
+        with ProcessPoolExecutor(max_workers=self.__workers) as executor:
+            futures = {executor.submit(export_recording, job.record_filename, job.output_filename,
+                                       job.fit_input, job.tcx_input, use_cache=self.__use_cache,
+                                       engine=self.__engine, archive=self.__archive): job
+                       for job in pending}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    count = future.result()
+                except Exception as e:
+                    failures += 1
+                    print(f"Failed {job.record_filename}: {e!r}")
+                    continue
+                exported += 1
+                samples += count
+                print(f"Exported {job.record_filename} -> {job.output_filename} ({count} samples)")
+
+        elapsed = time.perf_counter() - started
+        rate = (exported / elapsed, samples / elapsed) if elapsed > 0 else (0.0, 0.0)
+        print(f"Exported {exported} files ({samples} samples) in {elapsed:.2f}s, "
+              f"{rate[0]:.2f} files/s, {rate[1]:.0f} samples/s, {failures} failed.")
+        return failures
+
+    def __find_input(self, filename):
+        path = os.path.join(self.__input_directory, filename)
+        return path if os.path.isfile(path) else None
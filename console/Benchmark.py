@@ -0,0 +1,162 @@
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from console.Capture import Capture
+from console.DataFrame import DataFrame
+from console.Export import Export, CALPH, CALPH_LINEAR, ENGINES
+from console.HeartRate import HeartRate
+from console.Reader import Reader
+from console.Synthetic import Synthetic
+
+EXPORT_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "export.py")
+# Runs a script as __main__ and reports the peak resident memory of the process on stderr, where available
+PEAK_MEMORY_WRAPPER = """
+import os, runpy, sys
+sys.argv = sys.argv[1:]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+finally:
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as f:
+            sys.stderr.write("".join(line for line in f if line.startswith("VmHWM:")))
+"""
+# Wall time of a complete export.py run for the 15 minute session without heart rate data
+STARTUP_TARGET = 0.25
+
+
+class Benchmark(object):
+    """Time and measure the peak memory of parsing, HR loading and export on synthetic sessions.
+
+    Every stage runs ``repeat`` times for the fastest wall time and once more under ``tracemalloc`` for
+    its peak memory, so that tracing does not distort the timing.
+    """
+
+    def __init__(self, directory: str, repeat=1) -> None:
+        self.__directory = directory
+        self.__repeat = repeat
+
+    def run(self, name: str, duration: int) -> list[dict]:
+        """Generate the session ``name`` of ``duration`` seconds and benchmark all stages on it."""
+        recording, fit, tcx = (os.path.join(self.__directory, f"{name}{suffix}")
+                               for suffix in (".txt", "_watch.fit", "_watch.tcx"))
+        synthetic = Synthetic(duration)
+        synthetic.write_recording(recording)
+        synthetic.write_fit(fit)
+        synthetic.write_tcx(tcx)
+
+        lines = [line.split(" ") for line in synthetic.recording().decode("utf-8").splitlines()]
+        captures = [Capture(int(milliseconds), data) for milliseconds, data in lines]
+        calories = {capture.utc_time: capture.calories_per_hour for capture in captures}
+
+        stages = {
+            "Capture": lambda: [Capture(int(milliseconds), data) for milliseconds, data in lines],
+            "Reader.from_file": lambda: Reader.from_file(recording),
+            "DataFrame.load_from_dict+interpolate": lambda: Benchmark.__load_and_interpolate(calories),
+            "HeartRate.from_fit": lambda: HeartRate.from_fit(fit),
+            "HeartRate.from_tcx": lambda: HeartRate.from_tcx(tcx),
+            "Export.write": lambda: Benchmark.__export(recording, fit),
+        }
+        results = [self.__measure(name, len(lines), stage, func) for stage, func in stages.items()]
+        for engine in ENGINES:
+            results.append(self.__measure_process(name, len(lines), f"export.py --engine {engine}",
+                                                  [EXPORT_SCRIPT, "--engine", engine, recording,
+                                                   os.path.join(self.__directory, f"{name}.tcx")]))
+        return results
+
+    @staticmethod
+    def revision() -> str:
+        """Short hash of the checked out commit, marked ``-dirty`` if tracked files were changed."""
+        try:
+            revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                      check=True).stdout.strip()
+            changes = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                                     text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return "unknown"
+        return revision + "-dirty" if changes else revision
+
+    @staticmethod
+    def save(results: list[dict], filename: str):
+        """Append results as JSON lines, tagged with the revision, time and Python version."""
+        revision = Benchmark.revision()
+        timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+        with open(filename, "a", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps({"revision": revision, "timestamp": timestamp,
+                                    "python": platform.python_version(), **result}) + "\n")
+
+    @staticmethod
+    def load(filename: str) -> list[dict]:
+        if not os.path.exists(filename):
+            return []
+        with open(filename, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    @staticmethod
+    def report(results: list[dict], previous: list[dict]) -> str:
+        """Format results as a table, compared with the latest earlier result of each session and stage."""
+        baseline = {(result["session"], result["stage"]): result for result in previous}
+        rows = [f"{'session':<8}{'stage':<40}{'lines':>8}{'seconds':>10}{'peak MiB':>10}  change"]
+        for result in results:
+            peak = f"{result['peak_bytes'] / 2 ** 20:.1f}" if result["peak_bytes"] is not None else "-"
+            row = f"{result['session']:<8}{result['stage']:<40}{result['lines']:>8}{result['seconds']:>10.3f}{peak:>10}"
+            before = baseline.get((result["session"], result["stage"]))
+            if before and before["seconds"]:
+                row += f"  {result['seconds'] / before['seconds'] - 1:+.0%} time"
+                if result["peak_bytes"] is not None and before["peak_bytes"]:
+                    row += f", {result['peak_bytes'] / before['peak_bytes'] - 1:+.0%} memory"
+                row += f" vs {before['revision']}"
+            if result["stage"] == f"export.py --engine {ENGINES[0]}" and result["session"] == "15min" \
+                    and result["seconds"] > STARTUP_TARGET:
+                row += f"  over the target of {STARTUP_TARGET:.2f}s"
+            rows.append(row)
+        return "\n".join(rows)
+
+    def __measure(self, name, lines, stage, func) -> dict:
+        seconds = []
+        for _ in range(self.__repeat):
+            started = time.perf_counter()
+            func()
+            seconds.append(time.perf_counter() - started)
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {"session": name, "stage": stage, "lines": lines, "seconds": min(seconds), "peak_bytes": peak}
+
+    def __measure_process(self, name, lines, stage, arguments) -> dict:
+        """Run a script as a new process, including interpreter startup and imports."""
+        seconds, peak = [], None
+        for _ in range(self.__repeat):
+            started = time.perf_counter()
+            process = subprocess.run([sys.executable, "-c", PEAK_MEMORY_WRAPPER] + arguments,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+            seconds.append(time.perf_counter() - started)
+            for line in process.stderr.splitlines():
+                if line.startswith("VmHWM:"):
+                    peak = max(peak or 0, int(line.split()[1]) * 1024)
+        return {"session": name, "stage": stage, "lines": lines, "seconds": min(seconds), "peak_bytes": peak}
+
+    @staticmethod
+    def __load_and_interpolate(calories):
+        frame = DataFrame()
+        frame.load_from_dict(calories, CALPH)
+        frame.interpolate(CALPH, CALPH_LINEAR, method="linear")
+
+    @staticmethod
+    def __export(recording, fit):
+        export = Export(use_cache=False)
+        export.load_heart_rate_from_fit(fit)
+        export.add_track_points(Reader.from_file(recording))
+        with contextlib.redirect_stdout(io.StringIO()):
+            export.write(io.BytesIO())
@@ -0,0 +1,54 @@
+import numpy as np
+
+from console.Reader import Reader, RECORD_DTYPE, BINARY_HEADER, BINARY_MAGIC, BINARY_VERSION, GZIP_MAGIC
+
+
+class Binary(object):
+    """Writing and converting the binary session format, see ``Reader.from_binary_file`` for reading it.
+
+    A file consists of a 16 byte header followed by packed records of ``RECORD_DTYPE``.
+    """
+
+    @staticmethod
+    def header() -> bytes:
+        return BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, RECORD_DTYPE.itemsize)
+
+    @staticmethod
+    def encode(milliseconds: int, raw: str) -> bytes:
+        """Pack a single line as received from the console into one record."""
+        return Reader.parse(f"{milliseconds} {raw}\n".encode("utf-8")).tobytes()
+
+    @staticmethod
+    def to_text(records: np.ndarray) -> bytes:
+        """Format records as the lines of a TXT recording, exactly as they were received."""
+        def digits(name, width):
+            return np.strings.zfill(records[name].astype(str), width)
+
+        parts = [records["milliseconds"].astype(str), " A", records["status"].astype(str),
+                 digits("minutes", 2), digits("seconds", 2), digits("distance", 5), records["separator"].astype(str),
+                 digits("minutes_to_500m", 2), digits("seconds_to_500m", 2), digits("strokes_per_minute", 3),
+                 digits("watt", 3), digits("calories_per_hour", 4), digits("level", 2), "\n"]
+        lines = parts[0]
+        for part in parts[1:]:
+            lines = np.strings.add(lines, part)
+        return "".join(lines.tolist()).encode("utf-8")
+
+    @staticmethod
+    def convert_to_binary(text_filename: str, binary_filename: str):
+        """Convert a TXT recording, also gzip compressed, refusing lines that would not convert back unchanged."""
+        with open(text_filename, "rb") as f:
+            data = f.read()
+        if data.startswith(GZIP_MAGIC):
+            data = Reader.decompress(text_filename)[0]
+        records = Reader.parse(data)
+        if Binary.to_text(records) != data:
+            raise ValueError(f"{text_filename} cannot be converted without loss")
+        with open(binary_filename, "wb") as f:
+            f.write(Binary.header())
+            f.write(records.tobytes())
+
+    @staticmethod
+    def convert_to_text(binary_filename: str, text_filename: str):
+        records = Reader.from_binary_file(binary_filename).records
+        with open(text_filename, "wb") as f:
+            f.write(Binary.to_text(records))
@@ -1,39 +1,96 @@
 from datetime import datetime, timedelta, timezone
 
+RECORD_LENGTH = 29
+
 
 class Capture(object):
+    """A single line received from the console, decoded on demand.
+
+    Only the timestamp and the raw record are stored, every field is decoded from the raw record when
+    it is read. The record can be given as ``str``, ``bytes`` or ``memoryview``. Captures compare equal
+    when both timestamp and record are equal and pickle to just these two values.
+    """
+
+    __slots__ = ("milliseconds", "raw")
+
+    milliseconds: int
+    raw: bytes
+
+    def __init__(self, milliseconds: int, raw):
+        if isinstance(raw, str):
+            raw = raw.encode("ascii", errors="replace")
+        elif not isinstance(raw, bytes):
+            raw = bytes(raw)
+        if raw[:1] != b"A":
+            raise ValueError(f"Unsupported record type: {raw[:1]!r}")
+        if len(raw) < RECORD_LENGTH:
+            raise ValueError(f"Truncated record: {raw!r}")
+        self.milliseconds = milliseconds
+        self.raw = raw
+
+    @staticmethod
+    def distance_from_raw(raw) -> int:
+        """Decode only the distance of a raw record, without building a capture."""
+        return int(raw[7:12], base=10)
+
+    @staticmethod
+    def is_valid(raw) -> bool:
+        """Whether a raw ``str`` or ``bytes`` record is complete, ASCII, and all of its numeric fields are digits.
+
+        The status and separator characters have to be printable, so that the record keeps its fixed byte
+        offsets in a session file and encodes into the binary format.
+        """
+        record = raw[:RECORD_LENGTH]
+        if isinstance(record, str):
+            if not record.isascii():
+                return False
+            record = record.encode("ascii")
+        return (len(record) == RECORD_LENGTH and record[:1] == b"A"
+                and all(0x21 <= character <= 0x7e for character in record[1:3] + record[12:13])
+                and record[3:12].isdigit() and record[13:].isdigit())
 
-    time: datetime = None
-    utc_time: datetime = None
-    elapsed_time: timedelta = None
-    distance: int = None
+    @property
+    def utc_time(self) -> datetime:
+        return datetime.fromtimestamp(int(self.milliseconds / 1000), tz=timezone.utc)
 
-    time_to_500m: timedelta = None
-    strokes_per_minute: int = None
-    watt: int = None
-    calories_per_hour: int = None
+    @property
+    def elapsed_time(self) -> timedelta:
+        return timedelta(minutes=int(self.raw[3:5], base=10), seconds=int(self.raw[5:7], base=10))
 
-    level: int = None
+    @property
+    def distance(self) -> int:
+        return int(self.raw[7:12], base=10)
 
-    def __init__(self, milliseconds: int, raw: str):
-        assert raw[0] == 'A'
+    @property
+    def time_to_500m(self) -> timedelta:
+        return timedelta(minutes=int(self.raw[13:15], base=10), seconds=int(self.raw[15:17], base=10))
 
-        self.utc_time = datetime.fromtimestamp(int(milliseconds / 1000), tz=timezone.utc)
+    @property
+    def strokes_per_minute(self) -> int:
+        return int(self.raw[17:20], base=10)
 
-        total_minutes = int(raw[3:5], base=10)
-        total_seconds = int(raw[5:7], base=10)
-        self.elapsed_time = timedelta(minutes=total_minutes, seconds=total_seconds)
+    @property
+    def watt(self) -> int:
+        return int(self.raw[20:23], base=10)
 
-        self.distance = int(raw[7:12], base=10)
+    @property
+    def calories_per_hour(self) -> int:
+        return int(self.raw[23:27], base=10)
 
-        minutes_to_500m = int(raw[13:15], base=10)
-        seconds_to_500m = int(raw[15:17], base=10)
-        self.time_to_500m = timedelta(minutes=minutes_to_500m, seconds=seconds_to_500m)
+    @property
+    def level(self) -> int:
+        return int(self.raw[27:29], base=10)
 
-        self.strokes_per_minute = int(raw[17:20], base=10)
+    def __eq__(self, other):
+        if not isinstance(other, Capture):
+            return NotImplemented
+        return self.milliseconds == other.milliseconds and self.raw == other.raw
 
-        self.watt = int(raw[20:23], base=10)
+    def __hash__(self):
+        return hash((self.milliseconds, self.raw))
 
-        self.calories_per_hour = int(raw[23:27], base=10)
+    def __reduce__(self):
+        return Capture, (self.milliseconds, self.raw)
 
-        self.level = int(raw[27:29], base=10)
+    def __repr__(self):
+        return f"Capture({self.milliseconds!r}, {self.raw.decode('ascii', errors='replace')!r})"
@@ -0,0 +1,286 @@
+import datetime
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+from console.ArrayFrame import IDLE_GAP
+from console.Reader import Reader, BINARY_HEADER, BINARY_MAGIC, GZIP_MAGIC, RECORD_DTYPE, RECORDING_PATTERN
+
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    filename TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    tail BLOB NOT NULL,
+    lines INTEGER NOT NULL,
+    start_time INTEGER,
+    end_time INTEGER,
+    duration INTEGER,
+    distance INTEGER,
+    average_watts REAL,
+    maximum_watts INTEGER,
+    average_spm REAL,
+    maximum_spm INTEGER,
+    calories REAL,
+    heart_rate_filename TEXT,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_start_time ON sessions (start_time);
+CREATE INDEX IF NOT EXISTS sessions_distance ON sessions (distance);
+CREATE INDEX IF NOT EXISTS sessions_directory ON sessions (directory);
+"""
+SUMMARY_COLUMNS = ["filename", "id", "lines", "start_time", "end_time", "duration", "distance", "average_watts",
+                   "maximum_watts", "average_spm", "maximum_spm", "calories", "heart_rate_filename"]
+ORDERS = ["start_time", "duration", "distance", "average_watts", "calories"]
+# Bytes before the indexed offset that must be unchanged for a file to count as appended to
+TAIL_SIZE = 64
+
+
+class Catalog(object):
+    """SQLite index of recordings with the lap statistics of their export, for fast queries over many sessions.
+
+    ``update`` only reads what is new: files with unchanged size and modification time are skipped and
+    files that grew only get their appended complete lines parsed, as long as the last bytes before the
+    indexed offset are unchanged. Everything else is indexed again from the start. The statistics are the
+    ones ``Export.write`` puts into the lap, one sample per second where the last one wins; lines that go
+    back in time are ignored like in ``LiveExport``.
+
+    Times are UTC epoch seconds, the duration is in seconds and the distance in meters. Gzip compressed
+    recordings that changed are decompressed once per update as a whole, their offsets count uncompressed
+    bytes.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.__connection = sqlite3.connect(filename)
+        self.__connection.row_factory = sqlite3.Row
+        if self.__connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # the catalog only holds derived data, an outdated one is simply built again
+            self.__connection.execute("DROP TABLE IF EXISTS sessions")
+            self.__connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.__connection.executescript(SCHEMA)
+
+    def close(self):
+        self.__connection.close()
+
+    def update(self, directory: str) -> dict[str, int]:
+        """Bring the sessions of a directory up to date and return how many were added, appended, unchanged,
+        indexed again, removed and failed."""
+        directory = os.path.abspath(directory)
+        counts = dict.fromkeys(["added", "appended", "unchanged", "reindexed", "removed", "failed"], 0)
+        known = {row["filename"]: row for row in
+                 self.__connection.execute("SELECT * FROM sessions WHERE directory = ?", (directory,))}
+        found = set()
+        with self.__connection:
+            for name in sorted(os.listdir(directory)):
+                match = RECORDING_PATTERN.match(name)
+                if not match:
+                    continue
+                filename = os.path.join(directory, name)
+                found.add(filename)
+                try:
+                    counts[self.__update_file(filename, int(match.group(1)), known.get(filename))] += 1
+                except (OSError, ValueError) as e:
+                    counts["failed"] += 1
+                    print(f"Failed {filename}: {e!r}")
+            for filename in known.keys() - found:
+                self.__connection.execute("DELETE FROM sessions WHERE filename = ?", (filename,))
+                counts["removed"] += 1
+        return counts
+
+    def sessions(self, since: datetime.datetime = None, until: datetime.datetime = None, min_distance=None,
+                 min_duration=None, order="start_time", descending=False, limit=None) -> list[dict]:
+        """Summaries of the sessions that started in ``[since, until)`` and reach the minimum distance in meters
+        and duration in seconds."""
+        if order not in ORDERS:
+            raise ValueError(f"Unsupported order: {order}")
+        where, parameters = Catalog.__filter(since, until, min_distance, min_duration)
+        query = f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM sessions {where} " \
+                f"ORDER BY {order} {'DESC' if descending else 'ASC'}, filename"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        return [dict(row) for row in self.__connection.execute(query, parameters)]
+
+    def totals(self, since: datetime.datetime = None, until: datetime.datetime = None, min_distance=None,
+               min_duration=None) -> dict:
+        """Number of sessions and their total duration, distance and calories, filtered as in ``sessions``."""
+        where, parameters = Catalog.__filter(since, until, min_distance, min_duration)
+        row = self.__connection.execute(
+            "SELECT COUNT(*) AS sessions, COALESCE(SUM(duration), 0) AS duration, "
+            f"COALESCE(SUM(distance), 0) AS distance, COALESCE(SUM(calories), 0) AS calories FROM sessions {where}",
+            parameters).fetchone()
+        return dict(row)
+
+    def __update_file(self, filename: str, session_id: int, row) -> str:
+        stat = os.stat(filename)
+        heart_rate_filename = Catalog.__find_heart_rate(filename, session_id)
+        if row and row["size"] == stat.st_size and row["mtime_ns"] == stat.st_mtime_ns:
+            if row["heart_rate_filename"] != heart_rate_filename:
+                self.__connection.execute("UPDATE sessions SET heart_rate_filename = ? WHERE filename = ?",
+                                          (heart_rate_filename, filename))
+            return "unchanged"
+
+        result = "added"
+        offset, lines, state = (0, 0, Catalog.__empty_state())
+        data = Catalog.__decompress(filename)
+        if row:
+            result = "reindexed"
+            if stat.st_size > row["size"] and Catalog.__tail(filename, row["offset"], data) == row["tail"]:
+                result = "appended"
+                offset, lines, state = (row["offset"], row["lines"], json.loads(row["state"]))
+
+        reader, offset = Catalog.__read(filename, offset, data)
+        if len(reader):
+            Catalog.__add(state, reader)
+        summary = Catalog.__summary(state)
+        self.__connection.execute(
+            "INSERT OR REPLACE INTO sessions (filename, directory, id, size, mtime_ns, offset, tail, lines, "
+            f"{', '.join(summary)}, heart_rate_filename, state) VALUES ({', '.join(['?'] * (len(summary) + 10))})",
+            (filename, os.path.dirname(filename), session_id, stat.st_size, stat.st_mtime_ns, offset,
+             Catalog.__tail(filename, offset, data), lines + len(reader), *summary.values(), heart_rate_filename,
+             json.dumps(state)))
+        return result
+
+    @staticmethod
+    def __decompress(filename: str):
+        """The uncompressed content of a gzip recording, or None for other recordings."""
+        with open(filename, "rb") as f:
+            if f.read(len(GZIP_MAGIC)) != GZIP_MAGIC:
+                return None
+        return Reader.decompress(filename)[0]
+
+    @staticmethod
+    def __read(filename: str, offset: int, decompressed: bytes = None) -> tuple[Reader, int]:
+        """Decode the complete lines or records from ``offset`` on and return them with the offset after them.
+
+        ``decompressed`` is the content of a gzip recording, which offsets refer to.
+        """
+        with open(filename, "rb") as f:
+            is_binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+            if decompressed is not None:
+                data = decompressed[offset:]
+            elif is_binary and not offset:
+                if f.seek(0, 2) < BINARY_HEADER.size:
+                    return Reader(records=np.empty(0, dtype=RECORD_DTYPE)), 0
+                reader = Reader.from_binary_file(filename)
+                return reader, BINARY_HEADER.size + len(reader) * RECORD_DTYPE.itemsize
+            else:
+                f.seek(offset)
+                data = f.read()
+        if is_binary:
+            size = len(data) // RECORD_DTYPE.itemsize * RECORD_DTYPE.itemsize
+            return Reader(records=np.frombuffer(data[:size], dtype=RECORD_DTYPE)), offset + size
+        # a line that is still being written is left for the next update
+        size = data.rfind(b"\n") + 1
+        return Reader(data[:size]), offset + size
+
+    @staticmethod
+    def __tail(filename: str, offset: int, decompressed: bytes = None) -> bytes:
+        if decompressed is not None:
+            return decompressed[max(offset - TAIL_SIZE, 0):offset]
+        with open(filename, "rb") as f:
+            f.seek(max(offset - TAIL_SIZE, 0))
+            return f.read(min(offset, TAIL_SIZE))
+
+    @staticmethod
+    def __find_heart_rate(filename: str, session_id: int):
+        for suffix in ("_watch.fit", "_watch.tcx"):
+            heart_rate_filename = os.path.join(os.path.dirname(filename), f"{session_id}{suffix}")
+            if os.path.isfile(heart_rate_filename):
+                return heart_rate_filename
+        return None
+
+    @staticmethod
+    def __empty_state() -> dict:
+        """Running sums over the committed seconds, the latest second stays pending until a later one arrives."""
+        return {"start": None, "end": None, "samples": 0, "distance": 0, "watts_total": 0, "watts_max": 0,
+                "spm_total": 0, "spm_max": 0, "calories_total": 0.0, "calories_seconds": 0, "committed": None,
+                "pending": None}
+
+    @staticmethod
+    def __add(state: dict, reader: Reader):
+        seconds = reader.utc_seconds
+        if state["start"] is None:
+            state["start"] = int(seconds[0] - reader.elapsed_time[0])
+        state["end"] = max(state["end"] or 0, int(seconds.max()))
+
+        columns = [seconds, reader.distance, reader.strokes_per_minute, reader.watt, reader.calories_per_hour]
+        rows = np.column_stack([np.asarray(column, dtype=np.int64) for column in columns])
+        if state["pending"]:
+            rows = np.vstack([np.array([state["pending"]], dtype=np.int64), rows])
+        rows = rows[rows[:, 0] >= np.maximum.accumulate(rows[:, 0])]
+        rows = rows[np.append(rows[1:, 0] != rows[:-1, 0], True)]
+
+        committed, state["pending"] = rows[:-1], rows[-1].tolist()
+        if not len(committed):
+            return
+        state["samples"] += len(committed)
+        state["distance"] = max(state["distance"], int(committed[:, 1].max()))
+        state["spm_total"] += int(committed[:, 2].sum())
+        state["spm_max"] = max(state["spm_max"], int(committed[:, 2].max()))
+        state["watts_total"] += int(committed[:, 3].sum())
+        state["watts_max"] = max(state["watts_max"], int(committed[:, 3].max()))
+        state["calories_total"], state["calories_seconds"] = Catalog.__calories_until(state, committed[:, [0, 4]])
+        state["committed"] = committed[-1, [0, 4]].tolist()
+
+    @staticmethod
+    def __calories_until(state: dict, samples: np.ndarray) -> tuple[float, int]:
+        """Sum and count of the calories per hour, interpolated for every second up to the last of ``samples``.
+
+        Pauses longer than ``IDLE_GAP`` have no rows in the export's frame and are interpolated in a single step.
+        """
+        total, count = state["calories_total"], state["calories_seconds"]
+        if state["committed"] is None:
+            total, count = total + float(samples[0, 1]), count + 1
+        else:
+            samples = np.vstack([np.array([state["committed"]], dtype=np.int64), samples])
+        steps = np.diff(samples[:, 0])
+        steps = np.where(steps > IDLE_GAP, 1, steps)
+        previous, current = samples[:-1, 1], samples[1:, 1]
+        # sum of previous + (current - previous) * k / steps for k = 1 ... steps
+        return total + float((steps * previous + (current - previous) * (steps + 1) / 2).sum()), \
+            count + int(steps.sum())
+
+    @staticmethod
+    def __summary(state: dict) -> dict:
+        pending = state["pending"]
+        if pending is None:
+            return dict.fromkeys(["start_time", "end_time", "duration", "distance", "average_watts", "maximum_watts",
+                                  "average_spm", "maximum_spm", "calories"])
+        samples = state["samples"] + 1
+        duration = state["end"] - state["start"]
+        calories_total, calories_seconds = Catalog.__calories_until(state, np.array([[pending[0], pending[4]]]))
+        return {
+            "start_time": state["start"],
+            "end_time": state["end"],
+            "duration": duration,
+            "distance": max(state["distance"], pending[1]),
+            "average_watts": (state["watts_total"] + pending[3]) / samples,
+            "maximum_watts": max(state["watts_max"], pending[3]),
+            "average_spm": (state["spm_total"] + pending[2]) / samples,
+            "maximum_spm": max(state["spm_max"], pending[2]),
+            "calories": calories_total / calories_seconds * duration / 3600,
+        }
+
+    @staticmethod
+    def __filter(since, until, min_distance, min_duration) -> tuple[str, list]:
+        conditions, parameters = ["lines > 0"], []
+        if since is not None:
+            conditions.append("start_time >= ?")
+            parameters.append(int(since.timestamp()))
+        if until is not None:
+            conditions.append("start_time < ?")
+            parameters.append(int(until.timestamp()))
+        if min_distance is not None:
+            conditions.append("distance >= ?")
+            parameters.append(min_distance)
+        if min_duration is not None:
+            conditions.append("duration >= ?")
+            parameters.append(min_duration)
+        return "WHERE " + " AND ".join(conditions), parameters
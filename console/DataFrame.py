@@ -1,39 +1,141 @@
 import datetime
 
+import numpy as np
 import pandas as pd
 
+from console.ArrayFrame import ArrayFrame
+
+CHUNK_SIZE = 4096
+
 
 class DataFrame(object):
+    """pandas frame of a session with one row per second of its active segments, see ``ArrayFrame``."""
+
     __df: pd.DataFrame
+    __summaries: dict[tuple, dict[str, dict[str, float]]]
+    __index_seconds: np.ndarray
+    __is_regular: bool
 
     def __init__(self) -> None:
         self.__df = pd.DataFrame()
+        self.__summaries = {}
+        self.__index_seconds = None
+        self.__is_regular = False
+
+    def __len__(self):
+        return len(self.__df)
+
+    def __invalidate(self):
+        self.__summaries.clear()
+        self.__index_seconds = None
+
+    def init(self, start: datetime.datetime, end: datetime.datetime, seconds: np.ndarray = None):
+        """Start over with an empty row for every second from start to end.
+
+        With the UTC epoch ``seconds`` of the samples only the seconds of their active segments get rows.
+        """
+        self.__lazy_init(start, end, seconds)
 
-    def __lazy_init(self, start: datetime.datetime, end: datetime.datetime):
-        index = pd.date_range(start=start, end=end, inclusive='both', freq='s')
+    def __lazy_init(self, start: datetime.datetime, end: datetime.datetime, seconds: np.ndarray = None):
+        if seconds is None:
+            index = pd.date_range(start=start, end=end, inclusive='both', freq='s')
+        else:
+            start, end = pd.Timestamp(start), pd.Timestamp(end)
+            index = pd.to_datetime(ArrayFrame.sparse_index(seconds, round(start.timestamp()), round(end.timestamp())),
+                                   unit='s', utc=True)
+            index = index.tz_convert(start.tz) if start.tz else index.tz_localize(None)
         self.__df = pd.DataFrame(index=index, columns=[])
+        self.__invalidate()
 
     def load_from_dict(self, data: dict[datetime.datetime, any], column_name):
-        if self.__df.empty:
-            self.__lazy_init(min(data.keys()), max(data.keys()))
+        if self.__df.index.empty:
+            times = pd.DatetimeIndex(list(data.keys())).round('s')
+            self.__lazy_init(times.min(), times.max(), times.as_unit('s').asi8)
         df_from_dict = pd.DataFrame.from_dict(data, orient='index', columns=[column_name])
         df_from_dict.index = df_from_dict.index.round("1s")
         self.__df = pd.concat([self.__df, df_from_dict], join='outer', axis=1)
+        self.__invalidate()
+
+    def load_from_arrays(self, seconds: np.ndarray, values: np.ndarray, column_name):
+        """Load a column from parallel arrays of UTC epoch seconds and values.
+
+        Like a dict, repeated timestamps keep the value that was added last.
+        """
+        index = pd.to_datetime(seconds, unit='s', utc=True)
+        series = pd.Series(values, index=index, name=column_name)
+        series = series[~index.duplicated(keep='last')].sort_index()
+        if self.__df.index.empty:
+            self.__lazy_init(series.index[0], series.index[-1], series.index.as_unit('s').asi8)
+        self.__df = pd.concat([self.__df, series.to_frame()], join='outer', axis=1)
+        self.__invalidate()
+
+    def merge_asof(self, seconds: np.ndarray, values: np.ndarray, column_name, interpolated_column_name):
+        """Join sorted samples at UTC epoch seconds onto the existing index without extending it.
+
+        ``column_name`` receives the samples that fall on a row, ``interpolated_column_name`` the linear
+        interpolation in time between the previous and the next sample. Rows before the first or after the
+        last sample get no value.
+        """
+        samples = pd.DataFrame({'time': pd.to_datetime(np.round(seconds), unit='s', utc=True), 'value': values})
+        samples = samples.drop_duplicates(subset='time', keep='last')
+        rows = pd.DataFrame({'time': self.__df.index})
+        previous = pd.merge_asof(rows, samples.assign(previous=samples['time']), on='time', direction='backward')
+        following = pd.merge_asof(rows, samples.assign(following=samples['time']), on='time', direction='forward')
+
+        elapsed = (rows['time'] - previous['previous']).dt.total_seconds().to_numpy()
+        duration = (following['following'] - previous['previous']).dt.total_seconds().to_numpy()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = np.where(duration > 0, elapsed / duration, 0.0)
+        previous_values = previous['value'].to_numpy(dtype=float)
+        interpolated = previous_values + ratio * (following['value'].to_numpy(dtype=float) - previous_values)
+
+        exact = previous['previous'].to_numpy() == rows['time'].to_numpy()
+        self.__df[column_name] = np.where(exact, previous['value'].to_numpy(), np.nan)
+        self.__df[interpolated_column_name] = interpolated
+        self.__invalidate()
 
     def interpolate(self, existing_column, new_column, method='nearest'):
         self.__df[new_column] = self.__df[existing_column].interpolate(method=method)
+        self.__invalidate()
 
     def get(self, at_time: datetime.datetime, column):
         if self.__df.empty:
             return None
-        at_time_round = pd.to_datetime(at_time).round('S')
-        try:
-            return self.__df.at_time(at_time_round)[column].iloc[0]
-        except IndexError:
-            pass
-        except AttributeError:
-            pass
-        return None
+        values = self.__df[column].to_numpy()
+        position = self.__positions(pd.DatetimeIndex([pd.to_datetime(at_time)]))[0]
+        return values[position] if position >= 0 else None
+
+    def get_many(self, times, column) -> np.ndarray:
+        """Look up many timestamps at once, returning NaN for times outside the frame."""
+        positions = self.__positions(pd.DatetimeIndex(pd.to_datetime(times)))
+        if self.__df.empty:
+            return np.full(len(positions), np.nan)
+        values = self.__df[column].to_numpy(dtype=float)
+        return np.where(positions >= 0, values[np.maximum(positions, 0)], np.nan)
+
+    def __positions(self, times: pd.DatetimeIndex) -> np.ndarray:
+        """Map times to row positions, or -1 where there is no row for that second.
+
+        On the usual regular 1 Hz index this is a plain offset from the first row.
+        """
+        if times.tz is None:
+            times = times.tz_localize('UTC')
+        seconds = times.round('s').as_unit('s').asi8
+        if self.__df.empty:
+            return np.full(len(seconds), -1)
+        index_seconds = self.__get_index_seconds()
+        if self.__is_regular:
+            positions = seconds - index_seconds[0]
+            return np.where((positions >= 0) & (positions < len(index_seconds)), positions, -1)
+        positions = np.minimum(np.searchsorted(index_seconds, seconds), len(index_seconds) - 1)
+        return np.where(index_seconds[positions] == seconds, positions, -1)
+
+    def __get_index_seconds(self) -> np.ndarray:
+        if self.__index_seconds is None:
+            self.__index_seconds = self.__df.index.as_unit('s').asi8
+            steps = np.diff(self.__index_seconds)
+            self.__is_regular = bool(np.all(steps == 1))
+        return self.__index_seconds
 
     def apply(self, start, end, func, *args, dropnan_columns=None):
         df = self.__df[start:end]
@@ -41,19 +143,54 @@ class DataFrame(object):
             df = df.dropna(subset=dropnan_columns)
         return df.apply(func, axis=1, args=args)
 
+    def chunks(self, start, end, columns, dropnan_columns=None, chunk_size=CHUNK_SIZE):
+        """Yield blocks of rows as UTC epoch seconds and a dict of float arrays per column.
+
+        Columns missing from the frame are left out of the dict.
+        """
+        df = self.__df[start:end]
+        if dropnan_columns:
+            df = df.dropna(subset=dropnan_columns)
+        seconds = df.index.as_unit('s').asi8
+        arrays = {column: df[column].to_numpy(dtype=float) for column in columns if column in df.columns}
+        for offset in range(0, len(df), chunk_size):
+            block = slice(offset, offset + chunk_size)
+            yield seconds[block], {column: values[block] for column, values in arrays.items()}
+
+    def summary(self, start, end, aggregations: dict[str, list[str]]) -> dict[str, dict[str, float]]:
+        """Compute several aggregates, e.g. ``{'Watt': ['mean', 'max']}``, over one window at once.
+
+        Each aggregate function is applied to all of its columns in a single reduction. Columns missing
+        from the frame are left out of the result. Results are cached per window until the frame changes.
+        """
+        if self.__df.empty:
+            return {}
+        start__round = pd.to_datetime(start).round('s')
+        end__round = pd.to_datetime(end).round('s')
+        key = (start__round, end__round, tuple((column, tuple(aggs)) for column, aggs in aggregations.items()))
+        if key not in self.__summaries:
+            window = self.__df[start__round:end__round]
+            columns_by_aggregation: dict[str, list[str]] = {}
+            for column, aggs in aggregations.items():
+                if column in window.columns:
+                    for agg in aggs:
+                        columns_by_aggregation.setdefault(agg, []).append(column)
+            summary: dict[str, dict[str, float]] = {}
+            for agg, columns in columns_by_aggregation.items():
+                for column, value in window[columns].agg(agg, axis=0).items():
+                    summary.setdefault(column, {})[agg] = value
+            self.__summaries[key] = summary
+        return self.__summaries[key]
+
     def mean(self, start, end, column):
         if self.__df.empty:
             return None
-        start__round = pd.to_datetime(start).round('S')
-        end__round = pd.to_datetime(end).round('S')
-        return self.__df[start__round:end__round].mean(axis=0)[column]
+        return self.summary(start, end, {column: ['mean']})[column]['mean']
 
     def max(self, start, end, column):
         if self.__df.empty:
             return None
-        start__round = pd.to_datetime(start).round('S')
-        end__round = pd.to_datetime(end).round('S')
-        return self.__df[start__round:end__round].max(axis=0)[column]
+        return self.summary(start, end, {column: ['max']})[column]['max']
 
     def pprint(self, start, end):
         print(self.__df[start:end])
@@ -1,10 +1,14 @@
 import datetime
-import xml.etree.ElementTree as ET
 
-import fitdecode as fitdecode
+import numpy as np
 
+from console.ArrayFrame import ArrayFrame
+from console.Archive import Archive
 from console.Capture import Capture
-from console.DataFrame import DataFrame
+from console.HeartRate import HeartRate
+from console.Profiler import Profiler
+from console.Reader import Reader
+from console.TcxWriter import TcxWriter
 
 SPEED = "Speed"
 WATT = "Watt"
@@ -15,195 +19,299 @@ CALPH_LINEAR = "CalPH_"
 BPM = 'BPM'
 BPM_LINEAR = 'BPM_'
 
-XSI_NS = "http://www.w3.org/2001/XMLSchema-instance"
-TCD_NS = "http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2"
-AE_NS = "http://www.garmin.com/xmlschemas/ActivityExtension/v2"
+LAP_AGGREGATIONS = {
+    DISTANCE: ['max'],
+    SPEED: ['max', 'mean'],
+    CALPH_LINEAR: ['mean'],
+    BPM: ['max'],
+    BPM_LINEAR: ['mean'],
+    WATT: ['mean', 'max'],
+}
+
+ARCHIVE_COLUMNS = [DISTANCE, SPM, SPEED, WATT, CALPH_LINEAR, BPM_LINEAR]
+
+HEART_RATE_MARGIN = datetime.timedelta(minutes=1)
+
+# Frame implementations, both export identical files
+NUMPY = "numpy"
+PANDAS = "pandas"
+ENGINES = [NUMPY, PANDAS]
 
 
 class Export(object):
     __is_initialized: bool
+    __is_built: bool
+    __session_id: int
     __start: datetime
     __end: datetime
-    __frame: DataFrame
-    __watts: dict[datetime, int]
-    __calories_per_hour: dict[datetime, int]
-    __distance_meters: dict[datetime, int]
-    __strokes_per_minute: dict[datetime, int]
-    __speeds: dict[datetime, float]
+    __frame: ArrayFrame
+    __seconds: list[np.ndarray]
+    __columns: dict[str, list[np.ndarray]]
+    __heart_rate_seconds: np.ndarray
+    __heart_rates: np.ndarray
+    __use_cache: bool
+    __profiler: Profiler
+    __debug: bool
 
-    def __init__(self):
+    def __init__(self, use_cache=True, profiler: Profiler = None, debug=False, engine=NUMPY):
+        """``profiler`` collects timings of the export stages, ``debug`` prints the frame after writing.
 
+        The ``engine`` picks the frame: ``numpy`` starts fast, ``pandas`` imports pandas on first use.
+        """
+        self.__use_cache = use_cache
+        self.__profiler = profiler or Profiler(enabled=False)
+        self.__debug = debug
         self.__is_initialized = False
+        self.__is_built = False
+        self.__session_id = None
         self.__start, self.__end = (None, None)
-        self.__frame = DataFrame()
-        self.__watts = {}
-        self.__calories_per_hour = {}
-        self.__distance_meters = {}
-        self.__strokes_per_minute = {}
-        self.__speeds = {}
-
-        ET.register_namespace("", TCD_NS)
-        ET.register_namespace("xsi", XSI_NS)
-        ET.register_namespace("ae", AE_NS)
-
-    def load_heart_rate_from_tcx(self, filename: str):
-        """Load external HR data from TCX file."""
-        external_heart_rates: dict[datetime.datetime, int] = {}
-        tree = ET.parse(filename)
-        for track_point in tree.findall(".//{" + TCD_NS + "}Trackpoint[{" + TCD_NS + "}HeartRateBpm]"):
-            almost_iso_time = track_point.find("{" + TCD_NS + "}Time").text
-            iso_time = almost_iso_time.replace('Z', '+00:00')
-            timestamp = datetime.datetime.fromisoformat(iso_time)
-            bpm = track_point.find("{" + TCD_NS + "}HeartRateBpm/{" + TCD_NS + "}Value").text
-            external_heart_rates[timestamp] = int(bpm)
-        self.__frame.load_from_dict(external_heart_rates, BPM)
-        self.__frame.interpolate(BPM, BPM_LINEAR, method='linear')
-
-    def load_heart_rate_from_fit(self, filename: str):
-        """Load external HR data from FIT file."""
-        external_heart_rates: dict[datetime.datetime, int] = {}
-        with fitdecode.FitReader(filename) as fit:
-            for frame in fit:
-                if frame.frame_type == fitdecode.FIT_FRAME_DATA and frame.name == "record":
-                    timestamp = list(filter(lambda x: x.name == 'timestamp', frame.fields))[0].value
-                    heart_rate = list(filter(lambda x: x.name == 'heart_rate', frame.fields))[0].value
-                    external_heart_rates[timestamp] = int(heart_rate)
-        self.__frame.load_from_dict(external_heart_rates, BPM)
-        self.__frame.interpolate(BPM, BPM_LINEAR, method='linear')
+        self.__frame = Export.__create_frame(engine)
+        self.__seconds = []
+        self.__columns = {DISTANCE: [], SPM: [], SPEED: [], WATT: [], CALPH: []}
+        self.__heart_rate_seconds, self.__heart_rates = (None, None)
+
+    def load_heart_rate_from_tcx(self, filename: str, clock_offset: datetime.timedelta = datetime.timedelta(0)):
+        """Load external HR data from TCX file.
+
+        The optional ``clock_offset`` is added to every timestamp to correct a watch clock that is off.
+        """
+        self.__set_heart_rates(self.__load_heart_rate(filename), clock_offset)
+
+    def load_heart_rate_from_fit(self, filename: str, clock_offset: datetime.timedelta = datetime.timedelta(0)):
+        """Load external HR data from FIT file.
+
+        The optional ``clock_offset`` is added to every timestamp to correct a watch clock that is off.
+        """
+        self.__set_heart_rates(self.__load_heart_rate(filename), clock_offset)
+
+    def __load_heart_rate(self, filename: str) -> HeartRate:
+        with self.__profiler.stage("load heart rate") as stage:
+            heart_rate = HeartRate.load(filename, use_cache=self.__use_cache)
+            stage.rows = len(heart_rate)
+        return heart_rate
+
+    def __set_heart_rates(self, heart_rate: HeartRate, clock_offset: datetime.timedelta):
+        order = np.argsort(heart_rate.seconds, kind='stable')
+        self.__heart_rate_seconds = heart_rate.seconds[order] + clock_offset.total_seconds()
+        self.__heart_rates = heart_rate.bpm[order]
+
+    def __load_heart_rates(self):
+        """Merge the external HR samples that cover the session window into the frame.
+
+        Besides the margin around the session, one sample on either side is kept so that the
+        interpolation at the edges of the window is the same as with the complete data.
+        """
+        if self.__heart_rate_seconds is None or not len(self.__heart_rate_seconds):
+            return
+        margin = HEART_RATE_MARGIN.total_seconds()
+        first, last = np.searchsorted(self.__heart_rate_seconds, [self.__start.timestamp() - margin,
+                                                                  self.__end.timestamp() + margin])
+        window = slice(max(first - 1, 0), last + 1)
+        if not len(self.__heart_rate_seconds[window]):
+            return
+        with self.__profiler.stage("merge heart rate") as stage:
+            stage.rows = len(self.__heart_rate_seconds[window])
+            self.__frame.merge_asof(self.__heart_rate_seconds[window], self.__heart_rates[window], BPM, BPM_LINEAR)
 
     def add_track_point(self, capture: Capture):
         """"""
         if not self.__is_initialized:
             self.__start = capture.utc_time - capture.elapsed_time
+            self.__session_id = capture.milliseconds
             self.__is_initialized = True
         if not self.__end or capture.utc_time > self.__end:
             self.__end = capture.utc_time
 
-        self.__calories_per_hour[capture.utc_time] = capture.calories_per_hour
-        self.__distance_meters[capture.utc_time] = capture.distance
-        self.__strokes_per_minute[capture.utc_time] = capture.strokes_per_minute
         try:
             meters_per_second = 500 / capture.time_to_500m.total_seconds()
         except ZeroDivisionError:
             meters_per_second = 0.0
-        self.__speeds[capture.utc_time] = round(meters_per_second, 2)
-        self.__watts[capture.utc_time] = capture.watt
+        self.__append(np.array([int(capture.utc_time.timestamp())]), {
+            DISTANCE: np.array([capture.distance]),
+            SPM: np.array([capture.strokes_per_minute]),
+            SPEED: np.array([round(meters_per_second, 2)]),
+            WATT: np.array([capture.watt]),
+            CALPH: np.array([capture.calories_per_hour]),
+        })
+
+    def add_track_points(self, reader: Reader):
+        """Add all records of a bulk decoded recording at once."""
+        if not len(reader):
+            return
+        with self.__profiler.stage("add track points") as stage:
+            stage.rows = len(reader)
+            self.__add_reader(reader)
+
+    def __add_reader(self, reader: Reader):
+        seconds = reader.utc_seconds
+        if not self.__is_initialized:
+            self.__start = Export.__to_datetime(seconds[0] - reader.elapsed_time[0])
+            self.__session_id = int(reader.milliseconds[0])
+            self.__is_initialized = True
+        last = Export.__to_datetime(seconds.max())
+        if not self.__end or last > self.__end:
+            self.__end = last
+
+        split = reader.time_to_500m.astype(float)
+        with np.errstate(divide='ignore'):
+            speeds = np.where(split > 0, np.round(500 / split, 2), 0.0)
+        self.__append(seconds, {
+            DISTANCE: reader.distance,
+            SPM: reader.strokes_per_minute,
+            SPEED: speeds,
+            WATT: reader.watt,
+            CALPH: reader.calories_per_hour,
+        })
+
+    def __append(self, seconds: np.ndarray, columns: dict[str, np.ndarray]):
+        self.__seconds.append(seconds)
+        for column_name, values in columns.items():
+            self.__columns[column_name].append(values)
+
+    def __load_column(self, column_name):
+        self.__frame.load_from_arrays(np.concatenate(self.__seconds),
+                                      np.concatenate(self.__columns[column_name]), column_name)
 
     def write(self, f):
-        self.__frame.load_from_dict(self.__distance_meters, DISTANCE)
-        self.__frame.load_from_dict(self.__strokes_per_minute, SPM)
-        self.__frame.load_from_dict(self.__speeds, SPEED)
-        self.__frame.load_from_dict(self.__watts, WATT)
-
-        root = ET.Element("{" + TCD_NS + "}TrainingCenterDatabase", {})
-        activities = ET.SubElement(root, "Activities")
-        activity = ET.SubElement(activities, "Activity", {"Sport": "Other"})
-        id_ = ET.SubElement(activity, "Id")
-        id_.text = Export.__get_formatted_time(self.__start)
-
-        lap = ET.SubElement(activity, "Lap")
-        lap.attrib["StartTime"] = Export.__get_formatted_time(self.__start)
-        self.__add_total_time_seconds(lap)
-        self.__add_distance_meters(lap)
-        self.__add_max_speed(lap)
-        self.__add_calories(lap)
-        self.__add_heart_rate_stats(lap)
-        Export.__add_intensity_and_trigger_method(lap)
-
-        track = ET.SubElement(lap, "Track", {})
-        self.__frame.apply(self.__start, self.__end, Export.__add_track_point_to_track, track,
-                           dropnan_columns=[DISTANCE, SPM])
-
-        extensions = ET.SubElement(lap, "Extensions", {})
-        lx = ET.SubElement(extensions, "{" + AE_NS + "}LX")
-        self.__add_speed_stats(lx)
-        self.__add_watt_stats(lx)
-
-        self.__frame.pprint(self.__start, self.__end)
-        ET.indent(root, space="\t", level=0)
-        ET.ElementTree(root).write(f, encoding='utf-8', method="xml", xml_declaration=True)
+        self.__build_frame()
+        with self.__profiler.stage("summary"):
+            summary = self.__frame.summary(self.__start, self.__end, LAP_AGGREGATIONS)
+
+        with self.__profiler.stage("write TCX") as stage:
+            stage.rows = self.__write_tcx(f, summary)
+
+        if self.__debug:
+            self.__frame.pprint(self.__start, self.__end)
+
+    def write_archive(self, archive: Archive, session_id: int = None):
+        """Add the resampled frame to ``archive`` and return its file, or None without any samples.
+
+        The session is named by ``session_id`` or else by the timestamp of the first sample. The frame is
+        shared with ``write``, whichever is called first builds it.
+        """
+        if not self.__is_initialized:
+            return None
+        self.__build_frame()
+        with self.__profiler.stage("write archive") as stage:
+            chunks = list(self.__frame.chunks(self.__start, self.__end, ARCHIVE_COLUMNS))
+            if not chunks:
+                return None
+            seconds = np.concatenate([chunk_seconds for chunk_seconds, _ in chunks])
+            columns = {column: np.concatenate([values[column] for _, values in chunks])
+                       if column in chunks[0][1] else np.full(len(seconds), np.nan) for column in ARCHIVE_COLUMNS}
+            stage.rows = len(seconds)
+            return archive.write(session_id or self.__session_id, seconds, columns)
+
+    def __build_frame(self):
+        if self.__is_built:
+            return
+        self.__is_built = True
+        with self.__profiler.stage("build frame") as stage:
+            self.__frame.init(self.__start, self.__end, np.concatenate(self.__seconds))
+            self.__load_column(DISTANCE)
+            self.__load_column(SPM)
+            self.__load_column(SPEED)
+            self.__load_column(WATT)
+            self.__load_column(CALPH)
+            stage.rows = len(self.__frame)
+        self.__load_heart_rates()
+        with self.__profiler.stage("interpolate") as stage:
+            self.__frame.interpolate(CALPH, CALPH_LINEAR, method="linear")
+            stage.rows = len(self.__frame)
+
+    def __write_tcx(self, f, summary) -> int:
+        writer = TcxWriter(f)
+        writer.start_activity(self.__start)
+        writer.start_lap(self.__start,
+                         self.__get_total_time_seconds(),
+                         Export.__get_distance_meters(summary),
+                         Export.__get_max_speed(summary),
+                         self.__get_calories(summary),
+                         *Export.__get_heart_rate_stats(summary))
+
+        track_points = 0
+        for seconds, columns in self.__frame.chunks(self.__start, self.__end,
+                                                    [DISTANCE, SPM, BPM_LINEAR, SPEED, WATT],
+                                                    dropnan_columns=[DISTANCE, SPM]):
+            Export.__add_track_points(writer, seconds, columns)
+            track_points += len(seconds)
+
+        writer.end_lap(Export.__get_average_speed(summary), *Export.__get_watt_stats(summary))
+        writer.end_activity()
+        return track_points
 
     @staticmethod
-    def __add_track_point_to_track(row, track):
-
-        track_point = ET.SubElement(track, "Trackpoint")
-        time = ET.SubElement(track_point, "Time")
-        time.text = Export.__get_formatted_time(row.name)
-        distance_meters = ET.SubElement(track_point, "DistanceMeters")
-        distance_meters.text = str(round(row[DISTANCE]))
-        cadence = ET.SubElement(track_point, "Cadence")
-        cadence.text = str(round(row[SPM]))
-        try:
-            bpm = round(row[BPM_LINEAR])
-            Export.__add_value_element(track_point, "HeartRateBpm", str(bpm))
-        except KeyError:
-            pass
-        except ValueError:
-            pass
-        extensions = ET.SubElement(track_point, "Extensions")
-        tpx = ET.SubElement(extensions, "{" + AE_NS + "}TPX")
-        speed = ET.SubElement(tpx, "{" + AE_NS + "}Speed")
-        speed.text = f'{row[SPEED]:.02f}'
-        watts = ET.SubElement(tpx, "{" + AE_NS + "}Watts")
-        watts.text = str(round(row[WATT]))
-        return track_point
-
-    def __add_total_time_seconds(self, lap):
+    def __add_track_points(writer: TcxWriter, seconds: np.ndarray, columns: dict[str, np.ndarray]):
+        heart_rate = None
+        if BPM_LINEAR in columns:
+            bpm = columns[BPM_LINEAR]
+            heart_rate = np.where(np.isnan(bpm), "", Export.__format_integers(np.nan_to_num(bpm)))
+        writer.add_track_points(seconds,
+                                Export.__format_integers(columns[DISTANCE]),
+                                Export.__format_integers(columns[SPM]),
+                                heart_rate,
+                                Export.__format_hundredths(columns[SPEED]),
+                                Export.__format_integers(columns[WATT]))
+
+    @staticmethod
+    def __format_integers(values: np.ndarray):
+        """Same as ``str(round(value))`` for every value."""
+        return np.round(values).astype(np.int64).astype(str)
+
+    @staticmethod
+    def __format_hundredths(values: np.ndarray):
+        """Same as ``f'{value:.02f}'`` for values already rounded to two decimals."""
+        hundredths = np.round(values * 100).astype(np.int64)
+        return np.strings.add(np.strings.add((hundredths // 100).astype(str), "."),
+                              np.strings.zfill((hundredths % 100).astype(str), 2))
+
+    def __get_total_time_seconds(self):
         total_seconds = (self.__end - self.__start).total_seconds()
-        total_time_seconds = ET.SubElement(lap, "TotalTimeSeconds")
-        total_time_seconds.text = str(round(total_seconds))
-
-    def __add_distance_meters(self, lap):
-        distance = self.__frame.max(self.__start, self.__end, DISTANCE)
-        distance_meters = ET.SubElement(lap, "DistanceMeters")
-        distance_meters.text = str(int(distance))
-
-    def __add_max_speed(self, lap):
-        maximum = self.__frame.max(self.__start, self.__end, SPEED)
-        maximum_speed = ET.SubElement(lap, "MaximumSpeed")
-        maximum_speed.text = f'{maximum:.02f}'
-
-    def __add_calories(self, lap):
-        self.__frame.load_from_dict(self.__calories_per_hour, CALPH)
-        self.__frame.interpolate(CALPH, CALPH_LINEAR, method="linear")
-        mean = self.__frame.mean(self.__start, self.__end, CALPH_LINEAR)
-        calories = ET.SubElement(lap, "Calories")
+        return str(round(total_seconds))
+
+    @staticmethod
+    def __get_distance_meters(summary):
+        return str(int(summary[DISTANCE]['max']))
+
+    @staticmethod
+    def __get_max_speed(summary):
+        return f'{summary[SPEED]["max"]:.02f}'
+
+    def __get_calories(self, summary):
+        mean = summary[CALPH_LINEAR]['mean']
         total_time_hours = (self.__end - self.__start).total_seconds() / 3600
-        calories.text = str(round(mean * total_time_hours))
+        return str(round(mean * total_time_hours))
 
-    def __add_heart_rate_stats(self, lap):
+    @staticmethod
+    def __get_heart_rate_stats(summary):
         try:
-            mean = self.__frame.mean(self.__start, self.__end, BPM_LINEAR)
-            maximum = self.__frame.max(self.__start, self.__end, BPM)
-            Export.__add_value_element(lap, "AverageHeartRateBpm", value=str(round(mean)))
-            Export.__add_value_element(lap, "MaximumHeartRateBpm", value=str(round(maximum)))
+            mean = summary[BPM_LINEAR]['mean']
+            maximum = summary[BPM]['max']
+            return str(round(mean)), str(round(maximum))
         except KeyError:
-            pass
+            return None, None
+        except ValueError:
+            return None, None
+
+    @staticmethod
+    def __get_average_speed(summary):
+        return f'{summary[SPEED]["mean"]:.02f}'
 
     @staticmethod
-    def __add_intensity_and_trigger_method(lap):
-        intensity = ET.SubElement(lap, "Intensity")
-        intensity.text = "Active"
-        trigger_method = ET.SubElement(lap, "TriggerMethod")
-        trigger_method.text = "Manual"
-
-    def __add_speed_stats(self, lx):
-        avg_speed = ET.SubElement(lx, "{" + AE_NS + "}AvgSpeed")
-        avg_speed.text = f'{self.__frame.mean(self.__start, self.__end, SPEED):.02f}'
-
-    def __add_watt_stats(self, lx):
-        avg_watts = ET.SubElement(lx, "{" + AE_NS + "}AvgWatts")
-        avg_watts.text = str(round(self.__frame.mean(self.__start, self.__end, WATT)))
-        max_watts = ET.SubElement(lx, "{" + AE_NS + "}MaxWatts")
-        max_watts.text = str(round(self.__frame.max(self.__start, self.__end, WATT)))
+    def __get_watt_stats(summary):
+        average = str(round(summary[WATT]['mean']))
+        maximum = str(round(summary[WATT]['max']))
+        return average, maximum
 
     @staticmethod
-    def __get_formatted_time(time: datetime):
-        return time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    def __create_frame(engine):
+        if engine == NUMPY:
+            return ArrayFrame()
+        if engine == PANDAS:
+            from console.DataFrame import DataFrame
+            return DataFrame()
+        raise ValueError(f"Unknown engine: {engine}")
 
     @staticmethod
-    def __add_value_element(parent, tag, value=''):
-        element = ET.SubElement(parent, tag)
-        value_element = ET.SubElement(element, "Value")
-        value_element.text = value
-        return value_element
+    def __to_datetime(seconds) -> datetime:
+        return datetime.datetime.fromtimestamp(int(seconds), tz=datetime.timezone.utc)
@@ -0,0 +1,128 @@
+import datetime
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from console.TcxWriter import TCD_NS
+
+CACHE_SUFFIX = ".hr.npz"
+CACHE_VERSION = 1
+
+FIT_EPOCH = 631065600
+FIT_RECORD = 20
+
+TRACK_POINT = "{" + TCD_NS + "}Trackpoint"
+TIME = "{" + TCD_NS + "}Time"
+HEART_RATE_VALUE = "{" + TCD_NS + "}HeartRateBpm/{" + TCD_NS + "}Value"
+
+
+class HeartRate(object):
+    """Heart rate samples from an external source as UTC epoch seconds and beats per minute, in file order."""
+
+    seconds: np.ndarray
+    bpm: np.ndarray
+
+    def __init__(self, seconds: np.ndarray, bpm: np.ndarray):
+        self.seconds = seconds
+        self.bpm = bpm
+
+    def __len__(self):
+        return len(self.seconds)
+
+    @staticmethod
+    def load(filename: str, use_cache=True) -> "HeartRate":
+        """Load a FIT or TCX file, reusing the decoded samples from a sidecar cache if it is still current.
+
+        The cache is stored next to the source as ``<filename>.hr.npz`` and is rebuilt whenever
+        the size or modification time of the source changes.
+        """
+        decode = HeartRate.from_fit if filename.lower().endswith(".fit") else HeartRate.from_tcx
+        if not use_cache:
+            return decode(filename)
+        key = HeartRate.__cache_key(filename)
+        heart_rate = HeartRate.__read_cache(filename + CACHE_SUFFIX, key)
+        if heart_rate is None:
+            heart_rate = decode(filename)
+            HeartRate.__write_cache(filename + CACHE_SUFFIX, key, heart_rate)
+        return heart_rate
+
+    @staticmethod
+    def from_fit(filename: str) -> "HeartRate":
+        """Decode the timestamp and heart rate of all record messages of a FIT file."""
+        # fitdecode is only needed for FIT files and slow to import, so it is imported when needed
+        import fitdecode
+
+        seconds, bpm = [], []
+        with fitdecode.FitReader(filename, processor=None, check_crc=fitdecode.CrcCheck.ENABLED) as fit:
+            for frame in fit:
+                if frame.frame_type != fitdecode.FIT_FRAME_DATA or frame.global_mesg_num != FIT_RECORD:
+                    continue
+                timestamp = frame.get_value('timestamp', fallback=None)
+                heart_rate = frame.get_value('heart_rate', fallback=None)
+                if timestamp is not None and heart_rate is not None:
+                    seconds.append(timestamp + FIT_EPOCH)
+                    bpm.append(heart_rate)
+        return HeartRate(np.array(seconds, dtype=float), np.array(bpm, dtype=float))
+
+    @staticmethod
+    def from_tcx(filename: str) -> "HeartRate":
+        """Read time and heart rate of all track points with heart rate from a TCX file.
+
+        The file is parsed incrementally and every element is dropped from the tree once it has been
+        handled, so memory stays flat regardless of the number of activities and track points.
+        """
+        seconds, bpm = [], []
+        parents = []
+        track_point_depth = 0
+        for event, element in ET.iterparse(filename, events=('start', 'end')):
+            if event == 'start':
+                parents.append(element)
+                if element.tag == TRACK_POINT:
+                    track_point_depth += 1
+                continue
+            parents.pop()
+            if element.tag == TRACK_POINT:
+                track_point_depth -= 1
+                HeartRate.__read_track_point(element, seconds, bpm)
+            if parents and not track_point_depth:
+                parents[-1].remove(element)
+        return HeartRate(np.array(seconds, dtype=float), np.array(bpm, dtype=float))
+
+    @staticmethod
+    def __read_track_point(track_point: ET.Element, seconds: list[float], bpm: list[int]):
+        time = track_point.find(TIME)
+        value = track_point.find(HEART_RATE_VALUE)
+        if time is None or value is None:
+            return
+        iso_time = time.text.replace('Z', '+00:00')
+        seconds.append(datetime.datetime.fromisoformat(iso_time).timestamp())
+        bpm.append(int(value.text))
+
+    @staticmethod
+    def __cache_key(filename: str):
+        stat = os.stat(filename)
+        return np.array([CACHE_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64), os.path.abspath(filename)
+
+    @staticmethod
+    def __read_cache(cache_filename: str, key):
+        try:
+            with np.load(cache_filename) as cache:
+                if np.array_equal(cache['key'], key[0]) and str(cache['path']) == key[1]:
+                    return HeartRate(cache['seconds'], cache['bpm'])
+        except (OSError, KeyError, ValueError):
+            pass
+        return None
+
+    @staticmethod
+    def __write_cache(cache_filename: str, key, heart_rate: "HeartRate"):
+        temporary_filename = cache_filename + ".tmp"
+        try:
+            with open(temporary_filename, 'wb') as f:
+                np.savez_compressed(f, key=key[0], path=np.array(key[1]),
+                                    seconds=heart_rate.seconds, bpm=heart_rate.bpm)
+            os.replace(temporary_filename, cache_filename)
+        except OSError:
+            # The cache is an optimization only, e.g. the source may live in a read-only directory
+            if os.path.exists(temporary_filename):
+                os.remove(temporary_filename)
@@ -0,0 +1,27 @@
+class Latency(object):
+    """Running count, mean and maximum of latencies in seconds."""
+
+    count: int
+    total: float
+    maximum: float
+    last: float
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.last = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self) -> str:
+        return f"mean {self.mean * 1000:.1f} ms, max {self.maximum * 1000:.1f} ms over {self.count}"
@@ -0,0 +1,199 @@
+import datetime
+import os
+import queue
+import threading
+import time
+
+from console.ArrayFrame import IDLE_GAP
+from console.Capture import Capture
+from console.TcxWriter import TcxWriter
+
+SNAPSHOT_INTERVAL = 10.0
+
+
+class LiveExport(object):
+    """Keep the lap statistics of a running session up to date and rewrite its TCX file every few seconds.
+
+    The statistics are updated with every sample and equal what ``Export.write`` computes for the same
+    captures: one sample per second where the last one wins, the maximum distance and speed, the mean
+    speed and watts and the calories from the linearly interpolated calories per hour. Track points are
+    rendered once, when the next second starts, so a snapshot only joins text that is ready. Snapshots
+    replace the file atomically, readers see either the previous or the new one.
+
+    Snapshots are written by a background thread, like ``SessionWriter`` does for session files. The read
+    path only hands over the lap values and the number of track points rendered so far, a snapshot that is
+    due while the previous one is still being written is skipped.
+
+    Captures that arrive out of order, i.e. for a second before the latest one, are ignored. Pauses longer
+    than ``IDLE_GAP`` are interpolated in a single step, like across the gaps of the export's frame.
+    """
+
+    def __init__(self, filename: str, interval=SNAPSHOT_INTERVAL) -> None:
+        self.__filename = filename
+        self.__interval = interval
+        self.__start, self.__end = (None, None)
+        self.__snapshot_at = None
+        self.__track_points = []
+        self.__committed = None
+        self.__pending = None
+        self.__distance = 0
+        self.__maximum_speed = 0
+        self.__speed_total = 0
+        self.__maximum_watts = 0
+        self.__watts_total = 0
+        self.__samples = 0
+        self.__calories_total = 0.0
+        self.__calories_seconds = 0
+        self.__queue = queue.Queue(maxsize=1)
+        self.__thread = None
+
+    @property
+    def filename(self) -> str:
+        return self.__filename
+
+    def add_track_point(self, capture: Capture):
+        if self.__start is None:
+            self.__start = capture.utc_time - capture.elapsed_time
+            self.__snapshot_at = time.monotonic()
+        if not self.__end or capture.utc_time > self.__end:
+            self.__end = capture.utc_time
+
+        try:
+            # speeds are kept in hundredths so that sums and means are exact
+            speed = round(round(500 / capture.time_to_500m.total_seconds(), 2) * 100)
+        except ZeroDivisionError:
+            speed = 0
+        sample = (int(capture.utc_time.timestamp()), capture.distance, capture.strokes_per_minute, speed,
+                  capture.watt, capture.calories_per_hour)
+        if self.__pending and sample[0] < self.__pending[0]:
+            return
+        if self.__pending and sample[0] > self.__pending[0]:
+            self.__commit(self.__pending)
+        self.__pending = sample
+
+        if time.monotonic() - self.__snapshot_at >= self.__interval:
+            self.__snapshot_at = time.monotonic()
+            try:
+                self.__put(self.__lap(), block=False)
+            except queue.Full:
+                pass
+
+    @property
+    def total_time_seconds(self) -> float:
+        return (self.__end - self.__start).total_seconds() if self.__start else 0.0
+
+    @property
+    def distance(self) -> int:
+        return max(self.__distance, self.__pending[1]) if self.__pending else 0
+
+    @property
+    def maximum_speed(self) -> float:
+        return max(self.__maximum_speed, self.__pending[3]) / 100 if self.__pending else 0.0
+
+    @property
+    def average_speed(self) -> float:
+        return (self.__speed_total + self.__pending[3]) / 100 / (self.__samples + 1) if self.__pending else 0.0
+
+    @property
+    def maximum_watts(self) -> int:
+        return max(self.__maximum_watts, self.__pending[4]) if self.__pending else 0
+
+    @property
+    def average_watts(self) -> float:
+        return (self.__watts_total + self.__pending[4]) / (self.__samples + 1) if self.__pending else 0.0
+
+    @property
+    def calories(self) -> float:
+        if not self.__pending:
+            return 0.0
+        total, seconds = self.__calories_until(self.__pending)
+        return total / seconds * (self.total_time_seconds / 3600)
+
+    def snapshot(self):
+        """Write everything received so far to the TCX file and wait until it is replaced."""
+        if not self.__pending:
+            return
+        self.__snapshot_at = time.monotonic()
+        self.__put(self.__lap(), block=True)
+        self.__queue.join()
+
+    def close(self):
+        """Write the final snapshot."""
+        self.snapshot()
+
+    def __lap(self) -> dict:
+        """The values of a snapshot, track points are referenced by their count and rendered in the writer."""
+        return {
+            "start": self.__start,
+            "total_time_seconds": str(round(self.total_time_seconds)),
+            "distance": str(self.distance),
+            "maximum_speed": f'{self.maximum_speed:.02f}',
+            "calories": str(round(self.calories)),
+            "track_points": len(self.__track_points),
+            "pending": self.__pending,
+            "average_speed": f'{self.average_speed:.02f}',
+            "average_watts": str(round(self.average_watts)),
+            "maximum_watts": str(self.maximum_watts),
+        }
+
+    def __put(self, lap: dict, block: bool):
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__run, name="LiveExport", daemon=True)
+            self.__thread.start()
+        self.__queue.put(lap, block=block)
+
+    def __run(self):
+        while True:
+            lap = self.__queue.get()
+            try:
+                self.__write(lap)
+            except OSError as e:
+                print(f"Error writing live export: {e}")
+            finally:
+                self.__queue.task_done()
+
+    def __write(self, lap: dict):
+        # track points are only appended, the first ones of the list are the ones of this snapshot
+        track_points = "".join(self.__track_points[:lap["track_points"]]) + LiveExport.__render(lap["pending"])
+        temporary_filename = self.__filename + ".tmp"
+        with open(temporary_filename, "wb") as f:
+            writer = TcxWriter(f)
+            writer.start_activity(lap["start"])
+            writer.start_lap(lap["start"], lap["total_time_seconds"], lap["distance"], lap["maximum_speed"],
+                             lap["calories"])
+            writer.add_rendered_track_points(track_points)
+            writer.end_lap(lap["average_speed"], lap["average_watts"], lap["maximum_watts"])
+            writer.end_activity()
+        os.replace(temporary_filename, self.__filename)
+
+    def __commit(self, sample):
+        second, distance, strokes_per_minute, speed, watts, calories_per_hour = sample
+        self.__distance = max(self.__distance, distance)
+        self.__maximum_speed = max(self.__maximum_speed, speed)
+        self.__speed_total += speed
+        self.__maximum_watts = max(self.__maximum_watts, watts)
+        self.__watts_total += watts
+        self.__samples += 1
+        self.__calories_total, self.__calories_seconds = self.__calories_until(sample)
+        self.__committed = sample
+        self.__track_points.append(LiveExport.__render(sample))
+
+    def __calories_until(self, sample):
+        """Sum and count of the calories per hour, interpolated for every second up to ``sample``."""
+        if self.__committed is None:
+            return float(sample[5]), 1
+        previous = self.__committed
+        steps = sample[0] - previous[0]
+        if steps > IDLE_GAP:
+            # a pause has no rows in the export's frame, it is interpolated in a single step
+            steps = 1
+        # sum of previous + (current - previous) * k / steps for k = 1 ... steps
+        total = steps * previous[5] + (sample[5] - previous[5]) * (steps + 1) / 2
+        return self.__calories_total + total, self.__calories_seconds + steps
+
+    @staticmethod
+    def __render(sample) -> str:
+        second, distance, strokes_per_minute, speed, watts, _ = sample
+        return TcxWriter.render_track_point(datetime.datetime.fromtimestamp(second, tz=datetime.timezone.utc),
+                                            str(distance), str(strokes_per_minute), None,
+                                            f'{speed // 100}.{speed % 100:02d}', str(watts))
@@ -1,9 +1,22 @@
+import queue
+import threading
 import time
 
 import serial
 
+from console.Latency import Latency
+
 
 class Monitor(object):
+    """Read lines from the console as soon as they arrive and hand them to ``on_data``.
+
+    A reader thread blocks on the serial port and stamps every line with the wall clock time of
+    its arrival, anchored to the monotonic clock so that timestamps do not jump. Lines are passed
+    through a queue to the thread that called ``start``; the time they spent waiting there is
+    tracked in ``queue_latency``.
+    """
+
+    queue_latency: Latency
 
     def __init__(self, port) -> None:
         self.__console = serial.Serial()
@@ -13,34 +26,106 @@ class Monitor(object):
         self.__console.parity = serial.PARITY_NONE
         self.__console.stopbits = serial.STOPBITS_ONE
         self.__console.timeout = 1
+        self.__lines = queue.Queue()
+        self.__buffer = b""
+        self.__acknowledgement_pending = False
+        self.__reader = None
+        self.__stopped = threading.Event()
+        self.__clock_anchor = time.time() - time.monotonic()
+        self.__arrival = None
+        self.queue_latency = Latency()
 
     def start(self) -> None:
 
-        while True:
+        if not self.__console.is_open and not self.connect():
+            self.on_disconnected()
+            exit()
 
-            if not self.__console.is_open:
-                try:
-                    self.__console.open()
-                    self.__console.write('C\n'.encode('utf-8'))
-                    self.__console.readline()
-                    self.on_connected()
-
-                except IOError:
-                    print(f"Error opening connection via port {self.__console.port}")
-                    self.on_disconnected()
-                    exit()
+        self.__stopped.clear()
+        self.__reader = threading.Thread(target=self.__read_lines, name=f"Monitor {self.__console.port}", daemon=True)
+        self.__reader.start()
 
+        while not self.__stopped.is_set():
             try:
-                time.sleep(500 / 1000)
-                data = self.__wait_for_data()
-                milliseconds = round(time.time() * 1000)
-                self.on_data(data, milliseconds)
+                try:
+                    line = self.__lines.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if line is None:
+                    print(f"Lost connection via port {self.__console.port}")
+                    self.__disconnect()
+                    return
+                self.dispatch(line)
 
             except KeyboardInterrupt:
                 print("Interrupted.")
                 self.__disconnect()
                 exit()
 
+        self.__stop_reader()
+        while not self.__lines.empty():
+            line = self.__lines.get_nowait()
+            if line is not None:
+                self.dispatch(line)
+        self.__disconnect()
+
+    def stop(self) -> None:
+        """Make ``start`` return after the line currently being handled."""
+        self.__stopped.set()
+
+    @property
+    def port(self):
+        return self.__console.port
+
+    @property
+    def arrival(self) -> float:
+        """``time.monotonic()`` at which the line passed to ``on_data`` arrived."""
+        return self.__arrival
+
+    def connect(self, wait_for_acknowledgement=True) -> bool:
+        """Open the port and ask the console to start sending data.
+
+        Without ``wait_for_acknowledgement`` this does not block, the console's reply is then
+        dropped as the first line passed to ``receive``.
+        """
+        try:
+            self.__console.open()
+            self.__console.write('C\n'.encode('utf-8'))
+            if wait_for_acknowledgement:
+                self.__console.readline()
+            self.__buffer = b""
+            self.__acknowledgement_pending = not wait_for_acknowledgement
+        except IOError:
+            print(f"Error opening connection via port {self.__console.port}")
+            if self.__console.is_open:
+                self.__console.close()
+            return False
+        self.on_connected()
+        return True
+
+    def fileno(self) -> int:
+        return self.__console.fileno()
+
+    def receive(self) -> list[tuple[str, int, float]]:
+        """Read the bytes that are available and return the lines they complete.
+
+        Meant to be called once the port is readable, e.g. from a selector, so it does not block.
+        Raises ``serial.SerialException`` or ``OSError`` when the connection is lost.
+        """
+        chunk = self.__console.read(max(self.__console.in_waiting, 1))
+        return self.__split(chunk, time.monotonic())
+
+    def dispatch(self, line: tuple[str, int, float]):
+        """Hand a line returned by ``receive`` to ``on_data``."""
+        data, milliseconds, arrival = line
+        self.__arrival = arrival
+        self.queue_latency.add(time.monotonic() - arrival)
+        self.on_data(data, milliseconds)
+
+    def disconnect(self):
+        """Tell the console to stop sending, close the port and call ``on_disconnected``."""
+        self.__disconnect()
+
     def on_connected(self):
         print("Connected.")
 
@@ -50,17 +135,48 @@ class Monitor(object):
     def on_disconnected(self):
         print("Disconnected.")
 
-    def __wait_for_data(self):
-        data = ""
-        data_bytes = self.__console.readline()
-        if data_bytes != '':
-            data = data_bytes.decode("utf-8")
-            data = data.strip()
-        return data
+    def milliseconds(self, monotonic: float) -> int:
+        """Convert a ``time.monotonic()`` reading to milliseconds since epoch."""
+        return round((self.__clock_anchor + monotonic) * 1000)
+
+    def __read_lines(self):
+        while not self.__stopped.is_set():
+            try:
+                chunk = self.__console.read(self.__console.in_waiting or 1)
+            except (serial.SerialException, OSError, TypeError):
+                # TypeError is raised by pyserial when the port is closed while reading
+                self.__lines.put(None)
+                return
+            if not chunk:
+                continue
+            for line in self.__split(chunk, time.monotonic()):
+                self.__lines.put(line)
+
+    def __split(self, chunk: bytes, arrival: float):
+        self.__buffer += chunk
+        *complete, self.__buffer = self.__buffer.split(b'\n')
+        lines = []
+        for line in complete:
+            data = line.decode('utf-8', errors='replace').strip()
+            if self.__acknowledgement_pending:
+                self.__acknowledgement_pending = False
+            elif data:
+                lines.append((data, self.milliseconds(arrival), arrival))
+        return lines
+
+    def __stop_reader(self):
+        self.__stopped.set()
+        if self.__reader and self.__reader is not threading.current_thread():
+            self.__reader.join()
 
     def __disconnect(self):
+        self.__stop_reader()
         if self.__console.is_open:
             print("Closing connection.")
-            self.__console.write('D\n'.encode('utf-8'))
+            print(f"Queue latency: {self.queue_latency}")
+            try:
+                self.__console.write('D\n'.encode('utf-8'))
+            except (serial.SerialException, OSError):
+                pass
             self.__console.close()
         self.on_disconnected()
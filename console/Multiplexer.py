@@ -0,0 +1,72 @@
+import selectors
+import threading
+import time
+
+import serial
+
+from console.Monitor import Monitor
+
+RECONNECT_INTERVAL = 5.0
+
+
+class Multiplexer(object):
+    """Serve several consoles from one thread, waiting on all of their ports with a selector.
+
+    Ports that cannot be opened or lose their connection are retried every ``reconnect_interval``
+    seconds without holding up the others.
+    """
+
+    def __init__(self, monitors: list[Monitor], reconnect_interval=RECONNECT_INTERVAL) -> None:
+        self.__monitors = monitors
+        self.__reconnect_interval = reconnect_interval
+        self.__selector = selectors.DefaultSelector()
+        self.__reconnect_at = {monitor: 0.0 for monitor in monitors}
+        self.__stopped = threading.Event()
+
+    def start(self) -> None:
+        self.__stopped.clear()
+        try:
+            while not self.__stopped.is_set():
+                self.__connect_due()
+                for key, _ in self.__selector.select(timeout=self.__timeout()):
+                    self.__receive(key)
+        except KeyboardInterrupt:
+            print("Interrupted.")
+        finally:
+            for key in list(self.__selector.get_map().values()):
+                self.__selector.unregister(key.fileobj)
+                key.data.disconnect()
+
+    def stop(self) -> None:
+        """Make ``start`` return once the lines currently being handled are done."""
+        self.__stopped.set()
+
+    def __connect_due(self):
+        now = time.monotonic()
+        for monitor, reconnect_at in self.__reconnect_at.items():
+            if reconnect_at is None or reconnect_at > now:
+                continue
+            if monitor.connect(wait_for_acknowledgement=False):
+                self.__selector.register(monitor.fileno(), selectors.EVENT_READ, monitor)
+                self.__reconnect_at[monitor] = None
+            else:
+                self.__reconnect_at[monitor] = now + self.__reconnect_interval
+
+    def __timeout(self):
+        pending = [reconnect_at for reconnect_at in self.__reconnect_at.values() if reconnect_at is not None]
+        if not pending:
+            return 0.5
+        return min(max(min(pending) - time.monotonic(), 0.0), 0.5)
+
+    def __receive(self, key: selectors.SelectorKey):
+        monitor: Monitor = key.data
+        try:
+            lines = monitor.receive()
+        except (serial.SerialException, OSError):
+            print(f"Lost connection via port {monitor.port}")
+            self.__selector.unregister(key.fileobj)
+            monitor.disconnect()
+            self.__reconnect_at[monitor] = time.monotonic() + self.__reconnect_interval
+            return
+        for line in lines:
+            monitor.dispatch(line)
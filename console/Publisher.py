@@ -0,0 +1,97 @@
+import json
+import socket
+import time
+
+from console.Capture import Capture
+from console.Latency import Latency
+
+HOST = "127.0.0.1"
+SUBSCRIPTION_TIMEOUT = 60.0
+
+SUBSCRIBE = b"subscribe"
+UNSUBSCRIBE = b"unsubscribe"
+
+
+class Publisher(object):
+    """Publish every capture as a JSON datagram to the subscribers on this machine.
+
+    A client subscribes by sending ``subscribe`` to the publisher's address and has to repeat that
+    at least every ``subscription_timeout`` seconds, ``unsubscribe`` ends the subscription. The socket
+    never blocks: a datagram that cannot be sent right away is dropped for that subscriber, so slow
+    clients miss updates instead of holding up the serial port. Every failed send, e.g. a full buffer
+    or ``ENOBUFS``, is counted in ``dropped`` and per subscriber in ``dropped_by_subscriber``, a refused
+    one also ends the subscription. The time from a line's arrival on the serial port until it is
+    published is tracked in ``latency``.
+    """
+
+    latency: Latency
+    dropped: int
+    dropped_by_subscriber: dict[tuple[str, int], int]
+
+    def __init__(self, port=0, host=HOST, subscription_timeout=SUBSCRIPTION_TIMEOUT) -> None:
+        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__socket.bind((host, port))
+        self.__socket.setblocking(False)
+        self.__subscription_timeout = subscription_timeout
+        self.__subscribers = {}
+        self.latency = Latency()
+        self.dropped = 0
+        self.dropped_by_subscriber = {}
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.__socket.getsockname()
+
+    @property
+    def subscribers(self) -> list[tuple[str, int]]:
+        return list(self.__subscribers)
+
+    def publish(self, source: str, milliseconds: int, capture: Capture, arrival: float = None):
+        """Send a capture to all subscribers, ``arrival`` is the ``time.monotonic()`` it was received at."""
+        self.__receive_subscriptions()
+        if not self.__subscribers:
+            return
+        message = json.dumps(Publisher.message(source, milliseconds, capture)).encode("utf-8")
+        for subscriber in list(self.__subscribers):
+            try:
+                self.__socket.sendto(message, subscriber)
+            except OSError as e:
+                self.dropped += 1
+                self.dropped_by_subscriber[subscriber] = self.dropped_by_subscriber.get(subscriber, 0) + 1
+                if isinstance(e, ConnectionRefusedError):
+                    # the client went away
+                    del self.__subscribers[subscriber]
+        if arrival is not None:
+            self.latency.add(time.monotonic() - arrival)
+
+    @staticmethod
+    def message(source: str, milliseconds: int, capture: Capture) -> dict:
+        return {
+            "source": source,
+            "time": milliseconds,
+            "elapsed_time": capture.elapsed_time.total_seconds(),
+            "distance": capture.distance,
+            "time_to_500m": capture.time_to_500m.total_seconds(),
+            "strokes_per_minute": capture.strokes_per_minute,
+            "watt": capture.watt,
+            "calories_per_hour": capture.calories_per_hour,
+            "level": capture.level,
+        }
+
+    def close(self):
+        self.__socket.close()
+
+    def __receive_subscriptions(self):
+        now = time.monotonic()
+        while True:
+            try:
+                request, address = self.__socket.recvfrom(64)
+            except (BlockingIOError, ConnectionRefusedError):
+                break
+            if request.strip() == UNSUBSCRIBE:
+                self.__subscribers.pop(address, None)
+            elif request.strip() == SUBSCRIBE:
+                self.__subscribers[address] = now + self.__subscription_timeout
+        for subscriber, expires_at in list(self.__subscribers.items()):
+            if expires_at < now:
+                del self.__subscribers[subscriber]
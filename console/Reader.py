@@ -0,0 +1,207 @@
+import re
+import struct
+import zlib
+
+import numpy as np
+
+RECORD_LENGTH = 29
+
+BINARY_MAGIC = b"FDFR"
+BINARY_VERSION = 1
+# Magic, format version and record size, padded to 16 bytes
+BINARY_HEADER = struct.Struct("<4sHH8x")
+
+GZIP_MAGIC = b"\x1f\x8b"
+GZIP_SUFFIX = ".gz"
+READ_SIZE = 1 << 20
+
+# Session files are named after their start time in milliseconds
+RECORDING_PATTERN = re.compile(r"^(\d+)\.(txt|bin|txt\.gz)$")
+
+_NEWLINE = ord("\n")
+_SPACE = ord(" ")
+_ZERO = ord("0")
+
+
+# Packed layout of one record, shared by the bulk TXT parser and the binary session format.
+# Characters of the raw record that Capture does not decode are kept so that conversions are lossless.
+RECORD_DTYPE = np.dtype([
+    ("milliseconds", "<u8"),
+    ("status", "S2"),
+    ("minutes", "u1"),
+    ("seconds", "u1"),
+    ("distance", "<u4"),
+    ("separator", "S1"),
+    ("minutes_to_500m", "u1"),
+    ("seconds_to_500m", "u1"),
+    ("strokes_per_minute", "<u2"),
+    ("watt", "<u2"),
+    ("calories_per_hour", "<u2"),
+    ("level", "u1"),
+])
+
+# Field name, start and end offset within the raw record
+NUMERIC_FIELDS = [
+    ("minutes", 3, 5),
+    ("seconds", 5, 7),
+    ("distance", 7, 12),
+    ("minutes_to_500m", 13, 15),
+    ("seconds_to_500m", 15, 17),
+    ("strokes_per_minute", 17, 20),
+    ("watt", 20, 23),
+    ("calories_per_hour", 23, 27),
+    ("level", 27, 29),
+]
+
+
+class Reader(object):
+    """Columnar view of a recording, decoded in bulk from the TXT format or mapped from the binary format.
+
+    Every attribute holds one NumPy array with one entry per recorded line, using the same
+    units and field layout as :class:`console.Capture.Capture` (durations in seconds).
+    """
+
+    milliseconds: np.ndarray
+    elapsed_time: np.ndarray
+    distance: np.ndarray
+
+    time_to_500m: np.ndarray
+    strokes_per_minute: np.ndarray
+    watt: np.ndarray
+    calories_per_hour: np.ndarray
+
+    level: np.ndarray
+
+    records: np.ndarray
+
+    def __init__(self, data: bytes = None, records: np.ndarray = None):
+        """Decode TXT ``data``, or wrap ``records`` of ``RECORD_DTYPE`` without copying them."""
+        self.records = Reader.parse(data) if records is None else records
+        self.milliseconds = self.records["milliseconds"]
+        self.elapsed_time = self.records["minutes"] * np.int64(60) + self.records["seconds"]
+        self.distance = self.records["distance"]
+        self.time_to_500m = self.records["minutes_to_500m"] * np.int64(60) + self.records["seconds_to_500m"]
+        self.strokes_per_minute = self.records["strokes_per_minute"]
+        self.watt = self.records["watt"]
+        self.calories_per_hour = self.records["calories_per_hour"]
+        self.level = self.records["level"]
+
+    @staticmethod
+    def parse(data: bytes) -> np.ndarray:
+        """Decode the lines of a TXT recording into an array of ``RECORD_DTYPE``."""
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        line_starts, line_ends = Reader.__find_lines(buffer)
+        spaces = Reader.__find_separators(buffer, line_starts, line_ends)
+
+        if np.any(line_ends - (spaces + 1) < RECORD_LENGTH):
+            raise ValueError("Truncated record")
+        raw = buffer[(spaces + 1)[:, None] + np.arange(RECORD_LENGTH)]
+        if np.any(raw[:, 0] != ord("A")):
+            raise ValueError("Unsupported record type")
+
+        records = np.empty(len(raw), dtype=RECORD_DTYPE)
+        records["milliseconds"] = Reader.__decode_milliseconds(buffer, line_starts, spaces)
+        records["status"] = np.ascontiguousarray(raw[:, 1:3]).view("S2").ravel()
+        records["separator"] = np.ascontiguousarray(raw[:, 12:13]).view("S1").ravel()
+        for name, start, end in NUMERIC_FIELDS:
+            records[name] = Reader.__field(Reader.__to_digits(raw[:, start:end]), 0, end - start)
+        return records
+
+    @staticmethod
+    def from_file(filename: str) -> "Reader":
+        """Read a TXT, gzip compressed TXT or binary recording."""
+        with open(filename, "rb") as f:
+            magic = f.read(len(BINARY_MAGIC))
+            if magic == BINARY_MAGIC:
+                return Reader.from_binary_file(filename)
+            if magic.startswith(GZIP_MAGIC):
+                data, complete = Reader.decompress(filename)
+                # a recording that is still being written ends where it was last flushed
+                return Reader(data if complete else data[:data.rfind(b"\n") + 1])
+            f.seek(0)
+            return Reader(f.read())
+
+    @staticmethod
+    def decompress(filename: str) -> tuple[bytes, bool]:
+        """Decompress a gzip file in blocks and return the data and whether the file was complete.
+
+        Files with several members, as written by appending, are read as one. A file that is still being
+        written or was cut off gives the data up to where it ends instead of an error.
+        """
+        chunks, complete = [], True
+        decompressor = zlib.decompressobj(wbits=31)
+        with open(filename, "rb") as f:
+            while block := f.read(READ_SIZE):
+                while block:
+                    try:
+                        chunks.append(decompressor.decompress(block))
+                    except zlib.error as e:
+                        raise ValueError(f"Invalid gzip data: {e}") from e
+                    complete, block = decompressor.eof, decompressor.unused_data
+                    if decompressor.eof:
+                        decompressor = zlib.decompressobj(wbits=31)
+        chunks.append(decompressor.flush())
+        return b"".join(chunks), complete
+
+    @staticmethod
+    def from_binary_file(filename: str) -> "Reader":
+        """Map a binary session file into memory, the columns of the reader are views of the file."""
+        with open(filename, "rb") as f:
+            magic, version, record_size = BINARY_HEADER.unpack(f.read(BINARY_HEADER.size))
+            size = f.seek(0, 2)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION or record_size != RECORD_DTYPE.itemsize:
+            raise ValueError(f"Unsupported binary recording: {filename}")
+        count = (size - BINARY_HEADER.size) // RECORD_DTYPE.itemsize
+        if not count:
+            return Reader(records=np.empty(0, dtype=RECORD_DTYPE))
+        return Reader(records=np.memmap(filename, dtype=RECORD_DTYPE, mode="r", offset=BINARY_HEADER.size,
+                                        shape=(count,)))
+
+    def __len__(self):
+        return len(self.milliseconds)
+
+    @property
+    def utc_seconds(self) -> np.ndarray:
+        """Seconds since epoch, truncated the same way as ``Capture.utc_time``."""
+        return self.milliseconds.astype(np.int64) // 1000
+
+    @staticmethod
+    def __find_lines(buffer: np.ndarray):
+        line_ends = np.flatnonzero(buffer == _NEWLINE)
+        if len(buffer) and buffer[-1] != _NEWLINE:
+            line_ends = np.append(line_ends, len(buffer))
+        line_starts = np.concatenate(([0], line_ends + 1))[:len(line_ends)].astype(np.int64)
+        non_empty = line_ends > line_starts
+        return line_starts[non_empty], line_ends[non_empty]
+
+    @staticmethod
+    def __find_separators(buffer: np.ndarray, line_starts: np.ndarray, line_ends: np.ndarray):
+        all_spaces = np.flatnonzero(buffer == _SPACE)
+        first_space = np.searchsorted(all_spaces, line_starts)
+        if np.any(first_space >= len(all_spaces)):
+            raise ValueError("Missing separator")
+        spaces = all_spaces[first_space]
+        if np.any(spaces >= line_ends) or np.any(spaces == line_starts):
+            raise ValueError("Missing separator")
+        return spaces
+
+    @staticmethod
+    def __decode_milliseconds(buffer: np.ndarray, line_starts: np.ndarray, spaces: np.ndarray):
+        widths = spaces - line_starts
+        max_width = int(widths.max(initial=0))
+        positions = spaces[:, None] - np.arange(max_width, 0, -1)
+        padding = positions < line_starts[:, None]
+        digits = Reader.__to_digits(np.where(padding, _ZERO, buffer[np.maximum(positions, 0)]))
+        return Reader.__field(digits, 0, max_width)
+
+    @staticmethod
+    def __to_digits(characters: np.ndarray):
+        digits = characters.astype(np.int64) - _ZERO
+        if np.any((digits < 0) | (digits > 9)):
+            raise ValueError("Invalid digit in record")
+        return digits
+
+    @staticmethod
+    def __field(digits: np.ndarray, start: int, end: int):
+        weights = 10 ** np.arange(end - start - 1, -1, -1, dtype=np.int64)
+        return digits[:, start:end] @ weights
@@ -1,13 +1,37 @@
+import glob
+import os
+
+from console.Binary import Binary
 from console.Capture import Capture
+from console.LiveExport import LiveExport
 from console.Monitor import Monitor
+from console.Publisher import Publisher
+from console.Reader import RECORDING_PATTERN
+from console.SessionWriter import SessionWriter, SYNC_INTERVAL
+
+TEXT = "txt"
+BINARY = "bin"
+# TXT lines in a gzip stream, flushed whenever the session file is synced
+GZIP = "txt.gz"
 
 
 class Recorder(Monitor):
 
-    def __init__(self, port) -> None:
+    malformed_lines: int
+
+    def __init__(self, port, directory="", sync_interval=SYNC_INTERVAL, file_format=TEXT,
+                 live_export_interval=None, publisher: Publisher = None) -> None:
         super().__init__(port)
+        self.__directory = directory
+        self.__file_format = file_format
+        self.__writer = SessionWriter(sync_interval=sync_interval)
+        self.__live_export_interval = live_export_interval
+        self.__live_export = None
+        self.__publisher = publisher
         self.__session_file = None
         self.__session_distance = None
+        self.malformed_lines = 0
+        self.__repair_session_files()
 
     def on_connected(self):
         super().on_connected()
@@ -15,29 +39,63 @@ class Recorder(Monitor):
     def on_data(self, data, milliseconds):
         super().on_data(data, milliseconds)
         if data[:1] == "A":
-            capture = Capture(milliseconds, data)
-            self.__update_session_file_if_needed(capture.distance, milliseconds)
-            self.__session_file.write("{} {}\n".format(milliseconds, data))
+            if not Capture.is_valid(data):
+                self.malformed_lines += 1
+                print(f"Ignoring malformed line: {data!r}")
+                return
+            self.__update_session_file_if_needed(Capture.distance_from_raw(data), milliseconds)
+            if self.__file_format == BINARY:
+                self.__writer.write(Binary.encode(milliseconds, data))
+            else:
+                self.__writer.write("{} {}\n".format(milliseconds, data).encode("utf-8"))
+            if self.__live_export or self.__publisher:
+                capture = Capture(milliseconds, data)
+                if self.__live_export:
+                    self.__live_export.add_track_point(capture)
+                if self.__publisher:
+                    self.__publisher.publish(self.port, milliseconds, capture, self.arrival)
 
     def on_disconnected(self):
         super().on_disconnected()
         self.__close_session_file()
 
+    def __repair_session_files(self):
+        # a crashed session keeps an incomplete last line, which readers of the directory would reject
+        for filename in glob.glob(os.path.join(glob.escape(self.__directory), "*.*")):
+            if not RECORDING_PATTERN.match(os.path.basename(filename)):
+                continue
+            removed = SessionWriter.repair(filename)
+            if removed:
+                print(f"Removed {removed} bytes of an incomplete line from {filename}")
+
     def __update_session_file_if_needed(self, distance, milliseconds):
         if self.__is_new_file_required(distance):
             self.__close_session_file()
-            filename = str(milliseconds) + ".txt"
+            filename = os.path.join(self.__directory, f"{milliseconds}.{self.__file_format}")
             print("Starting new session: {}".format(filename))
-            self.__session_file = open(filename, "w")
+            self.__writer.open(filename, header=Binary.header() if self.__file_format == BINARY else b"")
+            self.__session_file = filename
+            if self.__live_export_interval is not None:
+                self.__live_export = LiveExport(os.path.join(self.__directory, f"{milliseconds}.tcx"),
+                                                interval=self.__live_export_interval)
         self.__session_distance = distance
 
     def __is_new_file_required(self, distance):
-        if distance and self.__session_distance:
-            if distance < self.__session_distance:
-                return True
+        # a reset of the console shows 0 meters, which already belongs to the new session
+        if self.__session_distance is not None and distance < self.__session_distance:
+            return True
         return self.__session_file is None
 
     def __close_session_file(self):
+        self.__session_distance = None
         if self.__session_file:
             print("Closing file.")
-            self.__session_file.close()
+            self.__writer.close()
+            self.__session_file = None
+            print(f"Write latency: {self.__writer.write_latency}, max queue depth {self.__writer.max_queue_depth}")
+            if self.__publisher:
+                print(f"Publish latency: {self.__publisher.latency}, dropped {self.__publisher.dropped}")
+        if self.__live_export:
+            self.__live_export.close()
+            print(f"Exported {self.__live_export.filename}")
+            self.__live_export = None
@@ -0,0 +1,197 @@
+import os
+import queue
+import threading
+import time
+import zlib
+
+from console.Latency import Latency
+from console.Reader import Reader, BINARY_HEADER, BINARY_MAGIC, GZIP_MAGIC, GZIP_SUFFIX, RECORD_DTYPE
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 256
+SYNC_INTERVAL = 1.0
+
+_OPEN = "open"
+_WRITE = "write"
+_CLOSE = "close"
+
+
+class SessionWriter(object):
+    """Write session files from a background thread so that slow storage never blocks the serial loop.
+
+    Lines are passed through a bounded queue and written in batches. Files are flushed after every
+    batch and synced to disk at most every ``sync_interval`` seconds and when they are closed.
+    The time between ``write`` and the line reaching the file is tracked in ``write_latency``.
+
+    Files ending in ``.gz`` are written as a gzip stream, which is flushed whenever the file is synced and
+    when no line arrived for ``sync_interval`` seconds, so that readers and a crash lose no more than with
+    plain files. Longer sync intervals compress better. Appending to an existing file adds a gzip member.
+    """
+
+    write_latency: Latency
+    max_queue_depth: int
+
+    def __init__(self, queue_size=QUEUE_SIZE, sync_interval=SYNC_INTERVAL) -> None:
+        self.__queue = queue.Queue(maxsize=queue_size)
+        self.__sync_interval = sync_interval
+        self.__thread = None
+        self.__file = None
+        self.__compressor = None
+        self.__is_flushed = True
+        self.__synced_at = 0.0
+        self.write_latency = Latency()
+        self.max_queue_depth = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self.__queue.qsize()
+
+    def open(self, filename: str, header: bytes = b""):
+        """Start appending to ``filename``, closing the current file first. ``header`` starts a new file."""
+        self.__put((_OPEN, (filename, header), None))
+
+    def write(self, data: bytes):
+        self.__put((_WRITE, data, time.monotonic()))
+
+    def close(self):
+        """Close the current file and wait until everything queued so far is on disk."""
+        self.__put((_CLOSE, None, None))
+        self.__queue.join()
+
+    @staticmethod
+    def repair(filename: str) -> int:
+        """Truncate a partially written last line or record, e.g. after a crash.
+
+        Returns the number of bytes removed, uncompressed for gzip files, which are also completed.
+        """
+        with open(filename, "rb+") as f:
+            magic = f.read(len(BINARY_MAGIC))
+            if magic.startswith(GZIP_MAGIC):
+                return SessionWriter.__repair_gzip(filename)
+            if magic == BINARY_MAGIC:
+                size = f.seek(0, os.SEEK_END)
+                if size < BINARY_HEADER.size:
+                    # cut off within the header, which is written again when the file is opened
+                    end = 0
+                else:
+                    end = size - (size - BINARY_HEADER.size) % RECORD_DTYPE.itemsize
+                f.truncate(end)
+                return size - end
+            size = f.seek(0, os.SEEK_END)
+            end = size
+            while end > 0:
+                start = max(end - 4096, 0)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end < size:
+                f.truncate(end)
+            return size - end
+
+    @staticmethod
+    def __repair_gzip(filename: str) -> int:
+        """Rewrite a gzip file that ends in a partial line or was not finished with its complete lines."""
+        data, complete = Reader.decompress(filename)
+        end = data.rfind(b"\n") + 1
+        if complete and end == len(data):
+            return 0
+        temporary_filename = filename + ".tmp"
+        with open(temporary_filename, "wb") as f:
+            compressor = zlib.compressobj(wbits=31)
+            f.write(compressor.compress(data[:end]) + compressor.flush())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_filename, filename)
+        return len(data) - end
+
+    def __put(self, item):
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__run, name="SessionWriter", daemon=True)
+            self.__thread.start()
+        self.__queue.put(item)
+        self.max_queue_depth = max(self.max_queue_depth, self.__queue.qsize())
+
+    def __run(self):
+        while True:
+            try:
+                batch = [self.__queue.get(timeout=None if self.__is_flushed else self.__sync_interval)]
+            except queue.Empty:
+                self.__sync_file()
+                continue
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.__handle(batch)
+            except OSError as e:
+                print(f"Error writing session file: {e}")
+            finally:
+                for _ in batch:
+                    self.__queue.task_done()
+
+    def __handle(self, batch):
+        lines, queued = [], []
+        for action, value, queued_at in batch:
+            if action == _WRITE:
+                lines.append(value)
+                queued.append(queued_at)
+                continue
+            self.__write(lines, queued)
+            lines, queued = [], []
+            if action == _OPEN:
+                self.__close_file()
+                self.__open_file(*value)
+            else:
+                self.__close_file()
+        self.__write(lines, queued)
+
+    def __write(self, lines, queued):
+        if not lines or not self.__file:
+            return
+        if self.__compressor:
+            self.__file.write(self.__compressor.compress(b"".join(lines)))
+            self.__is_flushed = False
+        else:
+            self.__file.write(b"".join(lines))
+        self.__file.flush()
+        if time.monotonic() - self.__synced_at >= self.__sync_interval:
+            self.__sync_file()
+        written_at = time.monotonic()
+        for queued_at in queued:
+            self.write_latency.add(written_at - queued_at)
+
+    def __open_file(self, filename, header):
+        if os.path.exists(filename):
+            SessionWriter.repair(filename)
+        self.__file = open(filename, "ab")
+        if filename.endswith(GZIP_SUFFIX):
+            self.__compressor = zlib.compressobj(wbits=31)
+        if header and not self.__file.tell():
+            self.__file.write(header)
+
+    def __sync_file(self):
+        try:
+            if self.__compressor and not self.__is_flushed:
+                self.__file.write(self.__compressor.flush(zlib.Z_SYNC_FLUSH))
+                self.__file.flush()
+            os.fsync(self.__file.fileno())
+        except OSError as e:
+            print(f"Error writing session file: {e}")
+        self.__is_flushed = True
+        self.__synced_at = time.monotonic()
+
+    def __close_file(self):
+        if self.__file:
+            if self.__compressor:
+                self.__file.write(self.__compressor.flush())
+                self.__compressor = None
+                self.__is_flushed = True
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+            self.__file.close()
+            self.__file = None
@@ -0,0 +1,205 @@
+import os
+import random
+import select
+import statistics
+import tempfile
+import threading
+import time
+
+from console.Binary import Binary
+from console.Reader import Reader
+from console.Synthetic import Synthetic
+
+GARBAGE = [b"\x00\xff\xfe", b"A8000", b"A80000400X0710428014108067004", b"B8000040000710428014108067004", b""]
+DRAIN_TIME = 0.2
+
+
+class Simulator(object):
+    """Play a console on a pseudo-terminal, for testing ``Monitor`` and ``Recorder`` without a rower.
+
+    The simulator waits for ``C``, acknowledges it and sends the lines with the original spacing divided by
+    ``rate``, a ``rate`` of 0 sends as fast as possible. ``D`` pauses sending until the next ``C``. Every
+    ``garbage_every`` lines a malformed line is inserted, every ``reset_every`` lines distance and elapsed
+    time start over as on a new session and every ``disconnect_every`` lines the pseudo-terminal is torn
+    down and replaced, as when the USB cable is pulled and plugged in again.
+
+    ``port`` is a symbolic link that always points to the current pseudo-terminal. What was sent is kept
+    in ``sent`` as the line and the wall clock time in milliseconds, to be compared with a recording by
+    ``statistics``.
+    """
+
+    sent: list[tuple[str, int]]
+    garbage: int
+    disconnects: int
+
+    def __init__(self, lines: list[tuple[int, str]], rate=1.0, garbage_every=0, reset_every=0, disconnect_every=0,
+                 port: str = None, seed=0) -> None:
+        self.__lines = Simulator.__reset_distance(lines, reset_every)
+        self.__rate = rate
+        self.__garbage_every = garbage_every
+        self.__disconnect_every = disconnect_every
+        self.__random = random.Random(seed)
+        self.__directory = None
+        if port is None:
+            self.__directory = tempfile.mkdtemp(prefix="simulator")
+            port = os.path.join(self.__directory, "tty")
+        self.__port = port
+        self.__master, self.__slave = (None, None)
+        self.__thread = None
+        self.__stopped = threading.Event()
+        self.__buffer = b""
+        self.sent = []
+        self.garbage = 0
+        self.disconnects = 0
+
+    @staticmethod
+    def from_file(filename: str, **kwargs) -> "Simulator":
+        """Replay a recording."""
+        return Simulator(Simulator.__split(Binary.to_text(Reader.from_file(filename).records)), **kwargs)
+
+    @staticmethod
+    def from_synthetic(synthetic: Synthetic, **kwargs) -> "Simulator":
+        return Simulator(Simulator.__split(synthetic.recording()), **kwargs)
+
+    @property
+    def port(self) -> str:
+        return self.__port
+
+    def start(self):
+        """Create the pseudo-terminal and start serving it from a background thread."""
+        self.__open()
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self.__run, name="Simulator", daemon=True)
+        self.__thread.start()
+
+    def wait(self, timeout=None) -> bool:
+        """Wait until all lines were sent, returns ``False`` on timeout."""
+        self.__thread.join(timeout)
+        return not self.__thread.is_alive()
+
+    def stop(self):
+        self.__stopped.set()
+        if self.__thread:
+            self.__thread.join()
+        self.__close()
+        if os.path.lexists(self.__port):
+            os.remove(self.__port)
+        if self.__directory:
+            os.rmdir(self.__directory)
+
+    def statistics(self, filenames: list[str]) -> dict:
+        """Compare what was sent with the recordings, in the order they were recorded.
+
+        ``latency`` is the time from sending a line until the recorder stamped it and ``jitter`` its
+        standard deviation, both in milliseconds.
+        """
+        received = []
+        for filename in sorted(filenames):
+            received += Simulator.__split(Binary.to_text(Reader.from_file(filename).records))
+        latencies = []
+        position = 0
+        for milliseconds, line in received:
+            while position < len(self.sent) and self.sent[position][0] != line:
+                position += 1
+            if position == len(self.sent):
+                break
+            latencies.append(milliseconds - self.sent[position][1])
+            position += 1
+        return {
+            "sent": len(self.sent),
+            "received": len(received),
+            "dropped": len(self.sent) - len(latencies),
+            "garbage": self.garbage,
+            "disconnects": self.disconnects,
+            "latency_mean": statistics.fmean(latencies) if latencies else None,
+            "latency_max": max(latencies) if latencies else None,
+            "jitter": statistics.pstdev(latencies) if latencies else None,
+        }
+
+    def __run(self):
+        position = 0
+        while position < len(self.__lines) and not self.__stopped.is_set():
+            if not self.__wait_for(b"C"):
+                return
+            os.write(self.__master, b"C\n")
+            position = self.__send_from(position)
+        # lines not yet read by the other side are lost when the pseudo-terminal is closed
+        self.__stopped.wait(DRAIN_TIME)
+
+    def __send_from(self, position: int) -> int:
+        started = time.monotonic()
+        first = self.__lines[position][0]
+        while position < len(self.__lines) and not self.__stopped.is_set():
+            milliseconds, line = self.__lines[position]
+            if self.__rate:
+                delay = started + (milliseconds - first) / 1000 / self.__rate - time.monotonic()
+                if delay > 0 and self.__stopped.wait(delay):
+                    break
+            if self.__received() == b"D":
+                return position
+            self.sent.append((line, round(time.time() * 1000)))
+            os.write(self.__master, f"{line}\n".encode("utf-8"))
+            position += 1
+            if self.__garbage_every and position % self.__garbage_every == 0:
+                os.write(self.__master, self.__random.choice(GARBAGE) + b"\n")
+                self.garbage += 1
+            if self.__disconnect_every and position % self.__disconnect_every == 0 and position < len(self.__lines):
+                self.__stopped.wait(DRAIN_TIME)
+                self.__close()
+                self.__open()
+                self.disconnects += 1
+                return position
+        return position
+
+    def __wait_for(self, command: bytes) -> bool:
+        while not self.__stopped.is_set():
+            if self.__received(timeout=0.1) == command:
+                return True
+        return False
+
+    def __received(self, timeout=0.0):
+        """The next command sent to the console, if any."""
+        if b"\n" not in self.__buffer:
+            readable, _, _ = select.select([self.__master], [], [], timeout)
+            if readable:
+                self.__buffer += os.read(self.__master, 1024)
+        if b"\n" not in self.__buffer:
+            return None
+        command, self.__buffer = self.__buffer.split(b"\n", 1)
+        return command.strip()
+
+    def __open(self):
+        self.__master, self.__slave = os.openpty()
+        self.__buffer = b""
+        link = self.__port + ".tmp"
+        os.symlink(os.ttyname(self.__slave), link)
+        os.replace(link, self.__port)
+
+    def __close(self):
+        for fd in (self.__master, self.__slave):
+            if fd is not None:
+                os.close(fd)
+        self.__master, self.__slave = (None, None)
+
+    @staticmethod
+    def __split(data: bytes) -> list[tuple[int, str]]:
+        lines = []
+        for line in data.decode("utf-8").splitlines():
+            milliseconds, raw = line.split(" ", 1)
+            lines.append((int(milliseconds), raw))
+        return lines
+
+    @staticmethod
+    def __reset_distance(lines: list[tuple[int, str]], reset_every: int) -> list[tuple[int, str]]:
+        """Make distance and elapsed time start over every ``reset_every`` lines."""
+        if not reset_every:
+            return lines
+        result = []
+        for position, (milliseconds, raw) in enumerate(lines):
+            if position % reset_every == 0:
+                base_distance = int(raw[7:12])
+                base_elapsed = int(raw[3:5]) * 60 + int(raw[5:7])
+            distance = int(raw[7:12]) - base_distance
+            elapsed = int(raw[3:5]) * 60 + int(raw[5:7]) - base_elapsed
+            result.append((milliseconds, f"{raw[:3]}{elapsed // 60:02d}{elapsed % 60:02d}{distance:05d}{raw[12:]}"))
+        return result
@@ -0,0 +1,123 @@
+import datetime
+import struct
+
+import numpy as np
+
+from console.Binary import Binary
+from console.HeartRate import FIT_EPOCH, FIT_RECORD
+from console.Reader import RECORD_DTYPE
+from console.TcxWriter import TCD_NS, TcxWriter
+
+# Durations of the sessions used for benchmarks, in seconds
+DURATIONS = {"15min": 15 * 60, "2h": 2 * 3600, "12h": 12 * 3600}
+
+START_MILLISECONDS = 1670609153225
+LINE_INTERVAL = (1.9, 2.4)
+HEART_RATE_MARGIN = 120
+
+FIT_FILE_ID = 0
+FIT_HEADER = struct.Struct("<BBHI4s")
+FIT_CRC_TABLE = [0x0000, 0xCC01, 0xD801, 0x1400, 0xF001, 0x3C00, 0x2800, 0xE401,
+                 0xA001, 0x6C00, 0x7800, 0xB401, 0x5000, 0x9C01, 0x8801, 0x4400]
+
+
+class Synthetic(object):
+    """A generated rowing session with the lines the console would send and the heart rate of a watch.
+
+    The console sends a line roughly every two seconds. Pace and stroke rate drift slowly around a steady
+    effort, power and calories follow from the pace. The watch records heart rate every second, starting
+    and ending a little before and after the session. The same ``seed`` gives the same session.
+
+    The console has two digits for the minutes and five for the distance, both wrap around in sessions
+    longer than 99 minutes or 99999 meters.
+    """
+
+    def __init__(self, duration: int, start_milliseconds=START_MILLISECONDS, seed=0) -> None:
+        rng = np.random.default_rng(seed)
+        count = int(duration / np.mean(LINE_INTERVAL))
+        intervals = rng.uniform(*LINE_INTERVAL, size=count) * 1000
+        self.milliseconds = (start_milliseconds + np.cumsum(intervals)).astype(np.uint64)
+        elapsed = (self.milliseconds - start_milliseconds) // 1000
+
+        split = np.clip(130 + np.cumsum(rng.normal(0, 0.5, size=count)), 95, 200).round()
+        self.strokes_per_minute = np.clip(24 + np.cumsum(rng.normal(0, 0.2, size=count)), 16, 36).round()
+        self.watt = np.minimum(2.8 / (split / 500) ** 3, 999).round()
+        self.calories_per_hour = (4 * 0.86 * self.watt + 300).round()
+        self.distance = np.cumsum(500 / split * intervals / 1000).astype(np.int64)
+
+        records = np.zeros(count, dtype=RECORD_DTYPE)
+        records["milliseconds"] = self.milliseconds
+        records["status"] = b"80"
+        records["minutes"] = elapsed // 60 % 100
+        records["seconds"] = elapsed % 60
+        records["distance"] = self.distance % 100000
+        records["separator"] = b"1"
+        records["minutes_to_500m"] = split // 60
+        records["seconds_to_500m"] = split % 60
+        records["strokes_per_minute"] = self.strokes_per_minute
+        records["watt"] = self.watt
+        records["calories_per_hour"] = self.calories_per_hour
+        records["level"] = 4
+        self.records = records
+
+        first_second = start_milliseconds // 1000 - HEART_RATE_MARGIN
+        self.heart_rate_seconds = np.arange(first_second, first_second + duration + 2 * HEART_RATE_MARGIN)
+        warm_up = np.minimum((self.heart_rate_seconds - first_second) / 600, 1)
+        noise = np.cumsum(rng.normal(0, 0.3, size=len(self.heart_rate_seconds)))
+        self.heart_rates = np.clip(70 + 60 * warm_up + noise, 50, 200).round().astype(np.uint8)
+
+    def recording(self) -> bytes:
+        """The session in the TXT format written by ``recorder.py``."""
+        return Binary.to_text(self.records)
+
+    def write_recording(self, filename: str):
+        with open(filename, "wb") as f:
+            f.write(self.recording())
+
+    def write_fit(self, filename: str):
+        """Write the heart rate as a FIT activity with a file id and one record message per second."""
+        created = int(self.heart_rate_seconds[0]) - FIT_EPOCH
+        definitions = (
+            # local message 0: file_id with type (enum) and time_created (uint32)
+            struct.pack("<BBBHB", 0x40, 0, 0, FIT_FILE_ID, 2) + bytes([0, 1, 0x00, 4, 4, 0x86])
+            + struct.pack("<BBI", 0x00, 4, created)
+            # local message 1: record with timestamp (uint32) and heart_rate (uint8)
+            + struct.pack("<BBBHB", 0x41, 0, 0, FIT_RECORD, 2) + bytes([253, 4, 0x86, 3, 1, 0x02])
+        )
+        records = np.zeros(len(self.heart_rate_seconds), dtype=[("header", "u1"), ("timestamp", "<u4"),
+                                                                ("heart_rate", "u1")])
+        records["header"] = 0x01
+        records["timestamp"] = self.heart_rate_seconds - FIT_EPOCH
+        records["heart_rate"] = self.heart_rates
+        data = definitions + records.tobytes()
+
+        header = FIT_HEADER.pack(14, 0x10, 2132, len(data), b".FIT")
+        header += struct.pack("<H", Synthetic.fit_crc(header))
+        with open(filename, "wb") as f:
+            f.write(header + data)
+            f.write(struct.pack("<H", Synthetic.fit_crc(header + data)))
+
+    def write_tcx(self, filename: str):
+        """Write the heart rate as a TCX activity with one track point per second."""
+        start = datetime.datetime.fromtimestamp(int(self.heart_rate_seconds[0]), tz=datetime.timezone.utc)
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            f.write(f'<TrainingCenterDatabase xmlns="{TCD_NS}">\n <Activities>\n  <Activity Sport="Other">\n')
+            f.write(f"   <Id>{TcxWriter.format_time(start)}</Id>\n")
+            f.write(f'   <Lap StartTime="{TcxWriter.format_time(start)}">\n    <Track>\n')
+            for second, heart_rate in zip(self.heart_rate_seconds.tolist(), self.heart_rates.tolist()):
+                time = TcxWriter.format_time(datetime.datetime.fromtimestamp(second, tz=datetime.timezone.utc))
+                f.write(f"     <Trackpoint>\n      <Time>{time}</Time>\n"
+                        f"      <HeartRateBpm>\n       <Value>{heart_rate}</Value>\n      </HeartRateBpm>\n"
+                        "     </Trackpoint>\n")
+            f.write("    </Track>\n   </Lap>\n  </Activity>\n </Activities>\n</TrainingCenterDatabase>\n")
+
+    @staticmethod
+    def fit_crc(data: bytes, crc=0) -> int:
+        """The CRC-16 used by FIT files."""
+        for byte in data:
+            for nibble in (byte & 0xF, byte >> 4):
+                tmp = FIT_CRC_TABLE[crc & 0xF]
+                crc = (crc >> 4) & 0x0FFF
+                crc = crc ^ tmp ^ FIT_CRC_TABLE[nibble]
+        return crc
@@ -0,0 +1,142 @@
+import datetime
+from functools import reduce
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+
+TCD_NS = "http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2"
+AE_NS = "http://www.garmin.com/xmlschemas/ActivityExtension/v2"
+
+
+class TcxWriter(object):
+    """Write a single-lap TCX activity to a binary file object as it is produced.
+
+    The output matches what ``ET.indent(root, space="\\t")`` followed by ``ElementTree.write``
+    produces for the same document, but no element is kept in memory once it is written.
+    """
+
+    def __init__(self, f):
+        self.__f = f
+        self.__has_track_points = False
+
+    def start_activity(self, start: datetime.datetime):
+        self.__write("<?xml version='1.0' encoding='utf-8'?>\n")
+        self.__write(f'<TrainingCenterDatabase xmlns="{TCD_NS}" xmlns:ae="{AE_NS}">\n')
+        self.__write("\t<Activities>\n")
+        self.__write('\t\t<Activity Sport="Other">\n')
+        self.__element(3, "Id", TcxWriter.format_time(start))
+
+    def start_lap(self, start: datetime.datetime, total_time_seconds: str, distance_meters: str,
+                  maximum_speed: str, calories: str, average_heart_rate: str = None, maximum_heart_rate: str = None):
+        self.__write(f"\t\t\t<Lap StartTime={quoteattr(TcxWriter.format_time(start))}>\n")
+        self.__element(4, "TotalTimeSeconds", total_time_seconds)
+        self.__element(4, "DistanceMeters", distance_meters)
+        self.__element(4, "MaximumSpeed", maximum_speed)
+        self.__element(4, "Calories", calories)
+        if average_heart_rate is not None and maximum_heart_rate is not None:
+            self.__value_element(4, "AverageHeartRateBpm", average_heart_rate)
+            self.__value_element(4, "MaximumHeartRateBpm", maximum_heart_rate)
+        self.__element(4, "Intensity", "Active")
+        self.__element(4, "TriggerMethod", "Manual")
+        self.__has_track_points = False
+
+    def add_rendered_track_points(self, text: str):
+        """Write track points rendered earlier with ``render_track_point``."""
+        if not self.__has_track_points:
+            self.__write("\t\t\t\t<Track>\n")
+            self.__has_track_points = True
+        self.__write(text)
+
+    @staticmethod
+    def render_track_point(time: datetime.datetime, distance_meters: str, cadence: str, heart_rate: str,
+                           speed: str, watts: str) -> str:
+        heart_rate_element = ""
+        if heart_rate is not None:
+            heart_rate_element = TcxWriter.__render_value_element(6, "HeartRateBpm", heart_rate)
+        return ("\t\t\t\t\t<Trackpoint>\n"
+                + TcxWriter.__render_element(6, "Time", TcxWriter.format_time(time))
+                + TcxWriter.__render_element(6, "DistanceMeters", distance_meters)
+                + TcxWriter.__render_element(6, "Cadence", cadence)
+                + heart_rate_element
+                + "\t\t\t\t\t\t<Extensions>\n"
+                + "\t\t\t\t\t\t\t<ae:TPX>\n"
+                + TcxWriter.__render_element(8, "ae:Speed", speed)
+                + TcxWriter.__render_element(8, "ae:Watts", watts)
+                + "\t\t\t\t\t\t\t</ae:TPX>\n"
+                + "\t\t\t\t\t\t</Extensions>\n"
+                + "\t\t\t\t\t</Trackpoint>\n")
+
+    def add_track_points(self, seconds: np.ndarray, distance_meters: np.ndarray, cadence: np.ndarray,
+                         heart_rate: np.ndarray, speed: np.ndarray, watts: np.ndarray):
+        """Render a block of track points at once from parallel string arrays.
+
+        ``seconds`` holds UTC epoch seconds, ``heart_rate`` may be ``None`` or contain empty strings
+        for points without heart rate. Values are expected to be numeric and are not escaped.
+        """
+        if not len(seconds):
+            return
+        if not self.__has_track_points:
+            self.__write("\t\t\t\t<Track>\n")
+            self.__has_track_points = True
+        times = np.datetime_as_string(seconds.astype("datetime64[s]"), unit="s")
+        heart_rate_elements = ""
+        if heart_rate is not None:
+            heart_rate_elements = np.where(heart_rate == "", "", TcxWriter.__concat(
+                "\t\t\t\t\t\t<HeartRateBpm>\n\t\t\t\t\t\t\t<Value>", heart_rate,
+                "</Value>\n\t\t\t\t\t\t</HeartRateBpm>\n"))
+        track_points = TcxWriter.__concat(
+            "\t\t\t\t\t<Trackpoint>\n\t\t\t\t\t\t<Time>", times, "Z</Time>\n",
+            "\t\t\t\t\t\t<DistanceMeters>", distance_meters, "</DistanceMeters>\n",
+            "\t\t\t\t\t\t<Cadence>", cadence, "</Cadence>\n",
+            heart_rate_elements,
+            "\t\t\t\t\t\t<Extensions>\n\t\t\t\t\t\t\t<ae:TPX>\n",
+            "\t\t\t\t\t\t\t\t<ae:Speed>", speed, "</ae:Speed>\n",
+            "\t\t\t\t\t\t\t\t<ae:Watts>", watts, "</ae:Watts>\n",
+            "\t\t\t\t\t\t\t</ae:TPX>\n\t\t\t\t\t\t</Extensions>\n\t\t\t\t\t</Trackpoint>\n")
+        self.__write("".join(track_points.tolist()))
+
+    def end_lap(self, average_speed: str, average_watts: str, maximum_watts: str):
+        if self.__has_track_points:
+            self.__write("\t\t\t\t</Track>\n")
+        else:
+            self.__write("\t\t\t\t<Track />\n")
+        self.__write("\t\t\t\t<Extensions>\n")
+        self.__write("\t\t\t\t\t<ae:LX>\n")
+        self.__element(6, "ae:AvgSpeed", average_speed)
+        self.__element(6, "ae:AvgWatts", average_watts)
+        self.__element(6, "ae:MaxWatts", maximum_watts)
+        self.__write("\t\t\t\t\t</ae:LX>\n")
+        self.__write("\t\t\t\t</Extensions>\n")
+        self.__write("\t\t\t</Lap>\n")
+
+    def end_activity(self):
+        self.__write("\t\t</Activity>\n")
+        self.__write("\t</Activities>\n")
+        self.__write("</TrainingCenterDatabase>")
+
+    @staticmethod
+    def format_time(time: datetime.datetime):
+        return time.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    @staticmethod
+    def __concat(*parts):
+        return reduce(np.strings.add, parts)
+
+    def __element(self, depth, tag, text):
+        self.__write(TcxWriter.__render_element(depth, tag, text))
+
+    def __value_element(self, depth, tag, value):
+        self.__write(TcxWriter.__render_value_element(depth, tag, value))
+
+    @staticmethod
+    def __render_element(depth, tag, text):
+        indent = "\t" * depth
+        return f"{indent}<{tag}>{escape(text)}</{tag}>\n"
+
+    @staticmethod
+    def __render_value_element(depth, tag, value):
+        indent = "\t" * depth
+        return f"{indent}<{tag}>\n{indent}\t<Value>{escape(value)}</Value>\n{indent}</{tag}>\n"
+
+    def __write(self, text: str):
+        self.__f.write(text.encode("utf-8"))
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+
+import argparse
+
+from console.Binary import Binary
+from console.Reader import BINARY_MAGIC
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='FDF Console record converter',
+                                     description='Convert recordings between the TXT and the binary format')
+
+    parser.add_argument('input_filename', metavar='INPUT',
+                        help='recording in TXT, gzip compressed TXT or binary format')
+    parser.add_argument('output_filename', metavar='OUTPUT',
+                        help='output file, in binary format for TXT input and vice versa')
+    args = parser.parse_args()
+
+    with open(args.input_filename, 'rb') as f:
+        is_binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+    if is_binary:
+        Binary.convert_to_text(args.input_filename, args.output_filename)
+    else:
+        Binary.convert_to_binary(args.input_filename, args.output_filename)
+
+
+if __name__ == "__main__":
+    main()
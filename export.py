@@ -1,38 +1,82 @@
 #!/usr/bin/env python
 
 import argparse
+import datetime
 
-from console.Capture import Capture
-from console.Export import Export
+from console.Archive import Archive, ARCHIVE_FORMATS
+from console.Batch import Batch, export_recording
+from console.Export import ENGINES, NUMPY
+from console.Profiler import Profiler
 
 
 def main():
     parser = argparse.ArgumentParser(prog='FDF Console record exporter', description='Convert recording to TCX')
 
     parser.add_argument('record_filename', metavar='TXT_INPUT',
-                        help='recording in TXT format')
+                        help='recording in TXT, gzip compressed TXT or binary format, or input directory with --batch')
     parser.add_argument('output_filename', metavar='TCX_OUTPUT',
-                        help='output file in TCX format')
+                        help='output file in TCX format, or output directory with --batch')
     parser.add_argument('--fit-input', metavar='FIT_INPUT', required=False,
                         help='secondary source for hear rate data in FIT format')
     parser.add_argument('--tcx-input', metavar='TCX_INPUT', required=False,
                         help='secondary source for hear rate data in TCX format')
+    parser.add_argument('--hr-offset', metavar='SECONDS', type=float, required=False, default=0.0,
+                        help='seconds to add to the timestamps of the heart rate data, to correct the watch clock')
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false',
+                        help='always decode heart rate files instead of reusing the <file>.hr.npz sidecar cache')
+    parser.add_argument('--batch', action='store_true',
+                        help='convert all recordings of a directory, using <id>_watch.fit or <id>_watch.tcx '
+                             'for heart rate data if present')
+    parser.add_argument('--workers', metavar='N', type=int, required=False,
+                        help='number of worker processes for --batch, defaults to the number of CPUs')
+    parser.add_argument('--engine', choices=ENGINES, required=False, default=NUMPY,
+                        help=f'implementation of the resampling, both give the same output, defaults to {NUMPY} '
+                             'which starts faster')
+    parser.add_argument('--profile', action='store_true',
+                        help='print wall time, rows and peak memory of every stage of the export')
+    parser.add_argument('--stats', metavar='JSON_OUTPUT', required=False,
+                        help='write the measurements of --profile as JSON to this file, - for stdout')
+    parser.add_argument('--debug', action='store_true',
+                        help='print the resampled data frame after exporting')
+    parser.add_argument('--archive', metavar='DIRECTORY', required=False,
+                        help='also add the resampled per-second data to a columnar archive, partitioned by day')
+    parser.add_argument('--archive-format', choices=ARCHIVE_FORMATS, required=False,
+                        help='file format of the archive, defaults to parquet if pyarrow is installed and arrow '
+                             'otherwise')
     args = parser.parse_args()
 
-    export = Export()
+    archive = None
+    if args.archive:
+        try:
+            archive = Archive(args.archive, archive_format=args.archive_format)
+        except ValueError as e:
+            parser.error(str(e))
 
-    if args.fit_input:
-        export.load_heart_rate_from_fit(args.fit_input)
-    elif args.tcx_input:
-        export.load_heart_rate_from_tcx(args.tcx_input)
+    if args.batch:
+        if args.fit_input or args.tcx_input:
+            parser.error('--fit-input and --tcx-input cannot be combined with --batch')
+        if args.profile or args.stats or args.debug:
+            parser.error('--profile, --stats and --debug cannot be combined with --batch')
+        failures = Batch(args.record_filename, args.output_filename, workers=args.workers,
+                         use_cache=args.use_cache, engine=args.engine, archive=archive).run()
+        exit(1 if failures else 0)
 
-    with open(args.record_filename, 'r', encoding='utf-8') as f:
-        for line in f.readlines():
-            (milliseconds, data) = line.split(" ")
-            export.add_track_point(Capture(int(milliseconds), data))
-
-    with open(args.output_filename, 'wb') as f:
-        export.write(f)
+    profiler = Profiler(enabled=args.profile or bool(args.stats))
+    profiler.start()
+    try:
+        export_recording(args.record_filename, args.output_filename,
+                         fit_input=args.fit_input, tcx_input=args.tcx_input,
+                         clock_offset=datetime.timedelta(seconds=args.hr_offset), use_cache=args.use_cache,
+                         profiler=profiler, debug=args.debug, engine=args.engine, archive=archive)
+    finally:
+        profiler.stop()
+    if args.profile:
+        print(profiler.report())
+    if args.stats == '-':
+        print(profiler.to_json())
+    elif args.stats:
+        with open(args.stats, 'w', encoding='utf-8') as f:
+            f.write(profiler.to_json() + '\n')
 
 
 if __name__ == "__main__":
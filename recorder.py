@@ -1,7 +1,11 @@
 #!/usr/bin/env python
 import argparse
+import os
 
-from console.Recorder import Recorder
+from console.Multiplexer import Multiplexer
+from console.Publisher import Publisher
+from console.Recorder import Recorder, TEXT, BINARY, GZIP
+from console.SessionWriter import SYNC_INTERVAL
 
 DEFAULT_PORT = '/dev/ttyUSB0'
 
@@ -9,12 +13,45 @@ DEFAULT_PORT = '/dev/ttyUSB0'
 def main():
     parser = argparse.ArgumentParser(prog="FDF Console recorder", description="Record console session")
 
-    parser.add_argument("--port", "-p", metavar="PORT", required=False, default=DEFAULT_PORT,
-                        help=f"Serial port to use for recording, defaults to {DEFAULT_PORT}")
+    parser.add_argument("--port", "-p", metavar="PORT", required=False, action="append",
+                        help=f"Serial port to use for recording, defaults to {DEFAULT_PORT}. "
+                             "Repeat to record several consoles, each into a directory named after its port")
+
+    parser.add_argument("--sync-interval", metavar="SECONDS", type=float, required=False, default=SYNC_INTERVAL,
+                        help=f"Maximum time between syncing session files to disk, defaults to {SYNC_INTERVAL:g} "
+                             "second(s)")
+
+    parser.add_argument("--format", "-f", choices=[TEXT, GZIP, BINARY], required=False, default=TEXT,
+                        help=f"Format of the session files, defaults to {TEXT}, {GZIP} compresses them")
+
+    parser.add_argument("--live-export", metavar="SECONDS", type=float, required=False,
+                        help="Keep a TCX export of the running session next to its session file, "
+                             "rewritten every SECONDS seconds")
+
+    parser.add_argument("--publish", metavar="UDP_PORT", type=int, required=False,
+                        help="Publish live data as JSON datagrams to local subscribers of this UDP port")
 
     args = parser.parse_args()
-    recorder = Recorder(args.port)
-    recorder.start()
+    ports = args.port or [DEFAULT_PORT]
+    directories = [os.path.basename(port) for port in ports]
+    duplicates = sorted({directory for directory in directories if directories.count(directory) > 1})
+    if len(ports) > 1 and duplicates:
+        parser.error(f"ports must have different names, their session directories would be shared: "
+                     f"{', '.join(duplicates)}")
+    publisher = Publisher(args.publish) if args.publish is not None else None
+    if len(ports) == 1:
+        recorder = Recorder(ports[0], sync_interval=args.sync_interval, file_format=args.format,
+                            live_export_interval=args.live_export, publisher=publisher)
+        recorder.start()
+        return
+
+    recorders = []
+    for port, directory in zip(ports, directories):
+        os.makedirs(directory, exist_ok=True)
+        recorders.append(Recorder(port, directory=directory, sync_interval=args.sync_interval,
+                                  file_format=args.format, live_export_interval=args.live_export,
+                                  publisher=publisher))
+    Multiplexer(recorders).start()
 
 
 if __name__ == '__main__':
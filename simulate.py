@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+import argparse
+import json
+import os
+
+from console.Reader import RECORDING_PATTERN
+from console.Simulator import Simulator
+from console.Synthetic import Synthetic, DURATIONS
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="FDF Console simulator",
+                                     description="Simulate a console on a pseudo-terminal for recorder.py")
+
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--replay", metavar="RECORDING", help="Recording to replay, e.g. samples/1670609153225.txt")
+    source.add_argument("--synthetic", choices=list(DURATIONS), help="Length of a synthetic session to send")
+
+    parser.add_argument("--port", metavar="LINK", required=False, default="console.tty",
+                        help="Symbolic link to the pseudo-terminal to pass to recorder.py --port, "
+                             "defaults to console.tty")
+    parser.add_argument("--rate", metavar="FACTOR", type=float, required=False, default=1.0,
+                        help="Speed up replay by this factor, 0 sends as fast as possible, defaults to 1")
+    parser.add_argument("--garbage-every", metavar="N", type=int, required=False, default=0,
+                        help="Insert a malformed line after every N lines")
+    parser.add_argument("--reset-every", metavar="N", type=int, required=False, default=0,
+                        help="Reset distance and elapsed time every N lines, as when a new session is started")
+    parser.add_argument("--disconnect-every", metavar="N", type=int, required=False, default=0,
+                        help="Disconnect after every N lines and offer a new pseudo-terminal")
+    parser.add_argument("--verify", metavar="DIRECTORY", required=False,
+                        help="Compare the recordings in DIRECTORY with what was sent once done")
+
+    args = parser.parse_args()
+    options = dict(rate=args.rate, garbage_every=args.garbage_every, reset_every=args.reset_every,
+                   disconnect_every=args.disconnect_every, port=os.path.abspath(args.port))
+    if args.replay:
+        simulator = Simulator.from_file(args.replay, **options)
+    else:
+        simulator = Simulator.from_synthetic(Synthetic(DURATIONS[args.synthetic]), **options)
+
+    simulator.start()
+    print(f"Simulating console on {simulator.port}, stop with Ctrl-C")
+    try:
+        simulator.wait()
+    except KeyboardInterrupt:
+        print("Interrupted.")
+    finally:
+        simulator.stop()
+    print(f"Sent {len(simulator.sent)} lines, {simulator.garbage} malformed lines, "
+          f"{simulator.disconnects} disconnects")
+    if args.verify:
+        filenames = [os.path.join(args.verify, name) for name in os.listdir(args.verify)
+                     if RECORDING_PATTERN.match(name)]
+        print(json.dumps(simulator.statistics(filenames), indent=2))
+
+
+if __name__ == '__main__':
+    main()
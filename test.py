@@ -1,13 +1,72 @@
 #!/usr/bin/env python
 
+import contextlib
 import datetime
+import errno
+import gzip
+import io
+import json
+import os
+import pickle
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+import unittest.mock
+import xml.etree.ElementTree as ET
+import zlib
 
 import fitdecode
+import numpy as np
 
+try:
+    import pyarrow.compute
+except ImportError:
+    pyarrow = None
+
+from console.ArrayFrame import ArrayFrame
+from console.Archive import Archive, ARROW, PARQUET
+from console.Batch import Batch, export_recording
+from console.Benchmark import Benchmark
+from console.Binary import Binary
 from console.Capture import Capture
+from console.Catalog import Catalog
 from console.DataFrame import DataFrame
-from console.Export import Export
+from console.Export import Export, PANDAS
+from console.HeartRate import HeartRate
+from console.LiveExport import LiveExport
+from console.Monitor import Monitor
+from console.Multiplexer import Multiplexer
+from console.Profiler import Profiler
+from console.Publisher import Publisher
+from console.Recorder import Recorder, GZIP
+from console.SessionWriter import SessionWriter
+from console.Simulator import Simulator
+from console.Synthetic import Synthetic, DURATIONS
+from console.Reader import Reader
+from console.TcxWriter import TcxWriter, TCD_NS, AE_NS
+
+
+def paused_lines(filename, pause=3600000):
+    """The lines of a recording with a pause of ``pause`` milliseconds after the first 600 lines."""
+    with open(filename, encoding='utf-8') as f:
+        lines = f.readlines()
+    return lines[:600] + [f"{int(milliseconds) + pause} {data}" for milliseconds, data in
+                          (line.split(" ") for line in lines[600:])]
+
+
+class FileAssertions(object):
+    """Assertions shared by the test cases that compare exported files."""
+
+    def assertFileContentEquals(self, reference_filename, test_filename):
+        with open(reference_filename) as expected:
+            with open(test_filename) as actual:
+                self.assertListEqual(list(expected), list(actual))
 
 
 class TestParse(unittest.TestCase):
@@ -24,8 +83,220 @@ class TestParse(unittest.TestCase):
         self.assertEqual(865, capture.calories_per_hour)
         self.assertEqual(4, capture.level)
 
+    def test_parse_bytes(self):
+        raw = b"A8001340038410210033165086504"
+        capture = Capture(1670609153225, "A8001340038410210033165086504")
+        self.assertEqual(capture, Capture(1670609153225, raw))
+        self.assertEqual(capture, Capture(1670609153225, memoryview(b"xx" + raw)[2:]))
+        self.assertEqual(hash(capture), hash(Capture(1670609153225, raw)))
+        self.assertNotEqual(capture, Capture(1670609153226, raw))
+        self.assertEqual(384, Capture.distance_from_raw(raw))
+        self.assertEqual(384, Capture.distance_from_raw("A8001340038410210033165086504"))
+        self.assertFalse(hasattr(capture, "__dict__"))
+
+    def test_pickle(self):
+        capture = Capture(1670609153225, "A8001340038410210033165086504")
+        copy = pickle.loads(pickle.dumps(capture))
+        self.assertEqual(capture, copy)
+        self.assertEqual(865, copy.calories_per_hour)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, Capture, 0, "B8001340038410210033165086504")
+        self.assertRaises(ValueError, Capture, 0, "A80013400384")
+        # fields are only decoded when read
+        capture = Capture(0, "A800134003X410210033165086504")
+        self.assertRaises(ValueError, lambda: capture.distance)
+        self.assertEqual(33, capture.strokes_per_minute)
+        self.assertTrue(Capture.is_valid("A8001340038410210033165086504"))
+        self.assertTrue(Capture.is_valid(b"A8001340038410210033165086504"))
+        self.assertFalse(Capture.is_valid("A800134003X410210033165086504"))
+        self.assertFalse(Capture.is_valid("A8001340038410210033165086²04"))
+        self.assertFalse(Capture.is_valid("A80013400384"))
+        self.assertFalse(Capture.is_valid("A\ufffd001340038410210033165086504"))
+        self.assertFalse(Capture.is_valid("A8001340038\ufffd10210033165086504"))
+        self.assertFalse(Capture.is_valid(b"A8 001340038410210033165086504"))
+
+    def test_recorder_skips_non_ascii(self):
+        lines = [(1670609153225, "A8000040000710428014108067004"),
+                 (1670609154225, "A\ufffd000050000910428014108067004"),
+                 (1670609155225, "A8000060001110428014108067004")]
+        for file_format in ("txt", "bin"):
+            with tempfile.TemporaryDirectory() as directory:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    recorder = Recorder("/dev/null", directory=directory, file_format=file_format)
+                    for milliseconds, data in lines:
+                        recorder.on_data(data, milliseconds)
+                    recorder.on_disconnected()
+                self.assertEqual(1, recorder.malformed_lines)
+                reader = Reader.from_file(os.path.join(directory, f"1670609153225.{file_format}"))
+                self.assertEqual([7, 11], reader.distance.tolist())
+
+
+class TestReader(unittest.TestCase):
+
+    def test_read_sample1(self):
+        self.assertReaderMatchesCaptures("samples/1670609153225.txt")
+
+    def test_read_sample2(self):
+        self.assertReaderMatchesCaptures("samples/1670790032608.txt")
+
+    def test_read_without_trailing_newline(self):
+        reader = Reader(b"1670609153225 A8001340038410210033165086504\n\n1670609156234 A8000060001410243028105065904")
+        self.assertEqual(2, len(reader))
+        self.assertEqual([1670609153225, 1670609156234], reader.milliseconds.tolist())
+        self.assertEqual([94, 6], reader.elapsed_time.tolist())
+
+    def test_read_invalid(self):
+        with self.assertRaises(ValueError):
+            Reader(b"1670609153225 A80013400384102100331650865\n")
+        with self.assertRaises(ValueError):
+            Reader(b"1670609153225 B8001340038410210033165086504\n")
+        with self.assertRaises(ValueError):
+            Reader(b"1670609153225A8001340038410210033165086504\n")
+
+    def test_read_gzip(self):
+        with open("samples/1670609153225.txt", "rb") as f:
+            data = f.read()
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "1670609153225.txt.gz")
+            # two members, as after appending, the second one still open
+            compressor = zlib.compressobj(wbits=31)
+            with open(filename, "wb") as f:
+                f.write(gzip.compress(data[:1000]))
+                f.write(compressor.compress(data[1000:]) + compressor.flush(zlib.Z_SYNC_FLUSH))
+            self.assertEqual((data, False), Reader.decompress(filename))
+            np.testing.assert_equal(Reader(data).records, Reader.from_file(filename).records)
+            with open(filename, "ab") as f:
+                f.write(compressor.flush())
+            self.assertEqual((data, True), Reader.decompress(filename))
+
+    def assertReaderMatchesCaptures(self, filename):
+        reader = Reader.from_file(filename)
+        with open(filename, encoding='utf-8') as f:
+            captures = [Capture(int(milliseconds), data) for (milliseconds, data) in map(str.split, f)]
+        self.assertEqual(len(captures), len(reader))
+        self.assertEqual([int(c.utc_time.timestamp()) for c in captures], reader.utc_seconds.tolist())
+        self.assertEqual([c.elapsed_time.total_seconds() for c in captures], reader.elapsed_time.tolist())
+        self.assertEqual([c.distance for c in captures], reader.distance.tolist())
+        self.assertEqual([c.time_to_500m.total_seconds() for c in captures], reader.time_to_500m.tolist())
+        self.assertEqual([c.strokes_per_minute for c in captures], reader.strokes_per_minute.tolist())
+        self.assertEqual([c.watt for c in captures], reader.watt.tolist())
+        self.assertEqual([c.calories_per_hour for c in captures], reader.calories_per_hour.tolist())
+        self.assertEqual([c.level for c in captures], reader.level.tolist())
 
-class TestExport(unittest.TestCase):
+
+class TestBinary(unittest.TestCase):
+
+    def test_convert_sample1(self):
+        self.assertConversionIsLossless("samples/1670609153225.txt")
+
+    def test_convert_sample2(self):
+        self.assertConversionIsLossless("samples/1670790032608.txt")
+
+    def test_export_from_binary(self):
+        with tempfile.TemporaryDirectory() as directory:
+            binary_filename = os.path.join(directory, "1670609153225.bin")
+            Binary.convert_to_binary("samples/1670609153225.txt", binary_filename)
+            export = Export()
+            export.add_track_points(Reader.from_file(binary_filename))
+            f = io.BytesIO()
+            export.write(f)
+        with open("samples/1670609153225.tcx", "rb") as expected:
+            self.assertEqual(expected.read(), f.getvalue())
+
+    def test_encode(self):
+        records = Binary.header() + Binary.encode(1670609153225, "A8001340038410210033165086504")
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "1670609153225.bin")
+            with open(filename, "wb") as f:
+                f.write(records + b"\x00\x01")
+            reader = Reader.from_file(filename)
+            self.assertEqual(1, len(reader))
+            self.assertEqual([94], reader.elapsed_time.tolist())
+            self.assertEqual([384], reader.distance.tolist())
+            self.assertEqual(2, SessionWriter.repair(filename))
+            self.assertEqual(len(records), os.path.getsize(filename))
+
+    def test_repair_partial_header(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "1670609153225.bin")
+            with open(filename, "wb") as f:
+                f.write(Binary.header()[:10])
+            self.assertEqual(10, SessionWriter.repair(filename))
+            self.assertEqual(0, os.path.getsize(filename))
+
+            with open(filename, "wb") as f:
+                f.write(Binary.header()[:10])
+            writer = SessionWriter()
+            writer.open(filename, header=Binary.header())
+            writer.write(Binary.encode(1670609153225, "A8001340038410210033165086504"))
+            writer.close()
+            self.assertEqual([384], Reader.from_file(filename).distance.tolist())
+
+    def test_record_binary(self):
+        with tempfile.TemporaryDirectory() as directory:
+            recorder = Recorder("/dev/null", directory=directory, file_format="bin")
+            with contextlib.redirect_stdout(io.StringIO()):
+                with open("samples/1670609153225.txt", encoding="utf-8") as f:
+                    for line in f:
+                        (milliseconds, data) = line.split()
+                        recorder.on_data(data, int(milliseconds))
+                recorder.on_disconnected()
+            self.assertEqual(["1670609153225.bin"], os.listdir(directory))
+            Binary.convert_to_text(os.path.join(directory, "1670609153225.bin"), os.path.join(directory, "test.txt"))
+            with open("samples/1670609153225.txt", "rb") as expected:
+                with open(os.path.join(directory, "test.txt"), "rb") as actual:
+                    self.assertEqual(expected.read(), actual.read())
+
+    def test_lossy_input_is_refused(self):
+        with tempfile.TemporaryDirectory() as directory:
+            text_filename = os.path.join(directory, "1670609153225.txt")
+            with open(text_filename, "w") as f:
+                f.write("01670609153225 A8001340038410210033165086504\n")
+            with self.assertRaises(ValueError):
+                Binary.convert_to_binary(text_filename, os.path.join(directory, "1670609153225.bin"))
+
+    def assertConversionIsLossless(self, filename):
+        with tempfile.TemporaryDirectory() as directory:
+            binary_filename = os.path.join(directory, "recording.bin")
+            text_filename = os.path.join(directory, "recording.txt")
+            Binary.convert_to_binary(filename, binary_filename)
+            Binary.convert_to_text(binary_filename, text_filename)
+            with open(filename, "rb") as expected, open(text_filename, "rb") as actual:
+                self.assertEqual(expected.read(), actual.read())
+
+            binary, text = Reader.from_file(binary_filename), Reader.from_file(filename)
+            self.assertIsInstance(binary.distance, np.memmap)
+            for column in ["milliseconds", "elapsed_time", "distance", "time_to_500m", "strokes_per_minute",
+                           "watt", "calories_per_hour", "level"]:
+                self.assertEqual(getattr(text, column).tolist(), getattr(binary, column).tolist())
+            del binary
+
+
+class TestExport(FileAssertions, unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def output(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def test_export_write_sample1_from_reader(self):
+        export = Export()
+        export.add_track_points(Reader.from_file("samples/1670609153225.txt"))
+        with open(self.output("1670609153225_test.tcx"), 'wb') as f:
+            export.write(f)
+        self.assertFileContentEquals("samples/1670609153225.tcx", self.output("1670609153225_test.tcx"))
+
+    def test_enhance_export_write_sample2_from_reader(self):
+        export = Export(use_cache=False)
+        export.load_heart_rate_from_fit("samples/1670790032608_watch.fit")
+        export.add_track_points(Reader.from_file("samples/1670790032608.txt"))
+        with open(self.output("1670790032608_enhanced_test.tcx"), 'wb') as f:
+            export.write(f)
+        self.assertFileContentEquals("samples/1670790032608_enhanced.tcx", self.output("1670790032608_enhanced_test.tcx"))
 
     def test_export_write_sample1(self):
         export = Export()
@@ -33,9 +304,9 @@ class TestExport(unittest.TestCase):
             for line in f.readlines():
                 (milliseconds, data) = line.split(" ")
                 export.add_track_point(Capture(int(milliseconds), data))
-        with open("samples/1670609153225_test.tcx", 'wb') as f:
+        with open(self.output("1670609153225_test.tcx"), 'wb') as f:
             export.write(f)
-        self.assertFileContentEquals("samples/1670609153225.tcx", "samples/1670609153225_test.tcx")
+        self.assertFileContentEquals("samples/1670609153225.tcx", self.output("1670609153225_test.tcx"))
 
     def test_export_write_sample2(self):
         export = Export()
@@ -43,36 +314,935 @@ class TestExport(unittest.TestCase):
             for line in f.readlines():
                 (milliseconds, data) = line.split(" ")
                 export.add_track_point(Capture(int(milliseconds), data))
-        with open("samples/1670790032608_test.tcx", 'wb') as f:
+        with open(self.output("1670790032608_test.tcx"), 'wb') as f:
             export.write(f)
-        self.assertFileContentEquals("samples/1670790032608.tcx", "samples/1670790032608_test.tcx")
+        self.assertFileContentEquals("samples/1670790032608.tcx", self.output("1670790032608_test.tcx"))
 
     def test_enhance_export_write_sample1(self):
-        export = Export()
+        export = Export(use_cache=False)
         export.load_heart_rate_from_tcx("samples/1670609153225_watch.tcx")
         with open("samples/1670609153225.txt", encoding='utf-8') as f:
             for line in f.readlines():
                 (milliseconds, data) = line.split(" ")
                 export.add_track_point(Capture(int(milliseconds), data))
-        with open("samples/1670609153225_enhanced_test.tcx", 'wb') as f:
+        with open(self.output("1670609153225_enhanced_test.tcx"), 'wb') as f:
             export.write(f)
-        self.assertFileContentEquals("samples/1670609153225_enhanced.tcx", "samples/1670609153225_enhanced_test.tcx")
+        self.assertFileContentEquals("samples/1670609153225_enhanced.tcx", self.output("1670609153225_enhanced_test.tcx"))
 
     def test_enhance_export_write_sample2(self):
-        export = Export()
+        export = Export(use_cache=False)
         export.load_heart_rate_from_fit("samples/1670790032608_watch.fit")
         with open("samples/1670790032608.txt", encoding='utf-8') as f:
             for line in f.readlines():
                 (milliseconds, data) = line.split(" ")
                 export.add_track_point(Capture(int(milliseconds), data))
-        with open("samples/1670790032608_enhanced_test.tcx", 'wb') as f:
+        with open(self.output("1670790032608_enhanced_test.tcx"), 'wb') as f:
             export.write(f)
-        self.assertFileContentEquals("samples/1670790032608_enhanced.tcx", "samples/1670790032608_enhanced_test.tcx")
+        self.assertFileContentEquals("samples/1670790032608_enhanced.tcx", self.output("1670790032608_enhanced_test.tcx"))
 
-    def assertFileContentEquals(self, reference_filename, test_filename):
-        with open(reference_filename) as expected:
-            with open(test_filename) as actual:
-                self.assertListEqual(list(expected), list(actual))
+    def test_export_profile(self):
+        profiler = Profiler()
+        output = io.StringIO()
+        profiler.start()
+        try:
+            with contextlib.redirect_stdout(output):
+                export_recording("samples/1670790032608.txt", self.output("1670790032608_enhanced_test.tcx"),
+                                 fit_input="samples/1670790032608_watch.fit", use_cache=False, profiler=profiler)
+        finally:
+            profiler.stop()
+        self.assertEqual("", output.getvalue())
+        self.assertFileContentEquals("samples/1670790032608_enhanced.tcx", self.output("1670790032608_enhanced_test.tcx"))
+        stages = {stage["stage"]: stage for stage in json.loads(profiler.to_json())["stages"]}
+        self.assertEqual(["load heart rate", "read recording", "add track points", "build frame", "merge heart rate",
+                          "interpolate", "summary", "write TCX"], list(stages))
+        self.assertEqual(1019, stages["read recording"]["rows"])
+        self.assertEqual(885, stages["write TCX"]["rows"])
+        self.assertTrue(all(stage["peak_bytes"] > 0 for stage in stages.values()))
+        self.assertIn("write TCX", profiler.report())
+
+    def test_export_write_pandas_engine(self):
+        for recording, heart_rate, expected in [("samples/1670609153225.txt", None, "samples/1670609153225.tcx"),
+                                                ("samples/1670609153225.txt", "samples/1670609153225_watch.tcx",
+                                                 "samples/1670609153225_enhanced.tcx"),
+                                                ("samples/1670790032608.txt", "samples/1670790032608_watch.fit",
+                                                 "samples/1670790032608_enhanced.tcx")]:
+            export = Export(engine=PANDAS, use_cache=False)
+            if heart_rate and heart_rate.endswith(".fit"):
+                export.load_heart_rate_from_fit(heart_rate)
+            elif heart_rate:
+                export.load_heart_rate_from_tcx(heart_rate)
+            export.add_track_points(Reader.from_file(recording))
+            output = io.BytesIO()
+            export.write(output)
+            with open(expected, "rb") as f:
+                self.assertEqual(f.read(), output.getvalue())
+
+    def test_engines_agree_on_irregular_captures(self):
+        rng = random.Random(0)
+        captures = []
+        with open("samples/1670790032608.txt", encoding='utf-8') as f:
+            for line in f:
+                (milliseconds, data) = line.split(" ")
+                # shifted, repeated and clock jumps back before the session
+                milliseconds = int(milliseconds) + rng.choice([0, 0, 0, -1500, 700, -2000000])
+                captures += [Capture(milliseconds, data)] * rng.choice([1, 1, 2])
+        outputs = []
+        for engine in ["numpy", PANDAS]:
+            export = Export(engine=engine, use_cache=False)
+            export.load_heart_rate_from_fit("samples/1670790032608_watch.fit", clock_offset=datetime.timedelta(minutes=5))
+            for capture in captures:
+                export.add_track_point(capture)
+            output = io.BytesIO()
+            export.write(output)
+            outputs.append(output.getvalue())
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_export_does_not_import_pandas(self):
+        with tempfile.TemporaryDirectory() as directory:
+            script = ("import runpy, sys\n"
+                      f"sys.argv = ['export.py', 'samples/1670609153225.txt', {os.path.join(directory, 'out.tcx')!r}]\n"
+                      "runpy.run_path('export.py', run_name='__main__')\n"
+                      "print(sorted(m for m in ('pandas', 'fitdecode') if m in sys.modules))\n")
+            output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+            self.assertEqual("[]", output.stdout.strip())
+            self.assertFileContentEquals("samples/1670609153225.tcx", os.path.join(directory, "out.tcx"))
+
+    def test_export_debug(self):
+        export = Export(debug=True)
+        export.add_track_points(Reader.from_file("samples/1670609153225.txt"))
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            export.write(io.BytesIO())
+        self.assertIn("rows x", output.getvalue())
+
+    def test_enhance_export_heart_rate_outside_session(self):
+        export = Export(use_cache=False)
+        export.load_heart_rate_from_fit("samples/1670790032608_watch.fit", clock_offset=datetime.timedelta(days=1))
+        export.add_track_points(Reader.from_file("samples/1670790032608.txt"))
+        with open(self.output("1670790032608_test.tcx"), 'wb') as f:
+            export.write(f)
+        self.assertFileContentEquals("samples/1670790032608.tcx", self.output("1670790032608_test.tcx"))
+
+    def test_enhance_export_heart_rate_clock_offset(self):
+        export = Export(use_cache=False)
+        export.load_heart_rate_from_fit("samples/1670790032608_watch.fit", clock_offset=datetime.timedelta(minutes=1))
+        export.add_track_points(Reader.from_file("samples/1670790032608.txt"))
+        f = io.BytesIO()
+        export.write(f)
+        with open("samples/1670790032608_enhanced.tcx", 'rb') as expected:
+            self.assertNotEqual(expected.read(), f.getvalue())
+        self.assertIn(b"<HeartRateBpm>", f.getvalue())
+
+
+class TestBatch(FileAssertions, unittest.TestCase):
+
+    def test_batch(self):
+        with tempfile.TemporaryDirectory() as input_directory, tempfile.TemporaryDirectory() as output_directory:
+            for filename in ["1670609153225.txt", "1670609153225_watch.tcx",
+                             "1670790032608.txt", "1670790032608_watch.fit"]:
+                shutil.copy(os.path.join("samples", filename), input_directory)
+            with open(os.path.join(input_directory, "1670000000000.txt"), "w") as f:
+                f.write("1670000000000 broken\n")
+
+            batch = Batch(input_directory, output_directory, workers=2)
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(1, batch.run())
+            self.assertFileContentEquals("samples/1670609153225_enhanced.tcx",
+                                         os.path.join(output_directory, "1670609153225.tcx"))
+            self.assertFileContentEquals("samples/1670790032608_enhanced.tcx",
+                                         os.path.join(output_directory, "1670790032608.tcx"))
+            self.assertEqual(["1670609153225.tcx", "1670790032608.tcx"], sorted(os.listdir(output_directory)))
+
+            up_to_date = [job.is_up_to_date() for job in batch.find_jobs()]
+            self.assertEqual([False, True, True], up_to_date)
+
+    def test_gzip(self):
+        with tempfile.TemporaryDirectory() as input_directory, tempfile.TemporaryDirectory() as output_directory:
+            with open("samples/1670609153225.txt", "rb") as source:
+                with gzip.open(os.path.join(input_directory, "1670609153225.txt.gz"), "wb") as f:
+                    shutil.copyfileobj(source, f)
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(0, Batch(input_directory, output_directory, workers=1).run())
+            self.assertFileContentEquals("samples/1670609153225.tcx",
+                                         os.path.join(output_directory, "1670609153225.tcx"))
+
+
+class TestArchive(unittest.TestCase):
+
+    @unittest.skipUnless(Archive.has_pyarrow(), "pyarrow is not installed")
+    def test_archive(self):
+        with tempfile.TemporaryDirectory() as directory:
+            archive = Archive(directory)
+            self.assertEqual(PARQUET, archive.archive_format)
+            with contextlib.redirect_stdout(io.StringIO()):
+                for recording, heart_rate in [("1670609153225.txt", None),
+                                              ("1670790032608.txt", "1670790032608_watch.fit"),
+                                              ("1670790032608.txt", "1670790032608_watch.fit")]:
+                    export_recording(os.path.join("samples", recording), os.path.join(directory, "session.tcx"),
+                                     fit_input=heart_rate and os.path.join("samples", heart_rate), use_cache=False,
+                                     archive=archive)
+            self.assertEqual(["date=2022-12-09", "date=2022-12-11", "session.tcx"], sorted(os.listdir(directory)))
+            self.assertEqual(["1670790032608.parquet"], os.listdir(os.path.join(directory, "date=2022-12-11")))
+
+            table = archive.dataset().to_table(columns=["session", "Distance", "Watt", "BPM_"])
+            self.assertEqual(["session", "Distance", "Watt", "BPM_"], table.column_names)
+            sessions = table["session"].to_numpy()
+            self.assertEqual([1813, 1810], [np.count_nonzero(sessions == session)
+                                            for session in (1670609153225, 1670790032608)])
+            first = table.filter(pyarrow.compute.equal(table["session"], 1670609153225))
+            self.assertEqual(6300, pyarrow.compute.max(first["Distance"]).as_py())
+            self.assertAlmostEqual(127.47, pyarrow.compute.mean(first["Watt"]).as_py(), places=2)
+            self.assertEqual(first.num_rows, first["BPM_"].null_count)
+            second = table.filter(pyarrow.compute.equal(table["session"], 1670790032608))
+            self.assertEqual(157, pyarrow.compute.max(second["BPM_"]).as_py())
+
+    @unittest.skipUnless(Archive.has_pyarrow(), "pyarrow is not installed")
+    def test_formats(self):
+        export = Export(use_cache=False)
+        export.load_heart_rate_from_fit("samples/1670790032608_watch.fit")
+        export.add_track_points(Reader.from_file("samples/1670790032608.txt"))
+        with tempfile.TemporaryDirectory() as directory:
+            tables = []
+            for name, archive_format, available in [("parquet", PARQUET, True), ("arrow", ARROW, True),
+                                                    ("fallback", ARROW, False)]:
+                with unittest.mock.patch.object(Archive, "has_pyarrow", return_value=available):
+                    archive = Archive(os.path.join(directory, name), archive_format)
+                    export.write_archive(archive, session_id=1670790032608)
+                tables.append(archive.dataset().to_table())
+            self.assertEqual(["session", "time", "Distance", "SPM", "Speed", "Watt", "CalPH_", "BPM_", "date"],
+                             tables[0].column_names)
+            # Parquet has no timestamps in seconds, pyarrow stores them in milliseconds
+            self.assertTrue(tables[0].equals(tables[1].cast(tables[0].schema)))
+            # the file written without pyarrow reads back as the same table
+            self.assertTrue(tables[1].equals(tables[2]))
+            self.assertGreater(tables[2]["BPM_"].null_count, 0)
+
+    @unittest.skipUnless(Archive.has_pyarrow(), "pyarrow is not installed")
+    def test_batch_backfill(self):
+        with tempfile.TemporaryDirectory() as input_directory, tempfile.TemporaryDirectory() as output_directory:
+            for filename in ["1670609153225.txt", "1670790032608.txt"]:
+                shutil.copy(os.path.join("samples", filename), input_directory)
+            archive = Archive(os.path.join(output_directory, "archive"))
+            with contextlib.redirect_stdout(io.StringIO()):
+                Batch(input_directory, output_directory, workers=1).run()
+                batch = Batch(input_directory, output_directory, workers=1, archive=archive)
+                self.assertEqual([False, False], [job.is_up_to_date() for job in batch.find_jobs()])
+                batch.run()
+            self.assertEqual([True, True], [job.is_up_to_date() for job in batch.find_jobs()])
+            self.assertIsNotNone(archive.find(1670609153225))
+            self.assertIsNone(archive.find(1670000000000))
+
+    @unittest.skipUnless(Archive.has_pyarrow(), "pyarrow is not installed")
+    def test_empty(self):
+        with tempfile.TemporaryDirectory() as directory:
+            archive = Archive(directory)
+            self.assertIsNone(Export().write_archive(archive))
+            self.assertIsNone(archive.write(1670609153225, np.empty(0, dtype=np.int64), {}))
+            self.assertEqual([], os.listdir(directory))
+
+    def test_without_pyarrow(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with unittest.mock.patch.object(Archive, "has_pyarrow", return_value=False):
+                self.assertRaises(ValueError, Archive, directory, PARQUET)
+                archive = Archive(directory)
+                self.assertEqual(ARROW, archive.archive_format)
+                filename = archive.write(1670609153225, np.array([1670609153, 1670609154]),
+                                         {"Watt": np.array([120.0, np.nan])})
+            self.assertEqual(filename, archive.find(1670609153225))
+            with open(filename, "rb") as f:
+                data = f.read()
+            self.assertEqual(b"ARROW1", data[:6])
+            self.assertEqual(b"ARROW1", data[-6:])
+            self.assertRaises(ValueError, Archive, directory, "csv")
+
+
+class TestCatalog(unittest.TestCase):
+
+    def test_matches_export(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for filename in ["1670609153225.txt", "1670790032608.txt", "1670790032608_watch.fit"]:
+                shutil.copy(os.path.join("samples", filename), directory)
+            catalog = Catalog(os.path.join(directory, "catalog.sqlite"))
+            self.assertEqual(2, catalog.update(directory)["added"])
+            sessions = catalog.sessions()
+            catalog.close()
+        for session in sessions:
+            lap = ET.parse(f"samples/{session['id']}.tcx").getroot().find(".//tcd:Lap", {"tcd": TCD_NS})
+            self.assertEqual(lap.findtext(f"{{{TCD_NS}}}TotalTimeSeconds"), str(session["duration"]))
+            self.assertEqual(lap.findtext(f"{{{TCD_NS}}}DistanceMeters"), str(session["distance"]))
+            self.assertEqual(lap.findtext(f"{{{TCD_NS}}}Calories"), str(round(session["calories"])))
+            self.assertEqual(lap.findtext(f".//{{{AE_NS}}}AvgWatts"), str(round(session["average_watts"])))
+            self.assertEqual(lap.findtext(f".//{{{AE_NS}}}MaxWatts"), str(session["maximum_watts"]))
+        self.assertEqual([None, os.path.join(os.path.realpath(directory), "1670790032608_watch.fit")],
+                         [os.path.realpath(s["heart_rate_filename"]) if s["heart_rate_filename"] else None
+                          for s in sessions])
+
+    def test_append(self):
+        with open("samples/1670609153225.txt", "rb") as f:
+            data = f.read()
+        records = Binary.header() + Reader(data).records.tobytes()
+        for name, content, cuts in [("1670609153225.txt", data, [1000, 1020, 12345, len(data)]),
+                                    ("1670609153225.bin", records, [10, 100, 4000, len(records)])]:
+            with tempfile.TemporaryDirectory() as directory:
+                catalog = Catalog(os.path.join(directory, "catalog.sqlite"))
+                filename = os.path.join(directory, name)
+                results = []
+                for cut in cuts:
+                    with open(filename, "wb") as f:
+                        f.write(content[:cut])
+                    results.append(catalog.update(directory))
+                appended = catalog.sessions()
+                catalog.close()
+
+                catalog = Catalog(os.path.join(directory, "complete.sqlite"))
+                catalog.update(directory)
+                self.assertEqual(catalog.sessions(), appended)
+                catalog.close()
+            self.assertEqual([1, 3], [results[0]["added"], sum(result["appended"] for result in results)])
+            self.assertEqual(840, appended[0]["lines"])
+
+    def test_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for filename in ["1670609153225.txt", "1670790032608.txt"]:
+                shutil.copy(os.path.join("samples", filename), directory)
+            catalog = Catalog(os.path.join(directory, "catalog.sqlite"))
+            catalog.update(directory)
+            self.assertEqual(2, catalog.update(directory)["unchanged"])
+
+            with open(os.path.join(directory, "1670609153225.txt"), "r+b") as f:
+                f.write(b"1670609150000")
+            os.remove(os.path.join(directory, "1670790032608.txt"))
+            with open(os.path.join(directory, "1670000000000.txt"), "w") as f:
+                f.write("1670000000000 broken\n")
+            with contextlib.redirect_stdout(io.StringIO()):
+                counts = catalog.update(directory)
+            self.assertEqual({"added": 0, "appended": 0, "unchanged": 0, "reindexed": 1, "removed": 1, "failed": 1},
+                             counts)
+            self.assertEqual([1670609146], [session["start_time"] for session in catalog.sessions()])
+            catalog.close()
+
+    def test_query(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for filename in ["1670609153225.txt", "1670790032608.txt"]:
+                shutil.copy(os.path.join("samples", filename), directory)
+            catalog = Catalog(os.path.join(directory, "catalog.sqlite"))
+            catalog.update(directory)
+            december_10 = datetime.datetime(2022, 12, 10, tzinfo=datetime.timezone.utc)
+            self.assertEqual([1670790032608], [s["id"] for s in catalog.sessions(since=december_10)])
+            self.assertEqual([1670609153225], [s["id"] for s in catalog.sessions(until=december_10)])
+            self.assertEqual([1670609153225], [s["id"] for s in catalog.sessions(min_distance=6100)])
+            self.assertEqual([1670609153225, 1670790032608],
+                             [s["id"] for s in catalog.sessions(order="average_watts", descending=True)])
+            self.assertEqual(1, len(catalog.sessions(limit=1)))
+            totals = catalog.totals(min_duration=1800)
+            self.assertEqual((2, 3621, 12315), (totals["sessions"], totals["duration"], totals["distance"]))
+            self.assertEqual(1, catalog.totals(min_duration=1810)["sessions"])
+            catalog.close()
+
+    def test_gzip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copy("samples/1670609153225.txt", directory)
+            catalog = Catalog(os.path.join(directory, "catalog.sqlite"))
+            catalog.update(directory)
+            expected = catalog.sessions()[0]
+            os.remove(os.path.join(directory, "1670609153225.txt"))
+
+            with open("samples/1670609153225.txt", "rb") as f:
+                data = f.read()
+            filename = os.path.join(directory, "1670609153225.txt.gz")
+            compressor = zlib.compressobj(wbits=31)
+            with open(filename, "wb") as f:
+                f.write(compressor.compress(data[:20000]) + compressor.flush(zlib.Z_SYNC_FLUSH))
+            self.assertEqual(1, catalog.update(directory)["added"])
+            with open(filename, "ab") as f:
+                f.write(compressor.compress(data[20000:]) + compressor.flush())
+            with unittest.mock.patch.object(Reader, "decompress", wraps=Reader.decompress) as decompress:
+                self.assertEqual(1, catalog.update(directory)["appended"])
+                self.assertEqual(0, catalog.update(directory)["appended"])
+            self.assertEqual(1, decompress.call_count)
+            session = catalog.sessions()[0]
+            catalog.close()
+        self.assertEqual({**expected, "filename": filename}, session)
+
+    def test_pause(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "1670790032608.txt")
+            with open(filename, "w") as f:
+                f.writelines(paused_lines("samples/1670790032608.txt"))
+            catalog = Catalog(os.path.join(directory, "catalog.sqlite"))
+            catalog.update(directory)
+            session = catalog.sessions()[0]
+            catalog.close()
+            export = Export()
+            export.add_track_points(Reader.from_file(filename))
+            f = io.BytesIO()
+            export.write(f)
+        lap = ET.fromstring(f.getvalue()).find(".//tcd:Lap", {"tcd": TCD_NS})
+        self.assertEqual(lap.findtext(f"{{{TCD_NS}}}TotalTimeSeconds"), str(session["duration"]))
+        self.assertEqual(lap.findtext(f"{{{TCD_NS}}}Calories"), str(round(session["calories"])))
+
+
+class TestHeartRate(unittest.TestCase):
+
+    def test_from_fit(self):
+        expected = {}
+        with fitdecode.FitReader('samples/1670790032608_watch.fit') as fit:
+            for frame in fit:
+                if frame.frame_type == fitdecode.FIT_FRAME_DATA and frame.name == "record":
+                    timestamp = list(filter(lambda x: x.name == 'timestamp', frame.fields))[0].value
+                    heart_rate = list(filter(lambda x: x.name == 'heart_rate', frame.fields))[0].value
+                    expected[timestamp.timestamp()] = float(heart_rate)
+        heart_rate = HeartRate.from_fit('samples/1670790032608_watch.fit')
+        self.assertEqual(expected, dict(zip(heart_rate.seconds.tolist(), heart_rate.bpm.tolist())))
+
+    def test_from_fit_corrupt(self):
+        with open('samples/1670790032608_watch.fit', 'rb') as f:
+            data = bytearray(f.read())
+        data[len(data) // 2] ^= 0xff
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "corrupt.fit")
+            with open(filename, "wb") as f:
+                f.write(data)
+            with self.assertRaises(fitdecode.FitCRCError):
+                HeartRate.from_fit(filename)
+
+    def test_from_tcx(self):
+        expected = {}
+        tree = ET.parse("samples/1670609153225_watch.tcx")
+        for track_point in tree.findall(".//{" + TCD_NS + "}Trackpoint[{" + TCD_NS + "}HeartRateBpm]"):
+            time = track_point.find("{" + TCD_NS + "}Time").text
+            bpm = track_point.find("{" + TCD_NS + "}HeartRateBpm/{" + TCD_NS + "}Value").text
+            expected[datetime.datetime.fromisoformat(time.replace('Z', '+00:00')).timestamp()] = float(bpm)
+        heart_rate = HeartRate.from_tcx("samples/1670609153225_watch.tcx")
+        self.assertEqual(len(expected), len(heart_rate))
+        self.assertEqual(expected, dict(zip(heart_rate.seconds.tolist(), heart_rate.bpm.tolist())))
+
+    def test_from_tcx_multiple_activities(self):
+        track_point = ("<Trackpoint><Time>2022-12-09T18:0{}:00Z</Time>"
+                       "<HeartRateBpm><Value>{}</Value></HeartRateBpm></Trackpoint>")
+        activity = '<Activity Sport="Other"><Lap><Track>{}</Track></Lap></Activity>'
+        tcx = (f'<TrainingCenterDatabase xmlns="{TCD_NS}"><Activities>'
+               + activity.format(track_point.format(1, 80) + "<Trackpoint><Time>2022-12-09T18:02:00Z</Time></Trackpoint>")
+               + activity.format(track_point.format(3, 90) + track_point.format(4, 100))
+               + "</Activities></TrainingCenterDatabase>")
+        heart_rate = HeartRate.from_tcx(io.BytesIO(tcx.encode("utf-8")))
+        self.assertEqual([80.0, 90.0, 100.0], heart_rate.bpm.tolist())
+        self.assertEqual([1670608860.0, 1670608980.0, 1670609040.0], heart_rate.seconds.tolist())
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "watch.tcx")
+            shutil.copy("samples/1670609153225_watch.tcx", filename)
+            expected = HeartRate.from_tcx(filename)
+
+            heart_rate = HeartRate.load(filename)
+            self.assertTrue(os.path.exists(filename + ".hr.npz"))
+            self.assertEqual(expected.seconds.tolist(), heart_rate.seconds.tolist())
+            self.assertEqual(expected.bpm.tolist(), heart_rate.bpm.tolist())
+
+            cached = HeartRate.load(filename)
+            self.assertEqual(expected.bpm.tolist(), cached.bpm.tolist())
+
+            with open(filename, "w") as f:
+                f.write('<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2"/>')
+            self.assertEqual(0, len(HeartRate.load(filename)))
+
+
+class TestLiveExport(FileAssertions, unittest.TestCase):
+
+    def test_snapshot_matches_export(self):
+        with open("samples/1670790032608.txt", encoding='utf-8') as f:
+            captures = [Capture(int(milliseconds), data) for milliseconds, data in (line.split(" ") for line in f)]
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "1670790032608.tcx")
+            live_export = LiveExport(filename, interval=3600)
+            for count, capture in enumerate(captures, start=1):
+                live_export.add_track_point(capture)
+                if count in (1, 2, 600, len(captures)):
+                    live_export.snapshot()
+                    export = Export()
+                    for previous in captures[:count]:
+                        export.add_track_point(previous)
+                    expected = io.BytesIO()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        export.write(expected)
+                    with open(filename, "rb") as f:
+                        self.assertEqual(expected.getvalue(), f.read())
+            self.assertEqual(["1670790032608.tcx"], os.listdir(directory))
+
+    def test_pause_matches_export(self):
+        captures = [Capture(int(milliseconds), data) for milliseconds, data in
+                    (line.split(" ") for line in paused_lines("samples/1670790032608.txt"))]
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "1670790032608.tcx")
+            live_export = LiveExport(filename, interval=3600)
+            export = Export()
+            for capture in captures:
+                live_export.add_track_point(capture)
+                export.add_track_point(capture)
+            live_export.close()
+            expected = io.BytesIO()
+            export.write(expected)
+            with open(filename, "rb") as f:
+                self.assertEqual(expected.getvalue(), f.read())
+        # the calories are computed over the total time including the pause, as without the sparse index
+        lap = ET.fromstring(expected.getvalue()).find(".//tcd:Lap", {"tcd": TCD_NS})
+        self.assertEqual(("5409", "1035"), (lap.findtext(f"{{{TCD_NS}}}TotalTimeSeconds"),
+                                            lap.findtext(f"{{{TCD_NS}}}Calories")))
+
+    def test_background_snapshots(self):
+        with open("samples/1670790032608.txt", encoding='utf-8') as f:
+            captures = [Capture(int(milliseconds), data) for milliseconds, data in (line.split(" ") for line in f)]
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "1670790032608.tcx")
+            # a snapshot is due with every capture, those that arrive while one is being written are skipped
+            live_export = LiveExport(filename, interval=0)
+            for capture in captures:
+                live_export.add_track_point(capture)
+            live_export.close()
+            self.assertFileContentEquals("samples/1670790032608.tcx", filename)
+            self.assertEqual(["1670790032608.tcx"], os.listdir(directory))
+
+    def test_recorder_live_export(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with contextlib.redirect_stdout(io.StringIO()):
+                recorder = Recorder("/dev/null", directory=directory, live_export_interval=3600)
+                with open("samples/1670609153225.txt", encoding='utf-8') as f:
+                    for line in f:
+                        (milliseconds, data) = line.split(" ")
+                        recorder.on_data(data.strip(), int(milliseconds))
+                recorder.on_disconnected()
+            self.assertFileContentEquals("samples/1670609153225.tcx", os.path.join(directory, "1670609153225.tcx"))
+
+
+class TestSynthetic(unittest.TestCase):
+
+    def test_recording(self):
+        synthetic = Synthetic(DURATIONS["12h"])
+        lines = synthetic.recording().decode("utf-8").splitlines()
+        reader = Reader.parse(synthetic.recording())
+        self.assertEqual(len(lines), len(reader))
+        captures = [Capture(int(milliseconds), data) for milliseconds, data in (line.split(" ") for line in lines)]
+        self.assertEqual([capture.distance for capture in captures], reader["distance"].tolist())
+        self.assertEqual([capture.watt for capture in captures], reader["watt"].tolist())
+        # the console's minutes and distance wrap around in long sessions
+        self.assertEqual(99, max(capture.elapsed_time.total_seconds() // 60 for capture in captures))
+        self.assertLess(captures[-1].distance, max(capture.distance for capture in captures))
+
+    def test_heart_rate_files(self):
+        synthetic = Synthetic(900, seed=1)
+        with tempfile.TemporaryDirectory() as directory:
+            fit, tcx = os.path.join(directory, "watch.fit"), os.path.join(directory, "watch.tcx")
+            synthetic.write_fit(fit)
+            synthetic.write_tcx(tcx)
+            # fitdecode checks the header and file CRC by default
+            with fitdecode.FitReader(fit) as reader:
+                self.assertEqual(len(synthetic.heart_rates) + 1,
+                                 sum(1 for frame in reader if frame.frame_type == fitdecode.FIT_FRAME_DATA))
+            for heart_rate in (HeartRate.from_fit(fit), HeartRate.from_tcx(tcx)):
+                self.assertEqual(synthetic.heart_rate_seconds.tolist(), heart_rate.seconds.tolist())
+                self.assertEqual(synthetic.heart_rates.tolist(), heart_rate.bpm.tolist())
+
+    def test_benchmark(self):
+        with tempfile.TemporaryDirectory() as directory:
+            results = Benchmark(directory).run("1min", 60)
+            self.assertEqual(["Capture", "Reader.from_file", "DataFrame.load_from_dict+interpolate",
+                              "HeartRate.from_fit", "HeartRate.from_tcx", "Export.write",
+                              "export.py --engine numpy", "export.py --engine pandas"],
+                             [result["stage"] for result in results])
+            self.assertTrue(all(result["lines"] == 27 and result["peak_bytes"] for result in results))
+
+            filename = os.path.join(directory, "results.jsonl")
+            Benchmark.save(results, filename)
+            previous = Benchmark.load(filename)
+            self.assertEqual(len(results), len(previous))
+            self.assertIn(f"vs {previous[0]['revision']}", Benchmark.report(results, previous))
+
+
+class TestMonitor(unittest.TestCase):
+
+    class RecordingMonitor(Monitor):
+
+        def __init__(self, port) -> None:
+            super().__init__(port)
+            self.received = []
+
+        def on_data(self, data, milliseconds):
+            self.received.append((data, milliseconds))
+            if len(self.received) == 3:
+                self.stop()
+
+    def test_lines_are_timestamped_on_arrival(self):
+        master, slave = os.openpty()
+        try:
+            monitor = TestMonitor.RecordingMonitor(os.ttyname(slave))
+
+            def console():
+                self.assertEqual(b"C\n", os.read(master, 2))
+                os.write(master, b"C\n")
+                for i in range(3):
+                    time.sleep(0.1)
+                    os.write(master, f"A80001{i}\n".encode("utf-8"))
+
+            thread = threading.Thread(target=console)
+            thread.start()
+            before = round(time.time() * 1000)
+            with contextlib.redirect_stdout(io.StringIO()):
+                monitor.start()
+            after = round(time.time() * 1000)
+            thread.join()
+        finally:
+            os.close(master)
+            os.close(slave)
+
+        self.assertEqual(["A800010", "A800011", "A800012"], [data for data, _ in monitor.received])
+        milliseconds = [milliseconds for _, milliseconds in monitor.received]
+        self.assertEqual(sorted(milliseconds), milliseconds)
+        self.assertTrue(before + 50 <= milliseconds[0] <= after, milliseconds)
+        self.assertGreaterEqual(milliseconds[2] - milliseconds[0], 150)
+        self.assertEqual(3, monitor.queue_latency.count)
+        self.assertLess(monitor.queue_latency.maximum, 0.5)
+
+
+class TestMultiplexer(unittest.TestCase):
+
+    def test_ports_with_the_same_name(self):
+        result = subprocess.run([sys.executable, "recorder.py", "--port", "/dev/serial/by-id/console",
+                                 "--port", "/tmp/console"], capture_output=True, text=True)
+        self.assertEqual(2, result.returncode)
+        self.assertIn("session directories would be shared: console", result.stderr)
+
+    def test_record_several_consoles(self):
+        consoles = [os.openpty() for _ in range(2)]
+        with tempfile.TemporaryDirectory() as directory:
+            directories = [os.path.join(directory, str(i)) for i in range(2)]
+            recorders = []
+            for (master, slave), recorder_directory in zip(consoles, directories):
+                os.makedirs(recorder_directory)
+                recorders.append(Recorder(os.ttyname(slave), directory=recorder_directory))
+            multiplexer = Multiplexer(recorders, reconnect_interval=0.1)
+
+            def console():
+                for master, _ in consoles:
+                    self.assertEqual(b"C\n", os.read(master, 2))
+                    os.write(master, b"C\n")
+                os.write(consoles[0][0], b"A8000040000710428014108067004\n")
+                os.write(consoles[1][0], b"A8000040001110428014108067004\n")
+                time.sleep(0.2)
+                # The first console goes away, the second one keeps on sending
+                os.close(consoles[0][1])
+                os.close(consoles[0][0])
+                for distance in range(12, 15):
+                    os.write(consoles[1][0], f"A80000400{distance:03d}10428014108067004\n".encode("utf-8"))
+                    time.sleep(0.1)
+                multiplexer.stop()
+
+            thread = threading.Thread(target=console)
+            thread.start()
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                multiplexer.start()
+            thread.join()
+            os.close(consoles[1][0])
+            os.close(consoles[1][1])
+
+            self.assertIn(f"Lost connection via port {recorders[0].port}", output.getvalue())
+            recordings = [[os.path.join(d, f) for f in os.listdir(d)] for d in directories]
+            self.assertEqual([1, 1], [len(files) for files in recordings])
+            self.assertEqual([7], Reader.from_file(recordings[0][0]).distance.tolist())
+            self.assertEqual([11, 12, 13, 14], Reader.from_file(recordings[1][0]).distance.tolist())
+
+
+class TestSimulator(unittest.TestCase):
+
+    def test_record_simulated_console(self):
+        lines = Reader.from_file("samples/1670609153225.txt")
+        simulator = Simulator.from_file("samples/1670609153225.txt", rate=1000, garbage_every=7, reset_every=20,
+                                        disconnect_every=140)
+        with tempfile.TemporaryDirectory() as directory:
+            simulator.start()
+            recorder = Recorder(simulator.port, directory=directory)
+            multiplexer = Multiplexer([recorder], reconnect_interval=0.1)
+
+            def stop_when_done():
+                simulator.wait(timeout=60)
+                time.sleep(0.5)
+                multiplexer.stop()
+
+            thread = threading.Thread(target=stop_when_done)
+            thread.start()
+            with contextlib.redirect_stdout(io.StringIO()):
+                multiplexer.start()
+            thread.join()
+            simulator.stop()
+
+            filenames = [os.path.join(directory, filename) for filename in os.listdir(directory)]
+            statistics = simulator.statistics(filenames)
+            self.assertEqual(len(lines), statistics["sent"])
+            self.assertEqual(0, statistics["dropped"])
+            self.assertEqual(len(lines) // 7, statistics["garbage"])
+            self.assertEqual((len(lines) - 1) // 140, statistics["disconnects"])
+            self.assertLess(statistics["latency_max"], 500)
+            self.assertTrue(0 < recorder.malformed_lines <= statistics["garbage"])
+
+            # a session starts after every disconnect and with every reset to 0 meters
+            reconnects = set(range(0, len(lines), 140))
+            resets = {position for position in range(20, len(lines), 20) if position not in reconnects}
+            self.assertEqual(len(reconnects | resets), len(filenames))
+            self.assertEqual([len(lines)], [sum(len(Reader.from_file(filename)) for filename in filenames)])
+
+
+class TestPublisher(unittest.TestCase):
+
+    def setUp(self):
+        self.publisher = Publisher()
+        self.addCleanup(self.publisher.close)
+
+    def subscribe(self, receive_buffer_size=None):
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(client.close)
+        if receive_buffer_size:
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer_size)
+        client.bind(("127.0.0.1", 0))
+        client.settimeout(2)
+        client.sendto(b"subscribe", self.publisher.address)
+        return client
+
+    def test_publish(self):
+        client = self.subscribe()
+        capture = Capture(1670609153225, "A8000040000710428014108067004")
+        self.publisher.publish("/dev/ttyUSB0", 1670609153225, capture, arrival=time.monotonic())
+        self.assertEqual({"source": "/dev/ttyUSB0", "time": 1670609153225, "elapsed_time": 4.0, "distance": 7,
+                          "time_to_500m": 268.0, "strokes_per_minute": 14, "watt": 108, "calories_per_hour": 670,
+                          "level": 4}, json.loads(client.recv(1024)))
+        self.assertEqual(1, self.publisher.latency.count)
+
+        client.sendto(b"unsubscribe", self.publisher.address)
+        self.publisher.publish("/dev/ttyUSB0", 1670609154225, capture)
+        self.assertEqual([], self.publisher.subscribers)
+
+    def test_slow_subscriber_does_not_block(self):
+        self.subscribe(receive_buffer_size=1024)
+        client = self.subscribe()
+        capture = Capture(1670609153225, "A8000040000710428014108067004")
+        started = time.monotonic()
+        for i in range(5000):
+            self.publisher.publish("/dev/ttyUSB0", 1670609153225 + i, capture)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(1670609153225, json.loads(client.recv(1024))["time"])
+        self.assertEqual(2, len(self.publisher.subscribers))
+
+    def test_failed_sends_are_counted(self):
+        slow, gone, client = self.subscribe(), self.subscribe(), self.subscribe()
+        errors = {slow.getsockname(): OSError(errno.ENOBUFS, "No buffer space available"),
+                  gone.getsockname(): ConnectionRefusedError()}
+        sendto = socket.socket.sendto
+
+        def failing_sendto(sock, message, address):
+            if address in errors:
+                raise errors[address]
+            return sendto(sock, message, address)
+
+        capture = Capture(1670609153225, "A8000040000710428014108067004")
+        with unittest.mock.patch.object(socket.socket, "sendto", failing_sendto):
+            self.publisher.publish("/dev/ttyUSB0", 1670609153225, capture)
+            self.publisher.publish("/dev/ttyUSB0", 1670609154225, capture)
+        self.assertEqual(3, self.publisher.dropped)
+        self.assertEqual({slow.getsockname(): 2, gone.getsockname(): 1}, self.publisher.dropped_by_subscriber)
+        self.assertEqual(sorted([slow.getsockname(), client.getsockname()]), sorted(self.publisher.subscribers))
+        self.assertEqual([1670609153225, 1670609154225], [json.loads(client.recv(1024))["time"] for _ in range(2)])
+
+    def test_recorder_publishes(self):
+        client = self.subscribe()
+        with tempfile.TemporaryDirectory() as directory:
+            with contextlib.redirect_stdout(io.StringIO()):
+                recorder = Recorder("/dev/null", directory=directory, publisher=self.publisher)
+                recorder.on_data("A8000040000710428014108067004", 1670609153225)
+                recorder.on_disconnected()
+        self.assertEqual(7, json.loads(client.recv(1024))["distance"])
+
+
+class TestSessionWriter(unittest.TestCase):
+
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first, second = os.path.join(directory, "1.txt"), os.path.join(directory, "2.txt")
+            writer = SessionWriter(queue_size=10, sync_interval=0)
+            writer.open(first)
+            for i in range(100):
+                writer.write(f"{i}\n".encode("utf-8"))
+            writer.open(second)
+            writer.write(b"last\n")
+            writer.close()
+            with open(first) as f:
+                self.assertEqual([f"{i}\n" for i in range(100)], list(f))
+            with open(second) as f:
+                self.assertEqual(["last\n"], list(f))
+            self.assertEqual(101, writer.write_latency.count)
+            self.assertLessEqual(writer.max_queue_depth, 10)
+            self.assertEqual(0, writer.queue_depth)
+
+    def test_repair(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "1670609153225.txt")
+            with open(filename, "w") as f:
+                f.write("1670609153225 A8000040000710428014108067004\n1670609156234 A80000600014")
+            with contextlib.redirect_stdout(io.StringIO()):
+                Recorder("/dev/null", directory=directory)
+            with open(filename) as f:
+                self.assertEqual(["1670609153225 A8000040000710428014108067004\n"], list(f))
+            self.assertEqual(0, SessionWriter.repair(filename))
+
+            with open(filename, "w") as f:
+                f.write("1670609153225 A80000400")
+            self.assertEqual(23, SessionWriter.repair(filename))
+            self.assertEqual(0, os.path.getsize(filename))
+
+    def test_write_gzip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "1.txt.gz")
+            writer = SessionWriter(sync_interval=0)
+            writer.open(filename)
+            writer.write(b"first\n")
+            # every sync flushes the stream, the file can be read while it is being written
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline and \
+                    not (os.path.exists(filename) and Reader.decompress(filename)[0] == b"first\n"):
+                time.sleep(0.01)
+            self.assertEqual((b"first\n", False), Reader.decompress(filename))
+            writer.write(b"second\n")
+            writer.close()
+            writer.open(filename)
+            writer.write(b"third\n")
+            writer.close()
+            with gzip.open(filename) as f:
+                self.assertEqual([b"first\n", b"second\n", b"third\n"], list(f))
+
+    def test_repair_gzip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "1670609153225.txt.gz")
+            compressor = zlib.compressobj(wbits=31)
+            with open(filename, "wb") as f:
+                f.write(compressor.compress(b"1670609153225 A8000040000710428014108067004\n1670609156234 A80000600014"))
+                f.write(compressor.flush(zlib.Z_SYNC_FLUSH))
+            self.assertEqual(26, SessionWriter.repair(filename))
+            with gzip.open(filename) as f:
+                self.assertEqual([b"1670609153225 A8000040000710428014108067004\n"], list(f))
+            self.assertEqual(0, SessionWriter.repair(filename))
+
+    def test_recorder_gzip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with contextlib.redirect_stdout(io.StringIO()):
+                recorder = Recorder("/dev/null", directory=directory, file_format=GZIP)
+                with open("samples/1670609153225.txt", encoding='utf-8') as f:
+                    for line in f:
+                        (milliseconds, data) = line.split(" ")
+                        recorder.on_data(data.strip(), int(milliseconds))
+                recorder.on_disconnected()
+            self.assertEqual(["1670609153225.txt.gz"], os.listdir(directory))
+            with open("samples/1670609153225.txt", "rb") as expected:
+                with gzip.open(os.path.join(directory, "1670609153225.txt.gz")) as actual:
+                    self.assertEqual(expected.read(), actual.read())
+
+
+class TestRecorder(unittest.TestCase):
+
+    def test_reset_starts_session(self):
+        lines = [(1670609153225, "A8000040000710428014108067004"),
+                 (1670609154225, "A8000050000910428014108067004"),
+                 (1670609155225, "A8000000000010428014108067004"),
+                 (1670609156225, "A8000000000010428014108067004"),
+                 (1670609157225, "A8000010000310428014108067004")]
+        with tempfile.TemporaryDirectory() as directory:
+            with contextlib.redirect_stdout(io.StringIO()):
+                recorder = Recorder("/dev/null", directory=directory)
+                for milliseconds, data in lines:
+                    recorder.on_data(data, milliseconds)
+                recorder.on_disconnected()
+            self.assertEqual(["1670609153225.txt", "1670609155225.txt"], sorted(os.listdir(directory)))
+            self.assertEqual([7, 9], Reader.from_file(os.path.join(directory, "1670609153225.txt")).distance.tolist())
+            self.assertEqual([0, 0, 3],
+                             Reader.from_file(os.path.join(directory, "1670609155225.txt")).distance.tolist())
+
+
+class TestTcxWriter(unittest.TestCase):
+
+    def test_empty_track_matches_element_tree(self):
+        start = datetime.datetime(2022, 12, 9, 18, 5, 49, tzinfo=datetime.timezone.utc)
+        f = io.BytesIO()
+        writer = TcxWriter(f)
+        writer.start_activity(start)
+        writer.start_lap(start, "0", "0", "0.00", "0")
+        writer.end_lap("0.00", "0", "0")
+        writer.end_activity()
+
+        ET.register_namespace("", TCD_NS)
+        ET.register_namespace("ae", AE_NS)
+        root = ET.Element("{" + TCD_NS + "}TrainingCenterDatabase")
+        activity = ET.SubElement(ET.SubElement(root, "Activities"), "Activity", {"Sport": "Other"})
+        ET.SubElement(activity, "Id").text = "2022-12-09T18:05:49Z"
+        lap = ET.SubElement(activity, "Lap", {"StartTime": "2022-12-09T18:05:49Z"})
+        for tag, text in [("TotalTimeSeconds", "0"), ("DistanceMeters", "0"), ("MaximumSpeed", "0.00"),
+                          ("Calories", "0"), ("Intensity", "Active"), ("TriggerMethod", "Manual")]:
+            ET.SubElement(lap, tag).text = text
+        ET.SubElement(lap, "Track")
+        lx = ET.SubElement(ET.SubElement(lap, "Extensions"), "{" + AE_NS + "}LX")
+        for tag, text in [("AvgSpeed", "0.00"), ("AvgWatts", "0"), ("MaxWatts", "0")]:
+            ET.SubElement(lx, "{" + AE_NS + "}" + tag).text = text
+        ET.indent(root, space="\t", level=0)
+        expected = io.BytesIO()
+        ET.ElementTree(root).write(expected, encoding='utf-8', method="xml", xml_declaration=True)
+
+        self.assertEqual(expected.getvalue(), f.getvalue())
+
+
+class TestArrayFrame(unittest.TestCase):
+
+    def test_same_as_data_frame(self):
+        start = datetime.datetime(2022, 12, 9, 18, 5, 49, tzinfo=datetime.timezone.utc)
+        end = start + datetime.timedelta(seconds=20)
+        base = int(start.timestamp())
+        seconds = np.array([base + 2, base + 5, base + 5, base + 9, base - 30, base + 20])
+        values = np.array([10, 20, 25, 40, 99, 50])
+        heart_rate_seconds = np.array([base - 3.4, base + 4.2, base + 4.4, base + 12.0, base + 15.6])
+        heart_rates = np.array([100.0, 110, 112, 130, 126])
+
+        frames = []
+        for frame in (DataFrame(), ArrayFrame()):
+            frame.init(start, end)
+            frame.load_from_arrays(seconds, values, 'Value')
+            frame.merge_asof(heart_rate_seconds, heart_rates, 'BPM', 'BPM_')
+            frame.interpolate('Value', 'Value_', method='linear')
+            summary = frame.summary(start, end, {'Value': ['max', 'mean'], 'Value_': ['mean'], 'BPM': ['max'],
+                                                 'BPM_': ['mean'], 'missing': ['max']})
+            chunks = list(frame.chunks(start, end, ['Value', 'Value_', 'BPM_'], dropnan_columns=['Value'],
+                                       chunk_size=3))
+            frames.append((len(frame), summary,
+                           [(block.tolist(), {k: v.tolist() for k, v in columns.items()}) for block, columns in chunks]))
+        np.testing.assert_equal(frames[0], frames[1])
+        self.assertEqual(22, frames[1][0])
+
+    def test_sparse_index(self):
+        start = datetime.datetime(2022, 12, 9, 18, 5, 49, tzinfo=datetime.timezone.utc)
+        base = int(start.timestamp())
+        end = start + datetime.timedelta(seconds=3605)
+        seconds = np.array([base + 2, base + 5, base + 3600, base + 3603, base + 3605])
+        values = np.array([10, 20, 30, 40, 50])
+
+        frames = []
+        for frame in (DataFrame(), ArrayFrame()):
+            frame.init(start, end, seconds)
+            frame.load_from_arrays(seconds, values, 'Value')
+            frame.interpolate('Value', 'Value_', method='linear')
+            chunks = list(frame.chunks(start, end, ['Value_']))
+            frames.append((len(frame), frame.summary(start, end, {'Value_': ['mean']}),
+                           [(block.tolist(), {k: v.tolist() for k, v in columns.items()}) for block, columns in chunks]))
+        np.testing.assert_equal(frames[0], frames[1])
+        self.assertEqual(12, frames[1][0])
+        self.assertEqual(list(range(base, base + 6)) + list(range(base + 3600, base + 3606)), frames[1][2][0][0])
+        # the pause has no rows, interpolation steps across it from one row to the next
+        self.assertEqual([20.0, 30.0], frames[1][2][0][1]['Value_'][5:7])
+        self.assertEqual([base + 2, base + 3, base + 70],
+                         ArrayFrame.sparse_index(np.array([base + 3, base + 70, base + 2])).tolist())
 
 
 class TestDataFrame(unittest.TestCase):
@@ -97,6 +1267,28 @@ class TestDataFrame(unittest.TestCase):
         self.assertEqual(82.0, frame.get(start, 'BPM_nearest'))
         self.assertEqual(82.0, frame.get(start, 'BPM_linear'))
 
+    def test_get_across_midnight(self):
+        start = datetime.datetime(2022, 12, 9, 23, 59, 58, tzinfo=datetime.timezone.utc)
+        data = {start + datetime.timedelta(seconds=i): i for i in range(5)}
+        data[start + datetime.timedelta(days=1)] = 100
+        frame = DataFrame()
+        frame.load_from_dict(data, 'Value')
+        self.assertEqual(0, frame.get(start, 'Value'))
+        self.assertEqual(3, frame.get(start + datetime.timedelta(seconds=3, milliseconds=400), 'Value'))
+        self.assertEqual(100, frame.get(start + datetime.timedelta(days=1), 'Value'))
+        self.assertIsNone(frame.get(start - datetime.timedelta(seconds=1), 'Value'))
+        self.assertIsNone(frame.get(start + datetime.timedelta(days=2), 'Value'))
+
+    def test_get_many(self):
+        start = min(self.__external_heart_rates.keys())
+        frame = DataFrame()
+        frame.load_from_dict(self.__external_heart_rates, 'BPM')
+        times = sorted(self.__external_heart_rates.keys())
+        expected = [float(self.__external_heart_rates[t]) for t in times]
+        self.assertEqual(expected, frame.get_many(times, 'BPM').tolist())
+        outside = frame.get_many([start - datetime.timedelta(seconds=1)], 'BPM')
+        self.assertTrue(np.isnan(outside[0]))
+
     def test_mean(self):
         start = min(self.__external_heart_rates.keys())
         end = max(self.__external_heart_rates.keys())
@@ -106,6 +1298,35 @@ class TestDataFrame(unittest.TestCase):
         self.assertEqual(138.34, round(frame.mean(start, end, 'BPM'), 2))
         self.assertEqual(138.67, round(frame.mean(start, end, 'BPM_linear'), 2))
 
+    def test_summary(self):
+        start = min(self.__external_heart_rates.keys())
+        end = max(self.__external_heart_rates.keys())
+        frame = DataFrame()
+        frame.load_from_dict(self.__external_heart_rates, 'BPM')
+        summary = frame.summary(start, end, {'BPM': ['mean', 'max'], 'BPM_linear': ['mean']})
+        self.assertEqual(138.34, round(summary['BPM']['mean'], 2))
+        self.assertEqual(max(self.__external_heart_rates.values()), summary['BPM']['max'])
+        self.assertNotIn('BPM_linear', summary)
+        self.assertIs(summary, frame.summary(start, end, {'BPM': ['mean', 'max'], 'BPM_linear': ['mean']}))
+
+        frame.interpolate('BPM', 'BPM_linear', method='linear')
+        summary = frame.summary(start, end, {'BPM': ['mean', 'max'], 'BPM_linear': ['mean']})
+        self.assertEqual(138.67, round(summary['BPM_linear']['mean'], 2))
+
+    def test_chunks(self):
+        start = min(self.__external_heart_rates.keys())
+        end = max(self.__external_heart_rates.keys())
+        frame = DataFrame()
+        frame.load_from_dict(self.__external_heart_rates, 'BPM')
+        chunks = list(frame.chunks(start, end, ['BPM', 'missing'], dropnan_columns=['BPM'], chunk_size=100))
+        self.assertEqual(len(self.__external_heart_rates) // 100 + 1, len(chunks))
+        self.assertEqual(['BPM'], list(chunks[0][1].keys()))
+        seconds = [s for block, _ in chunks for s in block.tolist()]
+        values = [v for _, columns in chunks for v in columns['BPM'].tolist()]
+        expected = sorted(self.__external_heart_rates.items())
+        self.assertEqual([int(t.timestamp()) for t, _ in expected], seconds)
+        self.assertEqual([float(v) for _, v in expected], values)
+
     def test_max(self):
         start = min(self.__external_heart_rates.keys())
         end = max(self.__external_heart_rates.keys())